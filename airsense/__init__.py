@@ -0,0 +1,10 @@
+"""
+AirSense shared pipeline library
+
+Code used by more than one of the scripts in this repository (the backend
+server, the MongoDB prediction engine and the MQTT/JSON live pipelines)
+lives here so every process computes the same numbers the same way.
+
+Scripts in the repository root import it directly. Scripts in backend/ add
+the repository root to sys.path before importing.
+"""
@@ -0,0 +1,130 @@
+"""
+US EPA Air Quality Index from breakpoint tables
+
+Each table lists (concentration, AQI) knots; the index is linear between
+consecutive knots and capped at 500. Every script computes AQI through this
+module so the dashboard, the backend and the archives agree.
+
+Two paths give identical results:
+- calculate_aqi(pm25, pm10=None): scalar fast path (bisect, no NumPy)
+- calculate_aqi_array(pm25, pm10=None): batch path (np.searchsorted), e.g.
+  for recomputing AQI over a whole Excel history in one call
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+
+# PM2.5 (µg/m³, 24-hour) -> AQI
+PM25_BREAKPOINTS = (
+    (0.0, 0),
+    (12.0, 50),
+    (35.4, 100),
+    (55.4, 150),
+    (150.4, 200),
+    (250.4, 300),
+    (350.4, 400),
+    (500.4, 500),
+)
+
+# PM10 (µg/m³, 24-hour) -> AQI
+PM10_BREAKPOINTS = (
+    (0.0, 0),
+    (54.0, 50),
+    (154.0, 100),
+    (254.0, 150),
+    (354.0, 200),
+    (424.0, 300),
+    (504.0, 400),
+    (604.0, 500),
+)
+
+AQI_CATEGORIES = (
+    (50, 'Good'),
+    (100, 'Moderate'),
+    (150, 'Unhealthy for Sensitive Groups'),
+    (200, 'Unhealthy'),
+    (300, 'Very Unhealthy'),
+)
+
+
+class BreakpointTable:
+    """Piecewise-linear concentration -> AQI mapping"""
+
+    def __init__(self, breakpoints):
+        self.concentrations = [float(c) for c, _ in breakpoints]
+        self.indices = [float(i) for _, i in breakpoints]
+        self.slopes = [
+            (self.indices[k + 1] - self.indices[k]) / (self.concentrations[k + 1] - self.concentrations[k])
+            for k in range(len(breakpoints) - 1)
+        ]
+
+        self._conc_array = np.array(self.concentrations)
+        self._index_array = np.array(self.indices)
+        self._slope_array = np.array(self.slopes)
+
+    def aqi(self, concentration):
+        """AQI for a single concentration (0 for missing/invalid values)"""
+        try:
+            c = float(concentration)
+        except (TypeError, ValueError):
+            return 0
+
+        # NaN fails every comparison, so it lands here too
+        if not c > 0:
+            return 0
+        if c >= self.concentrations[-1]:
+            return int(self.indices[-1])
+
+        k = bisect_right(self.concentrations, c) - 1
+        return int(self.indices[k] + self.slopes[k] * (c - self.concentrations[k]))
+
+    def aqi_array(self, concentrations):
+        """AQI for an array of concentrations"""
+        c = np.asarray(concentrations, dtype=float)
+        c = np.clip(np.nan_to_num(c, nan=0.0), 0.0, self._conc_array[-1])
+
+        k = np.searchsorted(self._conc_array, c, side='right') - 1
+        k = np.minimum(k, len(self.slopes) - 1)
+
+        aqi = self._index_array[k] + self._slope_array[k] * (c - self._conc_array[k])
+        aqi = np.where(c >= self._conc_array[-1], self._index_array[-1], aqi)
+        return aqi.astype(int)
+
+
+PM25_TABLE = BreakpointTable(PM25_BREAKPOINTS)
+PM10_TABLE = BreakpointTable(PM10_BREAKPOINTS)
+
+
+def pm25_to_aqi(pm25):
+    """Convert PM2.5 to AQI"""
+    return PM25_TABLE.aqi(pm25)
+
+
+def pm10_to_aqi(pm10):
+    """Convert PM10 to AQI"""
+    return PM10_TABLE.aqi(pm10)
+
+
+def calculate_aqi(pm25, pm10=None):
+    """AQI from PM2.5, or the worse of PM2.5 and PM10 when PM10 is given"""
+    aqi = PM25_TABLE.aqi(pm25)
+    if pm10 is not None:
+        aqi = max(aqi, PM10_TABLE.aqi(pm10))
+    return aqi
+
+
+def calculate_aqi_array(pm25, pm10=None):
+    """Vectorized calculate_aqi over arrays/Series of readings"""
+    aqi = PM25_TABLE.aqi_array(pm25)
+    if pm10 is not None:
+        aqi = np.maximum(aqi, PM10_TABLE.aqi_array(pm10))
+    return aqi
+
+
+def aqi_category(aqi):
+    """Get AQI category name"""
+    for upper, name in AQI_CATEGORIES:
+        if aqi <= upper:
+            return name
+    return 'Hazardous'
@@ -0,0 +1,129 @@
+"""
+Micro-batched next-reading prediction across sensors
+
+Instead of predicting each sensor separately (one model call per sensor per
+target), the last N_LAGS readings of every sensor are stacked into one
+(n_sensors, N_LAGS) matrix per target and predicted with a single call, so
+the cost of a cycle grows with the number of targets, not sensors x targets.
+
+predict_history() reads the lag windows straight out of a SensorHistory
+(see ring_buffer.py); predict_many() takes lists of reading dicts. When
+every target has a linear model, predict_history() goes further and
+predicts all targets for all sensors in one FusedLinearKernel call (see
+linear_kernel.py).
+"""
+
+import numpy as np
+
+from airsense.model_registry import TARGET_UNITS
+from airsense.schema import resolve_targets
+
+N_LAGS = 3
+
+
+def _lag_window(readings, field):
+    """Last N_LAGS values of a field, or None if any is missing"""
+    if len(readings) < N_LAGS:
+        return None
+
+    window = []
+    for reading in readings[-N_LAGS:]:
+        value = reading.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        window.append(value)
+    return window
+
+
+class BatchPredictor:
+    """Predicts every target for many sensors with one model call per target"""
+
+    def __init__(self, registry, targets=None):
+        self.registry = registry
+        self.targets = list(targets) if targets is not None else registry.available_targets()
+
+    def predict_many(self, buffers):
+        """
+        Predict the next reading for every sensor
+
+        buffers maps sensor_id -> list of reading dicts (oldest first).
+        Returns sensor_id -> {target: {'predicted', 'current', 'unit'}} for
+        sensors with at least N_LAGS readings.
+        """
+        results = {sensor_id: {} for sensor_id, readings in buffers.items() if len(readings) >= N_LAGS}
+        # Each sensor's field names, resolved once per distinct key set
+        columns = {sensor_id: resolve_targets(buffers[sensor_id][-1]) for sensor_id in results}
+
+        for target in self.targets:
+            predictor = self.registry.predictor(target, n_features=N_LAGS)
+            if predictor is None:
+                continue
+
+            sensor_ids = []
+            windows = []
+            for sensor_id in results:
+                field = columns[sensor_id].get(target)
+                if field is None:
+                    continue
+                window = _lag_window(buffers[sensor_id], field)
+                if window is not None:
+                    sensor_ids.append(sensor_id)
+                    windows.append(window)
+
+            if windows:
+                self._predict_target(target, predictor, sensor_ids, np.array(windows, dtype=float), results)
+
+        return results
+
+    def predict_history(self, history, sensor_ids=None):
+        """
+        Predict the next reading for sensors in a SensorHistory
+
+        Same result shape as predict_many(); the lag windows of all sensors
+        are copied out of the ring buffers in one locked snapshot.
+        """
+        sensor_ids = history.sensor_ids() if sensor_ids is None else sensor_ids
+        ids, stacked = history.snapshot(sensor_ids, N_LAGS)
+        results = {sensor_id: {} for sensor_id in ids}
+        if not ids:
+            return results
+
+        kernel = self.registry.fused_kernel(self.targets, N_LAGS)
+        if kernel is not None and all(target in history.index for target in kernel.targets):
+            positions = [history.index[target] for target in kernel.targets]
+            # (n_sensors, n_targets, N_LAGS): one window per sensor and target
+            windows = stacked[:, :, positions].transpose(0, 2, 1)
+            predicted = kernel.predict(windows)
+            for column, target in enumerate(kernel.targets):
+                X = windows[:, column]
+                complete = ~np.isnan(X).any(axis=1)
+                ready = [sensor_id for sensor_id, ok in zip(ids, complete) if ok]
+                self._store(target, ready, predicted[complete, column], X[complete], results)
+            return results
+
+        for target in self.targets:
+            position = history.index.get(target)
+            predictor = self.registry.predictor(target, n_features=N_LAGS)
+            if position is None or predictor is None:
+                continue
+
+            X = stacked[:, :, position]
+            complete = ~np.isnan(X).any(axis=1)
+            if complete.any():
+                ready = [sensor_id for sensor_id, ok in zip(ids, complete) if ok]
+                self._predict_target(target, predictor, ready, X[complete], results)
+
+        return results
+
+    def _predict_target(self, target, predictor, sensor_ids, X, results):
+        """One model call for every sensor's window of a target"""
+        self._store(target, sensor_ids, predictor.predict(X), X, results)
+
+    def _store(self, target, sensor_ids, predicted, X, results):
+        """Put each sensor's prediction and latest value of a target into results"""
+        for row, sensor_id in enumerate(sensor_ids):
+            results[sensor_id][target] = {
+                'predicted': round(float(predicted[row]), 2),
+                'current': round(float(X[row, -1]), 2),
+                'unit': TARGET_UNITS[target]
+            }
@@ -0,0 +1,215 @@
+"""
+Append-only reading archive with regenerated Excel views
+
+Adding a row to output*.xlsx used to mean reading the whole workbook,
+concatenating one row, re-parsing every received_at to dedup and sort, and
+writing everything back: O(n) per reading, O(n^2) over a day.
+ReadingArchive appends readings to an NDJSON segment store instead (see
+ndjson_store.py) and writes the workbook only when asked:
+
+    output1.xlsx               Excel view, regenerated from the archive
+    output1.archive/           segments, plus state.json (columns, cursor, exported)
+
+append() costs one line write whatever the archive's size. export() rewrites
+the workbook from the archive, deduplicated by received_at and sorted.
+export_if_due() exports at most every `export_interval` seconds, and only
+when something was appended. To export on demand:
+
+    python -m airsense.excel_archive export output1.xlsx
+
+On first use an existing workbook is imported as the start of the archive,
+and its columns become the view's columns. Readings are mapped onto them
+(pm2_5 -> uplink_message.decoded_payload.pm2_5 for TTN-export sheets), and
+fields with no column are left out. From then on the archive is the source
+of truth: edits made in the workbook are overwritten by the next export.
+
+`cursor` is an optional position in the readings' source (a capture
+offset). It is saved with the archive, so a restart resumes after the last
+archived record. When the source is cleared (clear_json.py) its offsets
+restart at 0; rewind() notices a source shorter than the cursor and starts
+the cursor over.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from airsense.ndjson_store import SegmentStore
+
+EXPORT_INTERVAL = 60  # Seconds between scheduled exports
+PAYLOAD_PREFIX = 'uplink_message.decoded_payload.'
+
+
+def archive_dir(excel_file):
+    """Archive directory for a workbook (output1.xlsx -> output1.archive)"""
+    return os.path.splitext(excel_file)[0] + '.archive'
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+class ReadingArchive:
+    """NDJSON archive behind one Excel workbook"""
+
+    def __init__(self, excel_file, export_interval=EXPORT_INTERVAL, max_pm25=None):
+        self.excel_file = excel_file
+        self.directory = archive_dir(excel_file)
+        self.export_interval = export_interval
+        self.max_pm25 = max_pm25  # Readings above this are rejected as sensor errors
+        self.store = SegmentStore(self.directory)
+        self._last_export = None
+        self.state = self._load_state()
+        if self.state is None:
+            self.state = self._seed()
+
+    def _state_path(self):
+        return os.path.join(self.directory, 'state.json')
+
+    def _load_state(self):
+        try:
+            with open(self._state_path(), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self):
+        tmp = self._state_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self._state_path())
+
+    def _seed(self):
+        """Import the existing workbook (if any) as the first records"""
+        os.makedirs(self.directory, exist_ok=True)
+        columns = []
+        rows = 0
+        if os.path.exists(self.excel_file):
+            sheet = pd.read_excel(self.excel_file)
+            columns = [str(column) for column in sheet.columns]
+            for record in sheet.to_dict('records'):
+                self.store.append({str(key): value for key, value in record.items() if not pd.isna(value)})
+            rows = len(sheet)
+            print(f"[ARCHIVE] Imported {rows} rows from {self.excel_file} into {self.directory}")
+        # Workbook row N is source record N, as the row-count syncs assumed
+        self.state = {'columns': columns, 'cursor': rows - 1, 'exported': rows}
+        self._save_state()
+        return self.state
+
+    @property
+    def cursor(self):
+        return self.state['cursor']
+
+    def rewind(self, end):
+        """
+        Start the cursor over if the source now holds only `end` records
+
+        A cursor at or past `end` means the source was cleared and its
+        offsets restarted. Returns True if the cursor was reset.
+        """
+        if self.state['cursor'] < max(end, 0):
+            return False
+        print(f"[ARCHIVE] {self.excel_file}: source restarted (cursor {self.state['cursor']}, {end} records),"
+              f" archiving from its first record")
+        self.state['cursor'] = -1
+        self._save_state()
+        return True
+
+    def pending(self):
+        """Records appended since the last export"""
+        return self.store.end_offset() - self.state['exported']
+
+    def _rejected(self, reading):
+        if self.max_pm25 is None:
+            return False
+        pm25 = _number(reading.get('pm2_5', reading.get(PAYLOAD_PREFIX + 'pm2_5')))
+        return pm25 is not None and pm25 > self.max_pm25
+
+    def extend(self, readings, cursor=None):
+        """Archive readings (and move the cursor); returns how many were kept"""
+        kept = 0
+        for reading in readings:
+            if self._rejected(reading):
+                print(f"[ARCHIVE] REJECTED: PM2.5 value {reading.get('pm2_5')} is too high (possible sensor error)")
+                continue
+            self.store.append(reading)
+            kept += 1
+        if cursor is not None:
+            self.state['cursor'] = cursor
+            self._save_state()
+        return kept
+
+    def append(self, reading, cursor=None):
+        return self.extend([reading], cursor) == 1
+
+    def view(self):
+        """The archive as the workbook's DataFrame: mapped columns, deduplicated, sorted"""
+        frame = pd.DataFrame([record for _, record in self.store.read_after(-1)])
+        columns = self.state['columns']
+        if columns:
+            for column in list(frame.columns):
+                long_name = PAYLOAD_PREFIX + column
+                if column not in columns and long_name in columns:
+                    values = frame.pop(column)
+                    frame[long_name] = frame[long_name].combine_first(values) if long_name in frame.columns else values
+            frame = frame.reindex(columns=columns)
+
+        if 'received_at' in frame.columns and len(frame):
+            stamps = pd.to_datetime(frame['received_at'], errors='coerce', utc=True)
+            order = stamps.sort_values(kind='stable').index
+            frame, stamps = frame.loc[order], stamps.loc[order]
+            # Latest copy of each timestamp wins; rows without one are all kept
+            frame = frame[~(stamps.notna() & stamps.duplicated(keep='last'))]
+        return frame.reset_index(drop=True)
+
+    def export(self):
+        """Rewrite the workbook from the archive; returns the row count"""
+        end = self.store.end_offset()
+        self._last_export = time.monotonic()  # A failed export also waits for the next slot
+        frame = self.view()
+        # Write next to it and swap, so readers never see half a workbook
+        tmp = os.path.splitext(self.excel_file)[0] + '.tmp.xlsx'
+        frame.to_excel(tmp, index=False)
+        os.replace(tmp, self.excel_file)
+        self.state['exported'] = end
+        self._save_state()
+        return len(frame)
+
+    def export_if_due(self):
+        """Export if records are pending and the interval has passed; True if it did"""
+        if not self.pending():
+            return False
+        if self._last_export is not None and time.monotonic() - self._last_export < self.export_interval:
+            return False
+        rows = self.export()
+        print(f"[ARCHIVE] {self.excel_file} regenerated ({rows} rows)")
+        return True
+
+    def close(self):
+        self.store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reading archives behind the output*.xlsx workbooks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='Regenerate workbooks from their archives')
+    export_parser.add_argument('files', nargs='+')
+    info_parser = commands.add_parser('info', help='Show archive sizes and pending records')
+    info_parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    for excel_file in args.files:
+        archive = ReadingArchive(excel_file)
+        if args.command == 'export':
+            print(f"[OK] {excel_file}: {archive.export()} rows")
+        else:
+            print(f"{excel_file}: {archive.store.end_offset()} records in {archive.directory},"
+                  f" {archive.pending()} not exported, cursor {archive.cursor}")
+        archive.close()
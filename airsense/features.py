@@ -0,0 +1,216 @@
+"""
+Incremental feature state for the MongoDB prediction engine
+
+predict_and_send.PredictionEngine.prepare_features used to rebuild a
+DataFrame from the last 10 documents for every target on every run: copy,
+shift() for two lags, rolling(5).mean() over every pollutant column, then
+dropna(). FeatureState produces the same latest feature row by updating
+running state in O(1) per column as each document arrives:
+- lag1/lag2 of every column
+- NaN-aware rolling means (window 5, min_periods=1) of every pollutant column
+  and of the target's lag columns (prepare_features also rolls those)
+
+Columns absent from the last HISTORY documents are forgotten, as they would
+be missing from the 10-document DataFrame. When the newest row has a gap
+(a field missing from the latest document, a lag after a gap), features()
+falls back to the last complete row of the window, as dropna() did; those
+rows are recomputed from each column's last HISTORY values.
+"""
+
+from collections import deque
+
+import pandas as pd
+
+ROLLING_WINDOW = 5
+HISTORY = 10
+
+# Columns that get a rolling mean (same keyword match as prepare_features)
+ROLLING_KEYWORDS = ('pm10', 'pm2', 'co2', 'humidity', 'temperature', 'temp', 'hum', 'tvoc', 'pressure')
+
+# Document fields that are never features
+IGNORED_FIELDS = {'_id', 'correlation_ids', 'frm_payload', 'rx_metadata', 'beep', 'received_at'}
+
+
+def _is_rolled(column):
+    return any(keyword in column.lower() for keyword in ROLLING_KEYWORDS)
+
+
+def _mean(values):
+    """Mean of the non-NaN values, NaN if there are none (rolling min_periods=1)"""
+    present = [value for value in values if value == value]
+    return sum(present) / len(present) if present else float('nan')
+
+
+class RollingMean:
+    """Rolling mean over the last `window` values, skipping NaN"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.count = 0
+
+    def push(self, value):
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0]
+            if old == old:
+                self.total -= old
+                self.count -= 1
+        self.values.append(value)
+        if value == value:
+            self.total += value
+            self.count += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+
+class ColumnState:
+    """Running lags and rolling means for one column"""
+
+    def __init__(self):
+        self.recent = deque([float('nan')] * 3, maxlen=3)
+        self.rolling = RollingMean()
+        self.lag1_rolling = RollingMean()
+        self.lag2_rolling = RollingMean()
+        # Raw values of the last HISTORY rows, for rows older than the newest
+        self.history = deque(maxlen=HISTORY)
+        # (row, key position) of recent appearances, for column ordering
+        self.seen = deque(maxlen=HISTORY)
+
+    def push(self, value):
+        self.recent.append(value)
+        self.history.append(value)
+        self.rolling.push(value)
+        self.lag1_rolling.push(self.recent[1])
+        self.lag2_rolling.push(self.recent[0])
+
+    @property
+    def value(self):
+        return self.recent[2]
+
+
+class FeatureState:
+    """Latest prepare_features() row for any target, updated per document"""
+
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+
+    def update(self, document):
+        """Feed one document (oldest first)"""
+        self.rows += 1
+
+        values = {}
+        positions = {}
+        for position, (key, value) in enumerate(document.items()):
+            if key in IGNORED_FIELDS or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            values[key] = float(value)
+            positions[key] = position
+
+        for column in values:
+            if column not in self.columns:
+                state = ColumnState()
+                # Earlier rows of a new column are NaN
+                for _ in range(min(self.rows - 1, HISTORY)):
+                    state.push(float('nan'))
+                self.columns[column] = state
+
+        for column, state in list(self.columns.items()):
+            if column in values:
+                state.push(values[column])
+                state.seen.append((self.rows, positions[column]))
+            elif self.rows - state.seen[-1][0] >= HISTORY:
+                del self.columns[column]
+            else:
+                state.push(float('nan'))
+
+    def ordered_columns(self):
+        """Columns in DataFrame order: first appearance within the window"""
+        oldest = self.rows - HISTORY
+        def first_seen(column):
+            return next(seen for seen in self.columns[column].seen if seen[0] > oldest)
+        return sorted(self.columns, key=first_seen)
+
+    def latest(self, column):
+        """Latest raw value of a column (NaN if absent)"""
+        state = self.columns.get(column)
+        return state.value if state is not None else float('nan')
+
+    def features(self, target_col):
+        """
+        Feature row for predicting `target_col`, or None if no row is complete
+
+        Column order matches prepare_features(): raw columns, target lags,
+        then rolling means. Like prepare_features() + dropna(), this is the
+        newest row without NaN in the last HISTORY documents.
+        """
+        columns = self.ordered_columns()
+        row = {}
+        for column in columns:
+            if column != target_col:
+                row[column] = self.columns[column].value
+
+        target = self.columns.get(target_col)
+        if target is not None:
+            row[f'{target_col}_lag1'] = target.recent[1]
+            row[f'{target_col}_lag2'] = target.recent[0]
+
+        for column in columns:
+            if column != target_col and _is_rolled(column):
+                row[f'{column}_rolling_mean_{ROLLING_WINDOW}'] = self.columns[column].rolling.mean
+
+        if target is not None and _is_rolled(target_col):
+            row[f'{target_col}_lag1_rolling_mean_{ROLLING_WINDOW}'] = target.lag1_rolling.mean
+            row[f'{target_col}_lag2_rolling_mean_{ROLLING_WINDOW}'] = target.lag2_rolling.mean
+
+        # prepare_features() drops rows with a missing target value too
+        features = pd.Series(row, dtype=float)
+        if not features.isna().any() and (target is None or target.value == target.value):
+            return features
+
+        for back in range(1, min(self.rows, HISTORY)):
+            features = self._past_features(columns, target_col, back)
+            if features is not None:
+                return features
+        return None
+
+    def _past_features(self, columns, target_col, back):
+        """
+        Feature row `back` documents before the newest, or None if incomplete
+
+        Lags and rolling means only look back to the first document of the
+        window, as they would in the 10-document DataFrame.
+        """
+        position = min(self.rows, HISTORY) - 1 - back
+        start = max(0, position - ROLLING_WINDOW + 1)
+
+        def at(column, index):
+            return self.columns[column].history[index] if index >= 0 else float('nan')
+
+        row = {}
+        for column in columns:
+            if column != target_col:
+                row[column] = at(column, position)
+
+        target = self.columns.get(target_col)
+        if target is not None:
+            row[f'{target_col}_lag1'] = at(target_col, position - 1)
+            row[f'{target_col}_lag2'] = at(target_col, position - 2)
+
+        for column in columns:
+            if column != target_col and _is_rolled(column):
+                row[f'{column}_rolling_mean_{ROLLING_WINDOW}'] = _mean(
+                    at(column, index) for index in range(start, position + 1))
+
+        if target is not None and _is_rolled(target_col):
+            row[f'{target_col}_lag1_rolling_mean_{ROLLING_WINDOW}'] = _mean(
+                at(target_col, index - 1) for index in range(start, position + 1))
+            row[f'{target_col}_lag2_rolling_mean_{ROLLING_WINDOW}'] = _mean(
+                at(target_col, index - 2) for index in range(start, position + 1))
+
+        features = pd.Series(row, dtype=float)
+        if features.isna().any() or (target is not None and at(target_col, position) != at(target_col, position)):
+            return None
+        return features
@@ -0,0 +1,205 @@
+"""
+Event-driven change notification for MQTT capture files
+
+The JSON live scripts used to poll: stat every capture every few seconds,
+or re-read it. CaptureWatcher gets file-system events from watchdog
+(inotify on Linux) instead, so a reading reaches the script as soon as its
+write is done and nothing runs while the captures are idle:
+
+    watcher = CaptureWatcher({1: 'mqtt_data_sensor1.json', 3: 'mqtt_data.json'}).start()
+    while True:
+        for sensor_id in watcher.wait(CHECK_INTERVAL):   # empty set on timeout
+            ...
+
+A capture is its JSON file or its NDJSON store (see ndjson_store.py);
+writes to either count. A capture is reported once per burst of writes:
+
+- debounce: it waits until no event has arrived for `debounce` seconds
+  (a close-after-write event ends the burst at once)
+- write completion: a JSON array must end in ']' (or '}'); a file still
+  being written is checked again, up to `settle_timeout` seconds
+- it is only reported if capture_version() changed, so a burst that added
+  no store record is dropped
+
+Without watchdog installed, the watcher polls capture_version() every
+`poll_interval` seconds instead.
+"""
+
+import os
+import threading
+import time
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+from airsense.ndjson_store import capture_exists, capture_version, store_dir
+
+DEBOUNCE = 0.2
+SETTLE_TIMEOUT = 5.0
+POLL_INTERVAL = 5.0
+
+_WRITE_EVENTS = {'created', 'modified', 'moved', 'closed'}
+
+
+def _version(capture_file):
+    try:
+        return capture_version(capture_file) if capture_exists(capture_file) else None
+    except OSError:
+        return None
+
+
+def _write_complete(capture_file):
+    """False while a JSON capture does not end its top-level value yet"""
+    if os.path.isdir(store_dir(capture_file)):
+        return True  # Store records are indexed only once complete
+    try:
+        with open(capture_file, 'rb') as f:
+            f.seek(max(os.path.getsize(capture_file) - 64, 0))
+            tail = f.read().rstrip()
+    except OSError:
+        return True  # Deleted: nothing left to wait for
+    return not tail or tail.endswith((b']', b'}'))
+
+
+class _Handler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type in _WRITE_EVENTS:
+            self.watcher._event(event)
+
+
+class CaptureWatcher:
+    """Reports which captures gained data, debounced per capture"""
+
+    name = 'watch'
+
+    def __init__(self, captures, debounce=DEBOUNCE, settle_timeout=SETTLE_TIMEOUT, poll_interval=POLL_INTERVAL):
+        self.captures = dict(captures)  # key -> capture file
+        self.debounce = debounce
+        self.settle_timeout = settle_timeout
+        self.poll_interval = poll_interval
+        self._files = {}
+        self._stores = {}
+        for key, capture_file in self.captures.items():
+            self._files[os.path.abspath(capture_file)] = key
+            self._stores[os.path.abspath(store_dir(capture_file))] = key
+        self._versions = {}
+        self._due = {}       # key -> time the burst is over
+        self._started = {}   # key -> time of the burst's first event
+        self._ready = set()
+        self._changed = threading.Condition()
+        self._stopping = False
+        self._observer = None
+        self._thread = None
+        self._watched = set()
+        self.counters = {'events': 0, 'reported': 0}
+
+    def start(self):
+        self._versions = {key: _version(path) for key, path in self.captures.items()}
+        if Observer is not None:
+            self._observer = Observer()
+            for directory in set(map(os.path.dirname, self._files)) | set(self._stores):
+                self._watch(directory)
+            self._observer.start()
+        else:
+            print(f"[WATCH] watchdog not installed, polling captures every {self.poll_interval:g}s")
+        self._thread = threading.Thread(target=self._run, name='capture-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def _watch(self, directory):
+        if directory not in self._watched and os.path.isdir(directory):
+            self._observer.schedule(_Handler(self), directory, recursive=False)
+            self._watched.add(directory)
+
+    def _key(self, path):
+        path = os.path.abspath(path)
+        if path in self._files:
+            return self._files[path]
+        if path in self._stores:
+            return self._stores[path]
+        return self._stores.get(os.path.dirname(path))
+
+    def _event(self, event):
+        """Observer thread: start or extend the burst of the capture it touched"""
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            key = self._key(path) if path else None
+            if key is None:
+                continue
+            if event.is_directory:
+                # A store created after start() needs its own watch
+                self._watch(os.path.abspath(path))
+            now = time.monotonic()
+            with self._changed:
+                self.counters['events'] += 1
+                self._started.setdefault(key, now)
+                self._due[key] = now if event.event_type == 'closed' else now + self.debounce
+                self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                if self._stopping:
+                    return
+                if self._observer is None:
+                    self._changed.wait(self.poll_interval)
+                    due = list(self.captures)
+                else:
+                    now = time.monotonic()
+                    due = [key for key, at in self._due.items() if at <= now]
+                    if not due:
+                        timeout = min(self._due.values()) - now if self._due else None
+                        self._changed.wait(timeout)
+                        continue
+            self._settle(due)
+
+    def _settle(self, keys):
+        """Report the captures whose write finished and whose content changed"""
+        now = time.monotonic()
+        reported = set()
+        for key in keys:
+            capture_file = self.captures[key]
+            if not _write_complete(capture_file) and now - self._started.get(key, now) < self.settle_timeout:
+                with self._changed:
+                    self._due[key] = now + self.debounce
+                continue
+            with self._changed:
+                self._due.pop(key, None)
+                self._started.pop(key, None)
+            version = _version(capture_file)
+            if version != self._versions.get(key):
+                self._versions[key] = version
+                if version is not None:
+                    reported.add(key)
+        if reported:
+            with self._changed:
+                self._ready |= reported
+                self.counters['reported'] += len(reported)
+                self._changed.notify_all()
+
+    def wait(self, timeout=None):
+        """Set of keys whose captures changed, waiting up to `timeout` seconds for one"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._ready or self._stopping, timeout)
+            ready, self._ready = self._ready, set()
+            return ready
+
+    def stats(self):
+        with self._changed:
+            return dict(self.counters)
+
+    def stop(self):
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(5)
+        if self._thread is not None:
+            self._thread.join(5)
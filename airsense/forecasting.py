@@ -0,0 +1,155 @@
+"""
+Model-driven multi-step forecasting
+
+Rolls the per-target 3-lag regression models (see train_linear_regression.py)
+forward recursively: each step predicts the next reading from the previous
+three, then shifts the window by one. All sensors are advanced together as
+one (n_sensors, 3) matrix per target, so a horizon of H steps costs H model
+calls per target no matter how many sensors there are.
+
+Forecasts are cached until new readings arrive for any sensor.
+"""
+
+import threading
+from collections import deque
+
+import numpy as np
+
+from airsense.model_registry import TARGET_FIELDS, get_registry
+
+N_LAGS = 3
+
+# Fields that can never go below zero while rolling forward
+NON_NEGATIVE_FIELDS = {'pm2_5', 'pm10', 'co2', 'tvoc', 'humidity'}
+
+
+class ForecastEngine:
+    """Recursive multi-step forecaster over every known sensor"""
+
+    def __init__(self, model_dir):
+        self.registry = get_registry(model_dir)
+        self._targets = {field: target for target, field in TARGET_FIELDS.items()}
+        self._history = {}
+        self._generation = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def load_models(self):
+        """Count targets with models on disk; they load lazily on first forecast"""
+        return len(self.registry.available_targets())
+
+    def observe(self, sensor_key, reading):
+        """
+        Record a new reading for a sensor
+
+        Returns True if the reading was new. Identical consecutive readings
+        (e.g. periodic re-sends of the same data) are ignored so they do not
+        flatten the lag window or invalidate the cache.
+        """
+        values = {}
+        for field in TARGET_FIELDS.values():
+            value = reading.get(field)
+            if value is None:
+                continue
+            try:
+                values[field] = float(value)
+            except (TypeError, ValueError):
+                continue
+
+        if not values:
+            return False
+
+        with self._lock:
+            history = self._history.setdefault(sensor_key, deque(maxlen=N_LAGS))
+            if history and history[-1] == values:
+                return False
+
+            history.append(values)
+            self._generation += 1
+            self._cache.clear()
+            return True
+
+    def has_sensor(self, sensor_key):
+        """Check whether any readings have been observed for a sensor"""
+        return sensor_key in self._history
+
+    def forecast(self, steps, fields=None):
+        """
+        Forecast every known sensor `steps` readings ahead
+
+        Returns (sensor_keys, {field: array of shape (n_sensors, steps)}).
+        Values are NaN where a sensor never reported that field.
+        """
+        fields = tuple(fields) if fields else tuple(TARGET_FIELDS.values())
+        cache_key = (steps, fields)
+
+        with self._lock:
+            generation = self._generation
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            sensor_keys = list(self._history.keys())
+            windows = {field: self._lag_matrix(sensor_keys, field) for field in fields}
+
+        result = (sensor_keys, {
+            field: self._roll_forward(field, window, steps)
+            for field, window in windows.items()
+        })
+
+        with self._lock:
+            # Only cache if no new reading arrived while we were computing
+            if generation == self._generation:
+                self._cache[cache_key] = result
+
+        return result
+
+    def forecast_sensor(self, sensor_key, steps, fields=None):
+        """Forecast a single sensor, reusing the cached fleet-wide batch"""
+        sensor_keys, paths = self.forecast(steps, fields)
+        if sensor_key not in sensor_keys:
+            return None
+
+        row = sensor_keys.index(sensor_key)
+        return {field: path[row] for field, path in paths.items()}
+
+    def _lag_matrix(self, sensor_keys, field):
+        """Build the (n_sensors, N_LAGS) window, padding short histories"""
+        window = np.full((len(sensor_keys), N_LAGS), np.nan)
+
+        for row, sensor_key in enumerate(sensor_keys):
+            values = [r[field] for r in self._history[sensor_key] if field in r]
+            if not values:
+                continue
+            # Pad with the oldest value until three readings have arrived
+            values = [values[0]] * (N_LAGS - len(values)) + values
+            window[row] = values[-N_LAGS:]
+
+        return window
+
+    def _roll_forward(self, field, window, steps):
+        """Advance every sensor's window `steps` times through the model"""
+        path = np.full((window.shape[0], steps), np.nan)
+        valid = ~np.isnan(window).any(axis=1)
+
+        if steps == 0 or not valid.any():
+            return path
+
+        # Models trained on a wider feature set cannot be rolled forward
+        predictor = self.registry.predictor(self._targets[field], n_features=N_LAGS)
+        window = window[valid].copy()
+
+        for step in range(steps):
+            if predictor is None:
+                # No trained model: hold the latest reading
+                next_values = window[:, -1]
+            else:
+                next_values = predictor.predict(window)
+                if field in NON_NEGATIVE_FIELDS:
+                    next_values = np.maximum(next_values, 0.0)
+
+            path[valid, step] = next_values
+            window[:, :-1] = window[:, 1:]
+            window[:, -1] = next_values
+
+        return path
@@ -0,0 +1,278 @@
+"""
+Columnar reading history partitioned by sensor and day
+
+Training and combine scripts used to load history with pd.read_excel over
+output*.xlsx, which parses every cell of every row each time. HistoryStore
+keeps the same readings as Parquet files, one per sensor and UTC day:
+
+    history/sensor_id=3/date=2026-10-18/part.parquet
+    history/sensor_id=3/date=2026-10-19/part.parquet
+
+Every file has the canonical schema: received_at (UTC timestamp) and one
+float column per target field (pm2_5, pm10, co2, tvoc, temperature,
+humidity, pressure). sensor_id and date come from the directory names.
+Source columns are mapped with resolve_targets(), so workbooks with
+uplink_message.decoded_payload.pm2_5 or PM2.5 columns land in pm2_5.
+
+query() reads only what it is asked for: sensor and date directories
+outside the request are never opened, only the requested columns are
+decoded, and the received_at range is pushed down to the Parquet row
+groups:
+
+    frame = HistoryStore().query(sensors=[3], columns=['pm2_5'], start='2026-09-01')
+
+write() merges readings into their day partitions, keeping the last copy
+of each received_at, so importing the same source twice changes nothing.
+Readings without a valid received_at cannot be placed in a day and are
+skipped. To fill the store from the existing workbooks, archives or
+captures:
+
+    python -m airsense.history_store import --sensor 3 output3.xlsx mqtt_data.json
+    python -m airsense.history_store info
+
+Requires pyarrow. Without it exists() and updated() report an empty store,
+so readers fall back to the workbooks.
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from airsense.excel_archive import archive_dir
+from airsense.model_registry import TARGET_FIELDS
+from airsense.ndjson_store import SegmentStore, capture_exists, read_after
+from airsense.schema import resolve_targets
+
+HISTORY_DIR = 'history'
+PART_FILE = 'part.parquet'
+FIELDS = tuple(TARGET_FIELDS.values())
+ROW_GROUP_SIZE = 16384  # Rows per row group: the unit received_at filters skip
+
+if pa is not None:
+    TIMESTAMP = pa.timestamp('us', tz='UTC')
+    FILE_SCHEMA = pa.schema([('received_at', TIMESTAMP)] + [(field, pa.float64()) for field in FIELDS])
+    PARTITIONING = ds.partitioning(pa.schema([('sensor_id', pa.int32()), ('date', pa.string())]), flavor='hive')
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError('the history store requires pyarrow (pip install pyarrow)')
+
+
+def _utc(value):
+    """pd.Timestamp in UTC for a string, datetime or Timestamp (naive = UTC)"""
+    stamp = pd.Timestamp(value)
+    return stamp.tz_localize('UTC') if stamp.tzinfo is None else stamp.tz_convert('UTC')
+
+
+def canonical_frame(frame):
+    """received_at plus the target fields of a readings DataFrame, in the canonical types"""
+    targets = resolve_targets(frame.columns)
+    canonical = pd.DataFrame(index=frame.index)
+    if 'received_at' in frame.columns:
+        canonical['received_at'] = pd.to_datetime(frame['received_at'], errors='coerce', utc=True, format='ISO8601')
+    else:
+        canonical['received_at'] = pd.Series(pd.NaT, index=frame.index, dtype='datetime64[us, UTC]')
+    for target, field in TARGET_FIELDS.items():
+        if target in targets:
+            canonical[field] = pd.to_numeric(frame[targets[target]], errors='coerce').astype('float64')
+        else:
+            canonical[field] = float('nan')
+    canonical['received_at'] = canonical['received_at'].astype('datetime64[us, UTC]')
+    return canonical.reset_index(drop=True)
+
+
+class HistoryStore:
+    """Parquet readings under `directory`, one file per sensor and day"""
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory
+
+    def _partition(self, sensor_id, day):
+        return os.path.join(self.directory, f'sensor_id={sensor_id}', f'date={day}')
+
+    def exists(self):
+        """True if the store can be read and has data"""
+        return pa is not None and bool(self.sensors())
+
+    def sensors(self):
+        """Sensor IDs with at least one partition"""
+        if not os.path.isdir(self.directory):
+            return []
+        sensors = []
+        for name in os.listdir(self.directory):
+            key, _, value = name.partition('=')
+            if key == 'sensor_id' and value.isdigit():
+                sensors.append(int(value))
+        return sorted(sensors)
+
+    def days(self, sensor_id):
+        """'YYYY-MM-DD' days stored for a sensor, oldest first"""
+        directory = os.path.join(self.directory, f'sensor_id={sensor_id}')
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[5:] for name in os.listdir(directory)
+                      if name.startswith('date=') and os.path.exists(os.path.join(directory, name, PART_FILE)))
+
+    def updated(self, sensor_id):
+        """Modification time of a sensor's newest partition, or None"""
+        days = self.days(sensor_id) if pa is not None else []
+        if not days:
+            return None
+        return os.path.getmtime(os.path.join(self._partition(sensor_id, days[-1]), PART_FILE))
+
+    # Writing
+
+    def write(self, sensor_id, readings):
+        """Merge readings (DataFrame or list of dicts) into the sensor's day partitions; returns rows written"""
+        require_pyarrow()
+        frame = readings if isinstance(readings, pd.DataFrame) else pd.DataFrame(list(readings))
+        if frame.empty:
+            return 0
+        frame = canonical_frame(frame)
+        frame = frame[frame['received_at'].notna()]
+        written = 0
+        for day, rows in frame.groupby(frame['received_at'].dt.strftime('%Y-%m-%d'), sort=True):
+            self._merge(sensor_id, day, rows)
+            written += len(rows)
+        return written
+
+    def _merge(self, sensor_id, day, rows):
+        directory = self._partition(sensor_id, day)
+        path = os.path.join(directory, PART_FILE)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            rows = pd.concat([pq.read_table(path, schema=FILE_SCHEMA).to_pandas(), rows], ignore_index=True)
+        rows = rows.drop_duplicates('received_at', keep='last').sort_values('received_at', kind='stable')
+        table = pa.Table.from_pandas(rows, schema=FILE_SCHEMA, preserve_index=False)
+        # Write next to it and swap, so readers never see half a file
+        tmp = path + '.tmp'
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp, path)
+
+    # Reading
+
+    def _files(self, sensors, start_day, end_day):
+        files = []
+        for sensor_id in (self.sensors() if sensors is None else sorted(set(sensors))):
+            for day in self.days(sensor_id):
+                if (start_day is None or day >= start_day) and (end_day is None or day <= end_day):
+                    files.append(os.path.join(self._partition(sensor_id, day), PART_FILE))
+        return files
+
+    def query(self, sensors=None, columns=None, start=None, end=None):
+        """
+        Readings as a DataFrame: sensor_id, received_at and `columns`
+
+        sensors: IDs to read (default: all); columns: target fields (default:
+        all of FIELDS); start/end: received_at bounds, inclusive (strings,
+        datetimes or Timestamps; naive means UTC). Rows come ordered by
+        sensor, then received_at.
+        """
+        require_pyarrow()
+        columns = list(FIELDS if columns is None else columns)
+        unknown = [column for column in columns if column not in FIELDS]
+        if unknown:
+            raise ValueError(f"unknown history columns: {', '.join(unknown)} (stored: {', '.join(FIELDS)})")
+        start = _utc(start) if start is not None else None
+        end = _utc(end) if end is not None else None
+        names = ['sensor_id', 'received_at'] + columns
+
+        files = self._files(sensors,
+                            start.strftime('%Y-%m-%d') if start is not None else None,
+                            end.strftime('%Y-%m-%d') if end is not None else None)
+        if not files:
+            return pd.DataFrame({
+                'sensor_id': pd.Series(dtype='int32'),
+                'received_at': pd.Series(dtype='datetime64[us, UTC]'),
+                **{column: pd.Series(dtype='float64') for column in columns},
+            })
+
+        dataset = ds.dataset(files, schema=FILE_SCHEMA.append(pa.field('sensor_id', pa.int32())),
+                             format='parquet', partitioning=PARTITIONING, partition_base_dir=self.directory)
+        condition = None
+        if start is not None:
+            condition = ds.field('received_at') >= pa.scalar(start.to_pydatetime(), type=TIMESTAMP)
+        if end is not None:
+            before_end = ds.field('received_at') <= pa.scalar(end.to_pydatetime(), type=TIMESTAMP)
+            condition = before_end if condition is None else condition & before_end
+        # Files are listed by sensor and day and each is sorted, so the table needs no sort
+        return dataset.to_table(columns=names, filter=condition).to_pandas()
+
+    def tail(self, sensor_id, rows, columns=None):
+        """A sensor's newest `rows` readings, reading only as many day partitions as needed"""
+        require_pyarrow()
+        frames = []
+        count = 0
+        for day in reversed(self.days(sensor_id)):
+            frame = self.query([sensor_id], columns, start=day, end=f'{day} 23:59:59.999999')
+            frames.insert(0, frame)
+            count += len(frame)
+            if count >= rows:
+                break
+        if not frames:
+            return self.query([sensor_id], columns)
+        return pd.concat(frames, ignore_index=True).tail(rows).reset_index(drop=True)
+
+
+def read_source(path):
+    """Readings of a workbook, its archive or a capture, as a DataFrame"""
+    if path.endswith('.xlsx'):
+        directory = archive_dir(path)
+        if os.path.isdir(directory):
+            # The archive holds everything the workbook shows, and what it has not exported yet
+            return pd.DataFrame([record for _, record in SegmentStore(directory).read_after(-1)])
+        return pd.read_excel(path)
+    if capture_exists(path):
+        return pd.DataFrame([record for _, record in read_after(path) if isinstance(record, dict)])
+    raise FileNotFoundError(f'no such workbook or capture: {path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parquet reading history partitioned by sensor and day')
+    parser.add_argument('--dir', default=HISTORY_DIR, help='History directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='Merge workbooks, archives or captures into the history')
+    import_parser.add_argument('--sensor', type=int, required=True, help='Sensor ID the readings belong to')
+    import_parser.add_argument('files', nargs='+')
+    commands.add_parser('info', help='Show sensors, days and rows stored')
+    query_parser = commands.add_parser('query', help='Print readings')
+    query_parser.add_argument('--sensor', type=int, action='append', help='Sensor ID (repeatable; default all)')
+    query_parser.add_argument('--columns', help=f"Comma-separated fields (default: {','.join(FIELDS)})")
+    query_parser.add_argument('--start', help='First received_at, e.g. 2026-09-01')
+    query_parser.add_argument('--end', help='Last received_at')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.dir)
+    if args.command == 'import':
+        for path in args.files:
+            try:
+                frame = read_source(path)
+            except (OSError, ValueError) as e:
+                print(f"[SKIP] {path}: {e}")
+                continue
+            started = time.perf_counter()
+            rows = store.write(args.sensor, frame)
+            print(f"[OK] {path}: {rows} of {len(frame)} readings -> sensor {args.sensor}"
+                  f" ({time.perf_counter() - started:.1f}s)")
+    elif args.command == 'info':
+        for sensor_id in store.sensors():
+            days = store.days(sensor_id)
+            rows = sum(pq.ParquetFile(os.path.join(store._partition(sensor_id, day), PART_FILE)).metadata.num_rows
+                       for day in days)
+            print(f"Sensor {sensor_id}: {rows} readings over {len(days)} days ({days[0]} .. {days[-1]})")
+    else:
+        columns = args.columns.split(',') if args.columns else None
+        started = time.perf_counter()
+        frame = store.query(args.sensor, columns, args.start, args.end)
+        print(frame.to_string(max_rows=40))
+        print(f"\n{len(frame)} readings in {time.perf_counter() - started:.3f}s")
@@ -0,0 +1,109 @@
+"""
+Compiled inference for scaler -> linear regression models
+
+A StandardScaler followed by a LinearRegression is one affine map:
+
+    y = ((x - mean) / scale) @ coef + intercept
+      = x @ (coef / scale) + (intercept - (mean / scale) @ coef)
+
+compile_predictor() folds the scaler into the coefficients once at load
+time, so a prediction is a single NumPy matmul without sklearn's per-call
+input validation. Models that are not linear (e.g. XGBoost) get a wrapper
+with the same predict() interface that scales and calls the model.
+
+FusedLinearKernel stacks every target's folded weights so all targets (and
+all sensors) are predicted in one einsum.
+"""
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+
+class CompiledLinear:
+    """Folded affine predictor: predict(X) = X @ weights + bias"""
+
+    def __init__(self, weights, bias):
+        self.weights = np.ascontiguousarray(weights, dtype=float)
+        self.bias = float(bias)
+        self.n_features = self.weights.shape[0]
+
+    def predict(self, X):
+        return np.asarray(X, dtype=float) @ self.weights + self.bias
+
+
+class ScaledModel:
+    """Fallback for non-linear models: scale, then call the model"""
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.scaler = scaler
+        self.n_features = getattr(scaler, 'n_features_in_', None)
+
+    def predict(self, X):
+        return self.model.predict(self.scaler.transform(X))
+
+
+def fold_linear(model, scaler):
+    """(weights, bias) of the scaler folded into a linear model, or None"""
+    coef = getattr(model, 'coef_', None)
+    intercept = getattr(model, 'intercept_', None)
+    if coef is None or intercept is None or not isinstance(scaler, StandardScaler):
+        return None
+
+    coef = np.asarray(coef, dtype=float)
+    intercept = np.asarray(intercept, dtype=float)
+    if coef.ndim == 2:
+        if coef.shape[0] != 1:
+            return None
+        coef = coef[0]
+    if intercept.size != 1:
+        return None
+
+    # with_std=False leaves scale_ as None; with_mean=False means no centering
+    scale = np.ones_like(coef)
+    if scaler.scale_ is not None:
+        scale = np.asarray(scaler.scale_, dtype=float)
+    mean = np.zeros_like(coef)
+    if scaler.with_mean and scaler.mean_ is not None:
+        mean = np.asarray(scaler.mean_, dtype=float)
+
+    weights = coef / scale
+    bias = float(intercept.reshape(-1)[0]) - float(mean @ weights)
+    return weights, bias
+
+
+def compile_predictor(model, scaler):
+    """Fastest predictor available for a (model, scaler) pair"""
+    folded = fold_linear(model, scaler)
+    if folded is None:
+        return ScaledModel(model, scaler)
+    return CompiledLinear(*folded)
+
+
+class FusedLinearKernel:
+    """
+    Every target's folded linear model in one weight matrix
+
+    predict() takes windows of shape (n_targets, n_features) for one sensor
+    or (n_sensors, n_targets, n_features) for many, and returns predictions
+    of shape (n_targets,) or (n_sensors, n_targets).
+    """
+
+    def __init__(self, targets, predictors):
+        self.targets = list(targets)
+        self.weights = np.stack([p.weights for p in predictors])
+        self.bias = np.array([p.bias for p in predictors])
+
+    @classmethod
+    def from_predictors(cls, predictors):
+        """Build from {target: predictor}, or None unless all are linear with equal width"""
+        compiled = {t: p for t, p in predictors.items() if isinstance(p, CompiledLinear)}
+        if not compiled or len(compiled) != len(predictors):
+            return None
+        if len({p.n_features for p in compiled.values()}) != 1:
+            return None
+        return cls(compiled.keys(), compiled.values())
+
+    def predict(self, windows):
+        windows = np.asarray(windows, dtype=float)
+        return np.einsum('...tk,tk->...t', windows, self.weights) + self.bias
@@ -0,0 +1,360 @@
+"""
+One live pipeline over shared parsed capture state
+
+auto_sync_mqtt, live_system_json_based, live_ai_system_enhanced and
+excel_integration_enhanced each watch the same captures, re-read them (and
+the output*.xlsx sheets) on every change and POST overlapping payloads.
+LiveDaemon does that work once per change:
+
+1. file sync: a CaptureWatcher reports which captures changed and LiveState
+   reads only their new records (read_after() from the last offset) into
+   one SensorState per sensor
+2. the stages run in order over the SensorStates that got records
+
+    daemon = LiveDaemon(LiveState(sensors), [ExcelArchive(), HistoryWriter(HistoryStore()),
+                                             Predictor(registry), Publisher(outbox)])
+    daemon.run()
+
+A stage is any object with a `name`, handle(states) and stats(); start()
+and stop() are called around the run if it has them. Stages share results
+through the SensorState (Predictor sets .predictions, Publisher sends
+them). When no capture changes for `refresh` seconds, the stages get every
+sensor again with no new records, which republishes the latest readings
+(unless earlier payloads are still spooled for the backend).
+"""
+
+import time
+from datetime import datetime
+
+from airsense.aqi import calculate_aqi
+from airsense.batch_predictor import BatchPredictor
+from airsense.excel_archive import EXPORT_INTERVAL, ReadingArchive
+from airsense.file_watch import CaptureWatcher
+from airsense.history_store import require_pyarrow
+from airsense.ndjson_store import capture_exists, read_after
+from airsense.ring_buffer import SensorHistory
+from airsense.ttn import normalize_reading
+
+REFRESH = 30  # Seconds without new data before the latest readings are republished
+MAX_PM25 = 500  # Readings above this are sensor errors and are not archived
+
+POLLUTANTS = ('pm2_5', 'pm10', 'co2', 'tvoc', 'no2', 'so2', 'o3')
+ENVIRONMENTAL = ('temperature', 'humidity', 'pressure')
+
+
+def _number(value, default=0):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if value != value else value
+
+
+class SensorState:
+    """One sensor's parsed capture: read position, newest reading, derived values"""
+
+    def __init__(self, sensor_id, name, capture, excel=None):
+        self.sensor_id = sensor_id
+        self.name = name
+        self.capture = capture
+        self.excel = excel
+        self.offset = -1          # Last capture record read
+        self.new_records = []     # [(offset, reading)] from the last refresh
+        self.reset = False        # True if the last refresh found the capture cleared
+        self.latest = None        # Newest reading
+        self.aqi = 0
+        self.predictions = None   # Set by Predictor
+
+    def refresh(self):
+        """Read the records added since the last refresh; True if there were any"""
+        self.new_records = []
+        self.reset = False
+        if not capture_exists(self.capture):
+            return False
+        records = read_after(self.capture, self.offset)
+        if not records and self.offset >= 0 and not read_after(self.capture, self.offset - 1, limit=1):
+            # Cleared or replaced (clear_json.py): start over
+            self.offset = -1
+            self.reset = True
+            records = read_after(self.capture)
+        if not records:
+            return False
+
+        self.offset = records[-1][0]
+        self.new_records = [(offset, normalize_reading(record)) for offset, record in records
+                            if isinstance(record, dict)]
+        if not self.new_records:
+            return False
+        self.latest = self.new_records[-1][1]
+        pm25 = _number(self.latest.get('pm2_5'))
+        self.aqi = calculate_aqi(pm25) if pm25 else 0
+        return True
+
+
+class LiveState:
+    """Every sensor's SensorState, refreshed from its capture on change"""
+
+    name = 'sync'
+
+    def __init__(self, sensors):
+        self.sensors = {sensor.sensor_id: sensor for sensor in sensors}
+        self.counters = {'refreshes': 0, 'records': 0, 'errors': 0}
+
+    def refresh(self, sensor_ids):
+        """States of the given sensors that got new records"""
+        changed = []
+        for sensor_id in sensor_ids:
+            state = self.sensors[sensor_id]
+            try:
+                if state.refresh():
+                    changed.append(state)
+                    self.counters['records'] += len(state.new_records)
+            except Exception as e:
+                self.counters['errors'] += 1
+                print(f"[SYNC] {state.name}: cannot read {state.capture}: {e}")
+            self.counters['refreshes'] += 1
+        return changed
+
+    def idle(self):
+        """States with a reading, marked as having nothing new"""
+        for state in self.sensors.values():
+            state.new_records = []
+            state.reset = False
+        return [state for state in self.sensors.values() if state.latest is not None]
+
+    def stats(self):
+        return dict(self.counters)
+
+
+class ExcelArchive:
+    """Archives new records per sensor and regenerates its Excel sheet on a schedule"""
+
+    name = 'excel'
+
+    def __init__(self, export_interval=EXPORT_INTERVAL, max_pm25=MAX_PM25):
+        self.export_interval = export_interval
+        self.max_pm25 = max_pm25
+        self._archives = {}  # sensor ID -> ReadingArchive
+        self.counters = {'rows': 0, 'rejected': 0, 'exports': 0, 'errors': 0}
+
+    def _archive(self, state):
+        if state.sensor_id not in self._archives:
+            self._archives[state.sensor_id] = ReadingArchive(state.excel, self.export_interval, self.max_pm25)
+        return self._archives[state.sensor_id]
+
+    def handle(self, states):
+        for state in states:
+            if not state.excel or not state.new_records:
+                continue
+            try:
+                archive = self._archive(state)
+                # A cleared capture restarts at offset 0, also when it was cleared while we were stopped
+                archive.rewind(0 if state.reset else state.offset + 1)
+                # Records up to the cursor were archived by an earlier run
+                readings = [reading for offset, reading in state.new_records if offset > archive.cursor]
+                if readings:
+                    kept = archive.extend(readings, cursor=state.new_records[-1][0])
+                    self.counters['rows'] += kept
+                    self.counters['rejected'] += len(readings) - kept
+            except Exception as e:
+                self.counters['errors'] += 1
+                print(f"[EXCEL] {state.name}: {e}")
+        self._export(force=False)
+
+    def _export(self, force):
+        for archive in self._archives.values():
+            try:
+                if force and archive.pending():
+                    archive.export()
+                    exported = True
+                else:
+                    exported = not force and archive.export_if_due()
+                if exported:
+                    self.counters['exports'] += 1
+            except PermissionError:
+                # Stays pending; written at the next export
+                self.counters['errors'] += 1
+                print(f"[EXCEL] Cannot save - {archive.excel_file} is open")
+            except Exception as e:
+                self.counters['errors'] += 1
+                print(f"[EXCEL] Export of {archive.excel_file} failed: {e}")
+
+    def stop(self):
+        self._export(force=True)
+        for archive in self._archives.values():
+            archive.close()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['pending'] = sum(archive.pending() for archive in self._archives.values())
+        return stats
+
+
+class HistoryWriter:
+    """Buffers new readings and merges them into the Parquet history on a schedule"""
+
+    name = 'history'
+
+    def __init__(self, store, flush_interval=EXPORT_INTERVAL):
+        require_pyarrow()
+        self.store = store
+        self.flush_interval = flush_interval
+        self._pending = {}  # sensor ID -> [reading]
+        self._last_flush = None
+        self.counters = {'rows': 0, 'flushes': 0, 'errors': 0}
+
+    def handle(self, states):
+        for state in states:
+            if state.new_records:
+                self._pending.setdefault(state.sensor_id, []).extend(reading for _, reading in state.new_records)
+        if self._pending and (self._last_flush is None or time.monotonic() - self._last_flush >= self.flush_interval):
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        for sensor_id in list(self._pending):
+            try:
+                # Readings already stored (a restart re-reads the capture) are merged, not duplicated
+                self.counters['rows'] += self.store.write(sensor_id, self._pending[sensor_id])
+                self.counters['flushes'] += 1
+                del self._pending[sensor_id]
+            except Exception as e:
+                # Kept; written with the next flush
+                self.counters['errors'] += 1
+                print(f"[HISTORY] Sensor {sensor_id}: write to {self.store.directory} failed: {e}")
+
+    def stop(self):
+        if self._pending:
+            self._flush()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['pending'] = sum(len(readings) for readings in self._pending.values())
+        return stats
+
+
+class Predictor:
+    """Model predictions from an in-memory history of every sensor's readings"""
+
+    name = 'predict'
+
+    def __init__(self, registry, capacity=10):
+        self.history = SensorHistory(capacity=capacity)
+        self.batch_predictor = BatchPredictor(registry)
+        self.counters = {'predicted': 0, 'errors': 0}
+
+    def handle(self, states):
+        fresh = [state for state in states if state.new_records]
+        if not fresh:
+            return
+        for state in fresh:
+            for _, reading in state.new_records[-self.history.capacity:]:
+                self.history.append(state.sensor_id, reading)
+        try:
+            results = self.batch_predictor.predict_history(self.history, [state.sensor_id for state in fresh])
+        except Exception as e:
+            self.counters['errors'] += 1
+            print(f"[PREDICT] Batch prediction failed: {e}")
+            return
+        for state in fresh:
+            state.predictions = results.get(state.sensor_id) or state.predictions
+            if state.sensor_id in results:
+                self.counters['predicted'] += 1
+
+    def stats(self):
+        return dict(self.counters)
+
+
+class Publisher:
+    """Spools one backend payload with every sensor a cycle touched"""
+
+    name = 'publish'
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self.counters = {'payloads': 0, 'sensors': 0, 'idle_skipped': 0}
+
+    def start(self):
+        self.outbox.start()
+
+    def stop(self):
+        if not self.outbox.flush(5):
+            print(f"[PUBLISH] {self.outbox.spool.pending()} payloads left in {self.outbox.spool.directory},"
+                  f" sent on next start")
+        self.outbox.stop()
+
+    def handle(self, states):
+        if not states:
+            return
+        if not any(state.new_records for state in states) and self.outbox.spool.pending():
+            # Idle refresh while the backend is unreachable or catching up: the
+            # spooled payloads already carry these readings
+            self.counters['idle_skipped'] += 1
+            return
+        payload = {
+            'timestamp': datetime.now().isoformat(),
+            'total_sensors': len(states),
+            'sensors': {},
+        }
+        for state in states:
+            reading = state.latest
+            payload['sensors'][f'sensor_{state.sensor_id}'] = {
+                'name': state.name,
+                'aqi': state.aqi,
+                'pollutants': {field: _number(reading.get(field)) for field in POLLUTANTS},
+                'environmental': {field: _number(reading.get(field)) for field in ENVIRONMENTAL},
+                'predictions': state.predictions or {},
+            }
+        self.outbox.submit(payload)
+        self.counters['payloads'] += 1
+        self.counters['sensors'] += len(states)
+        print(f"[PUBLISH] Queued {len(states)} sensors for backend")
+
+    def stats(self):
+        return dict(self.counters)
+
+
+class LiveDaemon:
+    """Watches the captures and runs the stages once per change"""
+
+    def __init__(self, state, stages, refresh=REFRESH):
+        self.state = state
+        self.stages = list(stages)
+        self.refresh = refresh
+        self.watcher = CaptureWatcher({sensor_id: sensor.capture for sensor_id, sensor in state.sensors.items()})
+        self.cycles = 0
+
+    def _cycle(self, states):
+        self.cycles += 1
+        for stage in self.stages:
+            try:
+                stage.handle(states)
+            except Exception as e:
+                print(f"[{stage.name.upper()}] Stage failed: {e}")
+
+    def run(self):
+        """Process everything on disk, then every change until interrupted"""
+        for stage in self.stages:
+            if hasattr(stage, 'start'):
+                stage.start()
+        self.watcher.start()
+        try:
+            self._cycle(self.state.refresh(list(self.state.sensors)))
+            while True:
+                changed = self.watcher.wait(self.refresh)
+                if changed:
+                    states = self.state.refresh(sorted(changed))
+                    if states:
+                        self._cycle(states)
+                else:
+                    self._cycle(self.state.idle())
+        finally:
+            self.watcher.stop()
+            for stage in reversed(self.stages):
+                if hasattr(stage, 'stop'):
+                    stage.stop()
+
+    def stats_sources(self):
+        """Everything with name and stats(), for format_stats()"""
+        return [self.watcher, self.state] + self.stages
+
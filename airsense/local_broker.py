@@ -0,0 +1,188 @@
+"""
+In-process MQTT broker stand-in
+
+Just enough of MQTT 3.1.1 to run the live pipelines and the replay harness
+against a real paho connection without a TTN or Mosquitto server:
+
+    broker = LocalBroker(port=18830)
+    broker.start()              # background thread with its own event loop
+    ...
+    broker.stop()
+
+or as a separate process:
+
+    python -m airsense.local_broker --port 18830
+
+Supported: CONNECT (credentials are accepted, not checked), SUBSCRIBE with
++ and # wildcards, UNSUBSCRIBE, PUBLISH (delivered at QoS 0; QoS 1
+publishes are acknowledged), PINGREQ and DISCONNECT. No retained messages,
+wills or sessions.
+"""
+
+import argparse
+import asyncio
+import struct
+import threading
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def topic_matches(pattern, topic):
+    """MQTT filter match with + (one level) and # (the rest)"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts) or (part != '+' and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def _packet(packet_type, body, flags=0):
+    """Fixed header (type, flags, variable-length remaining length) + body"""
+    header = bytearray([(packet_type << 4) | flags])
+    length = len(body)
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes(header) + body
+
+
+def _string(data, offset):
+    """(UTF-8 string, next offset) from a length-prefixed field"""
+    length = struct.unpack_from('!H', data, offset)[0]
+    start = offset + 2
+    return data[start:start + length].decode('utf-8'), start + length
+
+
+class LocalBroker:
+    """QoS 0 MQTT broker on one asyncio event loop"""
+
+    def __init__(self, host='127.0.0.1', port=1883):
+        self.host = host
+        self.port = port
+        self.subscriptions = {}  # writer -> set of topic filters
+        self.counters = {'clients': 0, 'received': 0, 'delivered': 0}
+        self._loop = None
+        self._task = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]  # the real port when port=0
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        """Serve from a daemon thread; returns once the port is listening"""
+        def run():
+            try:
+                asyncio.run(self.serve())
+            except asyncio.CancelledError:
+                pass
+
+        self._thread = threading.Thread(target=run, name='local-broker', daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def stop(self):
+        """Close the listener and every client connection"""
+        if self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    async def _read_packet(self, reader):
+        first = (await reader.readexactly(1))[0]
+        length = 0
+        multiplier = 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b''
+        return first >> 4, first & 0x0F, body
+
+    async def _handle_client(self, reader, writer):
+        self.counters['clients'] += 1
+        self.subscriptions[writer] = set()
+        try:
+            while True:
+                packet_type, flags, body = await self._read_packet(reader)
+                if packet_type == CONNECT:
+                    writer.write(_packet(CONNACK, b'\x00\x00'))
+                elif packet_type == PUBLISH:
+                    self._publish(writer, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self._subscribe(writer, body)
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id = body[:2]
+                    offset = 2
+                    while offset < len(body):
+                        topic, offset = _string(body, offset)
+                        self.subscriptions[writer].discard(topic)
+                    writer.write(_packet(UNSUBACK, packet_id))
+                elif packet_type == PINGREQ:
+                    writer.write(_packet(PINGRESP, b''))
+                elif packet_type == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            writer.close()
+
+    def _subscribe(self, writer, body):
+        packet_id = body[:2]
+        offset = 2
+        granted = bytearray()
+        while offset < len(body):
+            topic, offset = _string(body, offset)
+            offset += 1  # requested QoS
+            self.subscriptions[writer].add(topic)
+            granted.append(0)
+        writer.write(_packet(SUBACK, packet_id + bytes(granted)))
+
+    def _publish(self, writer, flags, body):
+        qos = (flags >> 1) & 0x03
+        topic, offset = _string(body, 0)
+        if qos:
+            writer.write(_packet(PUBACK, body[offset:offset + 2]))
+            offset += 2
+        self.counters['received'] += 1
+
+        # Re-encode at QoS 0 for every matching subscriber
+        message = None
+        for subscriber, filters in self.subscriptions.items():
+            if any(topic_matches(pattern, topic) for pattern in filters):
+                if message is None:
+                    message = _packet(PUBLISH, body[:2 + len(topic.encode('utf-8'))] + body[offset:])
+                subscriber.write(message)
+                self.counters['delivered'] += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local MQTT broker stand-in (QoS 0)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    args = parser.parse_args()
+
+    broker = LocalBroker(args.host, args.port)
+    print(f"[BROKER] Listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(broker.serve())
+    except KeyboardInterrupt:
+        print(f"[BROKER] Stopped ({broker.counters['received']} received, {broker.counters['delivered']} delivered)")
@@ -0,0 +1,152 @@
+"""
+Versioned single-file model bundles
+
+A bundle holds every target of one model family in one joblib file, read
+with a single I/O call:
+
+{
+    'format': 'airsense-model-bundle',
+    'version': 1,
+    'created_at': '2026-01-01T12:00:00',
+    'training': {...},                   # script, source data, library versions
+    'targets': {
+        'PM2.5': {
+            'pipeline': Pipeline(scaler -> model),
+            'features': ['pm2_5_lag3', 'pm2_5_lag2', 'pm2_5_lag1'],
+            'source_columns': ['pm2_5'],
+            'target_column': 'pm2_5',
+            'metrics': {'r2': 0.93, ...}
+        },
+        ...
+    }
+}
+
+`features` is the exact column order the pipeline was fitted on and
+`source_columns` the raw columns needed to build them, so loaders can check
+alignment once up front (check_features) instead of failing per target.
+
+train_linear_regression.py writes LAG_BUNDLE (3-lag models) and
+train_quick.py writes CROSS_BUNDLE (each target from the other readings).
+"""
+
+import os
+import platform
+from datetime import datetime
+
+import joblib
+
+BUNDLE_FORMAT = 'airsense-model-bundle'
+BUNDLE_VERSION = 1
+
+LAG_BUNDLE = 'lag_bundle.joblib'
+CROSS_BUNDLE = 'cross_bundle.joblib'
+BUNDLE_FILES = (LAG_BUNDLE, CROSS_BUNDLE)
+
+
+class BundleError(Exception):
+    """Raised for unreadable or incompatible bundle files"""
+
+
+class FeatureMismatchError(BundleError):
+    """Raised when available columns cannot feed a bundle's models"""
+
+    def __init__(self, missing):
+        self.missing = missing
+        details = '; '.join(f"{target}: {', '.join(cols)}" for target, cols in missing.items())
+        super().__init__(f"Missing feature columns - {details}")
+
+
+def lag_features(column, n_lags):
+    """Feature names for an n-lag window of one column, oldest first"""
+    return [f'{column}_lag{lag}' for lag in range(n_lags, 0, -1)]
+
+
+def training_metadata(script, **extra):
+    """Library versions and provenance recorded with every bundle"""
+    import numpy
+    import sklearn
+
+    metadata = {
+        'script': script,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+    metadata.update(extra)
+    return metadata
+
+
+def save_bundle(path, targets, training):
+    """Write all targets to one bundle file (uncompressed, so it can be memory-mapped)"""
+    bundle = {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'training': training,
+        'targets': targets,
+    }
+    tmp_path = f'{path}.tmp'
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_bundle(path, mmap_mode='r'):
+    """Read a bundle file in one call and validate its header"""
+    try:
+        raw = joblib.load(path, mmap_mode=mmap_mode)
+    except Exception as e:
+        raise BundleError(f"Cannot read model bundle {path}: {e}")
+
+    if not isinstance(raw, dict) or raw.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"{path} is not an AirSense model bundle")
+    if raw.get('version', 0) > BUNDLE_VERSION:
+        raise BundleError(f"{path} uses bundle version {raw['version']}, newer than supported ({BUNDLE_VERSION})")
+
+    return ModelBundle(path, raw)
+
+
+class ModelBundle:
+    """All targets of one model family plus their feature schema"""
+
+    def __init__(self, path, raw):
+        self.path = path
+        self.version = raw['version']
+        self.created_at = raw.get('created_at')
+        self.training = raw.get('training', {})
+        self.targets = raw['targets']
+
+    def __contains__(self, target):
+        return target in self.targets
+
+    def pipeline(self, target):
+        """Fused scaler -> model pipeline for a target"""
+        return self.targets[target]['pipeline']
+
+    def model_and_scaler(self, target):
+        """(model, scaler) pair, for callers that scale explicitly"""
+        steps = self.pipeline(target).named_steps
+        return steps['model'], steps['scaler']
+
+    def features(self, target):
+        """Exact feature columns (in order) the target was trained on"""
+        return list(self.targets[target]['features'])
+
+    def source_columns(self, target):
+        """Raw reading columns needed to build the target's features"""
+        return list(self.targets[target]['source_columns'])
+
+    def check_features(self, available_columns, targets=None):
+        """
+        Verify the available raw columns can feed the given targets
+
+        Raises FeatureMismatchError listing every target's missing columns.
+        """
+        available = set(available_columns)
+        missing = {}
+        for target in targets or self.targets:
+            absent = [col for col in self.source_columns(target) if col not in available]
+            if absent:
+                missing[target] = absent
+        if missing:
+            raise FeatureMismatchError(missing)
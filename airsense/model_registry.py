@@ -0,0 +1,182 @@
+"""
+Shared, lazily loaded model registry
+
+Every pipeline asks the registry for a target's (model, scaler) pair instead
+of joblib-loading the pickles in models/ itself:
+- Nothing is loaded until a target is first used, so startup only stats files.
+- Arrays inside the pickles are memory-mapped read-only (joblib mmap_mode),
+  so forked workers share the same physical pages instead of private copies.
+  Call preload() before forking to map everything in the parent.
+- One registry exists per model directory per process (get_registry).
+
+Single-file model bundles (see model_bundle.py) are preferred. Loose
+pickles from older training runs are still understood under both naming
+schemes: pm25_model.pkl and pm2_5_model.pkl (or the full
+uplink_message.decoded_payload.* column name).
+"""
+
+import os
+import threading
+
+import joblib
+
+from airsense.linear_kernel import FusedLinearKernel, compile_predictor
+from airsense.model_bundle import BUNDLE_FILES, load_bundle
+
+# Canonical target name -> decoded payload field
+TARGET_FIELDS = {
+    'PM2.5': 'pm2_5',
+    'PM10': 'pm10',
+    'CO2': 'co2',
+    'TVOC': 'tvoc',
+    'Temperature': 'temperature',
+    'Humidity': 'humidity',
+    'Pressure': 'pressure'
+}
+
+TARGET_UNITS = {
+    'PM2.5': 'µg/m³',
+    'PM10': 'µg/m³',
+    'CO2': 'ppm',
+    'TVOC': 'ppb',
+    'Temperature': '°C',
+    'Humidity': '%',
+    'Pressure': 'hPa'
+}
+
+
+def _file_stems(target):
+    """Candidate file name stems for a target, in lookup order"""
+    field = TARGET_FIELDS[target]
+    stems = [target.lower().replace('.', ''), field, f'uplink_message.decoded_payload.{field}']
+    return list(dict.fromkeys(stems))
+
+
+class ModelRegistry:
+    """Lazy (model, scaler) lookup over one model directory"""
+
+    def __init__(self, model_dir, mmap_mode='r'):
+        self.model_dir = model_dir
+        self.mmap_mode = mmap_mode
+        self._artifacts = {}
+        self._predictors = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, target):
+        """(model_path, scaler_path) pairs that exist on disk for a target"""
+        pairs = []
+        for stem in _file_stems(target):
+            model_path = os.path.join(self.model_dir, f'{stem}_model.pkl')
+            scaler_path = os.path.join(self.model_dir, f'{stem}_scaler.pkl')
+            if os.path.exists(model_path) and os.path.exists(scaler_path):
+                pairs.append((model_path, scaler_path))
+        return pairs
+
+    def bundle_paths(self):
+        """Bundle files present in the model directory"""
+        paths = [os.path.join(self.model_dir, name) for name in BUNDLE_FILES]
+        return [path for path in paths if os.path.exists(path)]
+
+    def bundles(self):
+        """Every bundle in the model directory (each read once)"""
+        return [self._load(path, loader=load_bundle) for path in self.bundle_paths()]
+
+    def bundle(self, name):
+        """A bundle by file name (e.g. CROSS_BUNDLE), or None if absent"""
+        path = os.path.join(self.model_dir, name)
+        if not os.path.exists(path):
+            return None
+        return self._load(path, loader=load_bundle)
+
+    def find_bundle(self, target, n_features=None):
+        """First bundle holding the target (with that many features, if given)"""
+        for bundle in self.bundles():
+            if target not in bundle:
+                continue
+            if n_features is None or len(bundle.features(target)) == n_features:
+                return bundle
+        return None
+
+    def available_targets(self):
+        """Targets with a bundle entry or model files on disk"""
+        bundled = set()
+        if self.bundle_paths():
+            for bundle in self.bundles():
+                bundled.update(bundle.targets)
+        return [target for target in TARGET_FIELDS if target in bundled or self.candidates(target)]
+
+    def get(self, target, n_features=None):
+        """
+        Return (model, scaler) for a target, loading it on first use
+
+        With n_features, only a pair whose scaler was fitted on that many
+        features is returned (e.g. n_features=3 for the 3-lag models).
+        Returns None if no matching pair exists.
+        """
+        bundle = self.find_bundle(target, n_features)
+        if bundle is not None:
+            return bundle.model_and_scaler(target)
+
+        for model_path, scaler_path in self.candidates(target):
+            scaler = self._load(scaler_path)
+            if n_features is not None and getattr(scaler, 'n_features_in_', n_features) != n_features:
+                continue
+            return self._load(model_path), scaler
+        return None
+
+    def predictor(self, target, n_features=None):
+        """
+        Compiled predictor for a target (see linear_kernel.py), or None
+
+        Linear models come back with the scaler folded into their weights, so
+        predict() is one matmul; other models scale and call the model.
+        """
+        key = (target, n_features)
+        if key not in self._predictors:
+            pair = self.get(target, n_features)
+            self._predictors[key] = compile_predictor(*pair) if pair is not None else None
+        return self._predictors[key]
+
+    def fused_kernel(self, targets, n_features):
+        """One FusedLinearKernel over several targets, or None if any is not linear"""
+        predictors = {target: self.predictor(target, n_features) for target in targets}
+        if any(p is None for p in predictors.values()):
+            return None
+        return FusedLinearKernel.from_predictors(predictors)
+
+    def preload(self):
+        """Load every available artifact now (e.g. before forking workers)"""
+        self.bundles()
+        for target in TARGET_FIELDS:
+            for model_path, scaler_path in self.candidates(target):
+                self._load(model_path)
+                self._load(scaler_path)
+        return len(self._artifacts)
+
+    def _load(self, path, loader=joblib.load):
+        """Load one file once per process, memory-mapping its arrays"""
+        artifact = self._artifacts.get(path)
+        if artifact is not None:
+            return artifact
+
+        with self._lock:
+            artifact = self._artifacts.get(path)
+            if artifact is None:
+                artifact = loader(path, mmap_mode=self.mmap_mode)
+                self._artifacts[path] = artifact
+        return artifact
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(model_dir):
+    """The process-wide registry for a model directory"""
+    key = os.path.abspath(model_dir)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = ModelRegistry(key)
+            _registries[key] = registry
+        return registry
@@ -0,0 +1,216 @@
+"""
+Projected, columnar MongoDB reads
+
+Readers ask for exactly the numeric fields their models use (plus
+received_at) instead of whole TTN documents, so heavy fields such as
+rx_metadata, frm_payload and correlation_ids never cross the wire.
+
+fetch_columns() returns one NumPy array per field. When pymongoarrow is
+installed the driver decodes BSON straight into Arrow columns; otherwise
+documents are streamed from a batched cursor and assembled into columns.
+
+InsertWatcher blocks until new documents arrive, through a change stream
+when the server supports one (replica sets) and by polling received_at
+otherwise.
+"""
+
+import time
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    from pymongoarrow.api import find_arrow_all
+except ImportError:
+    pa = None
+    find_arrow_all = None
+
+TIME_FIELD = 'received_at'
+FETCH_BATCH_SIZE = 1000
+
+# Fields that are never model inputs
+HEAVY_FIELDS = ('_id', 'correlation_ids', 'frm_payload', 'rx_metadata', 'beep')
+
+
+def feature_projection(columns=None):
+    """
+    Projection for the given feature columns plus received_at
+
+    With no columns (feature set unknown), everything except the heavy
+    non-numeric fields is returned.
+    """
+    if not columns:
+        return {field: 0 for field in HEAVY_FIELDS}
+    projection = {'_id': 0, TIME_FIELD: 1}
+    projection.update({column: 1 for column in sorted(columns)})
+    return projection
+
+
+def ensure_index(collection, field=TIME_FIELD):
+    """
+    Make sure reads sorted/filtered on `field` are index-backed
+
+    Returns True if a suitable index already existed, False if one was
+    created. Raises the driver's error if it cannot be created.
+    """
+    for info in collection.index_information().values():
+        if info['key'][0][0] == field:
+            return True
+    collection.create_index([(field, 1)])
+    return False
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _fetch_arrow(collection, query, projection, sort, limit):
+    table = find_arrow_all(collection, query, projection=projection, sort=[sort], limit=limit)
+    columns = {}
+    times = []
+    for name in table.column_names:
+        column = table.column(name)
+        if name == TIME_FIELD:
+            times = column.to_pylist()
+        elif pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            columns[name] = column.to_numpy(zero_copy_only=False).astype(float)
+    return times, columns
+
+
+def _fetch_cursor(collection, query, projection, sort, limit):
+    cursor = collection.find(query, projection).sort(*sort).batch_size(FETCH_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    times = []
+    values = {}
+    for row, doc in enumerate(cursor):
+        times.append(doc.get(TIME_FIELD))
+        for key, value in doc.items():
+            if key in HEAVY_FIELDS or not _is_number(value):
+                continue
+            column = values.get(key)
+            if column is None:
+                column = values[key] = [np.nan] * row
+            column.append(value)
+        for column in values.values():
+            if len(column) <= row:
+                column.append(np.nan)
+
+    return times, {key: np.asarray(column, dtype=float) for key, column in values.items()}
+
+
+def fetch_columns(collection, query=None, projection=None, sort=(TIME_FIELD, 1), limit=0):
+    """
+    Run a projected find and return (received_at values, {field: float array})
+
+    Only numeric fields are returned as columns; documents missing a field
+    get NaN in that column.
+    """
+    query = query or {}
+    if find_arrow_all is not None:
+        return _fetch_arrow(collection, query, projection, sort, limit)
+    return _fetch_cursor(collection, query, projection, sort, limit)
+
+
+def iter_rows(times, columns):
+    """Documents back out of fetch_columns() output (missing fields omitted)"""
+    names = list(columns)
+    arrays = [columns[name] for name in names]
+    for row, received_at in enumerate(times):
+        doc = {TIME_FIELD: received_at}
+        for name, array in zip(names, arrays):
+            value = array[row]
+            if value == value:
+                doc[name] = float(value)
+        yield doc
+
+
+class InsertWatcher:
+    """
+    Wait for inserts into a collection, debouncing bursts
+
+    wait() returns once a new document has arrived and no further insert
+    has followed for `debounce` seconds (at most `max_delay` after the
+    first), so a burst of uplinks triggers one prediction run.
+    """
+
+    def __init__(self, collection, poll_interval=5.0, debounce=2.0, max_delay=10.0):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.stream = None
+        self.mode = 'polling'
+
+        try:
+            self.stream = collection.watch([{'$match': {'operationType': 'insert'}}],
+                                           max_await_time_ms=int(min(poll_interval, debounce) * 1000) or 100)
+            self.mode = 'change stream'
+        except Exception:
+            # Standalone servers (and some test doubles) have no change streams
+            self.stream = None
+
+    def wait(self, since=None, timeout=None):
+        """
+        Block until documents newer than `since` arrive
+
+        Returns True when new data is ready, False if `timeout` seconds
+        passed without any.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if not self._wait_first(since, deadline):
+            return False
+        self._settle()
+        return True
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def _expired(self, deadline):
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _poll(self, since):
+        query = {TIME_FIELD: {'$gt': since}} if since is not None else {}
+        return self.collection.find_one(query, {'_id': 1}) is not None
+
+    def _wait_first(self, since, deadline):
+        while not self._expired(deadline):
+            if self.stream is not None:
+                try:
+                    if self.stream.try_next() is not None:
+                        return True
+                    continue
+                except Exception as e:
+                    print(f"  ⚠ Change stream lost ({e}), falling back to polling")
+                    self.close()
+                    self.mode = 'polling'
+            if self._poll(since):
+                return True
+            time.sleep(self.poll_interval if deadline is None else
+                       max(0.0, min(self.poll_interval, deadline - time.monotonic())))
+        return False
+
+    def _settle(self):
+        """Let a burst finish: wait for `debounce` seconds without inserts"""
+        if self.debounce <= 0:
+            return
+        start = time.monotonic()
+        if self.stream is None:
+            # Polling cannot see individual inserts; wait one quiet period
+            time.sleep(min(self.debounce, self.max_delay))
+            return
+
+        quiet_since = time.monotonic()
+        while time.monotonic() - start < self.max_delay:
+            try:
+                event = self.stream.try_next()
+            except Exception:
+                return
+            now = time.monotonic()
+            if event is not None:
+                quiet_since = now
+            elif now - quiet_since >= self.debounce:
+                return
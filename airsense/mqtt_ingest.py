@@ -0,0 +1,259 @@
+"""
+Shared-connection MQTT ingestion for many sensors
+
+Instead of one mqtt.Client (TCP connection + network thread) per sensor,
+sensors are grouped by (broker, port, username, password) and every group
+shares one connection that subscribes to all of its sensors' topics in a
+single SUBSCRIBE. Incoming messages are routed to their sensor by topic,
+or by the TTN device ID in the topic (v3/<app>/devices/<device_id>/up), so
+adding a sensor costs a dict entry, not a thread and a socket.
+
+The sensor registry is a JSON file (sensors.json):
+
+{
+    "sensors": [
+        {"id": 1, "name": "Sensor 1", "env_file": "amb1.env"},
+        {"id": 6, "name": "Roof", "topic": "v3/app@tenant/devices/roof/up",
+         "broker": "au1.cloud.thethings.industries", "username": "...", "password": "..."}
+    ]
+}
+
+MQTT settings missing from an entry are read from its env_file with
+dotenv_values(), which never touches os.environ, so sensors cannot
+overwrite each other's credentials. An optional "capture" names the sensor's
+capture file (e.g. "mqtt_data_sensor1.json"); consumers that keep one append
+readings to its NDJSON store (see ndjson_store.py).
+
+start() runs one paho network thread per connection; start_asyncio()
+instead drives every connection's socket from an asyncio event loop
+(paho's socket-callback pattern), with no extra threads.
+"""
+
+import asyncio
+import json
+import os
+import threading
+
+import paho.mqtt.client as mqtt
+from dotenv import dotenv_values
+
+DEFAULT_BROKER = 'au1.cloud.thethings.industries'
+DEFAULT_PORT = 1883
+
+
+def device_from_topic(topic):
+    """TTN device ID from an uplink topic, or None"""
+    parts = topic.split('/')
+    if len(parts) >= 4 and parts[2] == 'devices':
+        return parts[3]
+    return None
+
+
+def resolve_sensors(entries, base_dir='.'):
+    """Fill every sensor entry's MQTT settings from the entry or its env file"""
+    sensors = []
+    for entry in entries:
+        name = entry.get('name', f"Sensor {entry['id']}")
+        settings = {}
+        env_file = entry.get('env_file')
+        if env_file:
+            path = env_file if os.path.isabs(env_file) else os.path.join(base_dir, env_file)
+            if os.path.exists(path):
+                settings = dotenv_values(path)
+            else:
+                print(f"[CONFIG] {name}: env file {env_file} not found")
+
+        def setting(key, env_key, default=''):
+            value = entry.get(key)
+            if value in (None, ''):
+                value = settings.get(env_key) or default
+            return value
+
+        topic = setting('topic', 'MQTT_TOPIC')
+        sensors.append({
+            'id': entry['id'],
+            'name': name,
+            'broker': setting('broker', 'MQTT_BROKER', DEFAULT_BROKER),
+            'port': int(setting('port', 'MQTT_PORT', DEFAULT_PORT)),
+            'username': setting('username', 'MQTT_USERNAME'),
+            'password': setting('password', 'MQTT_PASSWORD'),
+            'topic': topic,
+            'device_id': entry.get('device_id') or device_from_topic(topic),
+            'capture': entry.get('capture'),
+        })
+    return sensors
+
+
+def load_sensor_registry(path):
+    """Sensors from a registry file (env files are relative to it)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return resolve_sensors(config['sensors'], os.path.dirname(os.path.abspath(path)))
+
+
+def _new_client(client_id):
+    """mqtt.Client with the v1 callback signatures on paho 1.x and 2.x"""
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+    return mqtt.Client(client_id=client_id)
+
+
+class BrokerConnection:
+    """One MQTT connection serving every sensor with the same broker/credentials"""
+
+    def __init__(self, index, sensors, handler):
+        first = sensors[0]
+        self.broker = first['broker']
+        self.port = first['port']
+        self.sensors = sensors
+        self.handler = handler
+        self.routes = {s['topic']: s for s in sensors if s['topic']}
+        self.devices = {s['device_id']: s for s in sensors if s['device_id']}
+        self.counters = {'messages': 0, 'unrouted': 0}
+        self._lock = threading.Lock()
+
+        self.client = _new_client(f"airsense_ingest_{index}_{os.getpid()}")
+        self.client.username_pw_set(first['username'], first['password'])
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.on_disconnect = self.on_disconnect
+
+    @property
+    def label(self):
+        return f"{self.broker}:{self.port} ({len(self.sensors)} sensors)"
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            print(f"[MQTT] Connected to {self.label}")
+            client.subscribe([(topic, 0) for topic in self.routes])
+            print(f"[MQTT] Subscribed to {len(self.routes)} topics")
+        else:
+            print(f"[MQTT] Connection to {self.label} failed (code {rc})")
+
+    def on_message(self, client, userdata, msg):
+        """Route to the sensor and hand off; runs on the network thread"""
+        sensor = self.routes.get(msg.topic) or self.devices.get(device_from_topic(msg.topic))
+        with self._lock:
+            self.counters['messages'] += 1
+            if sensor is None:
+                self.counters['unrouted'] += 1
+                return
+        self.handler(sensor, msg.payload)
+
+    def on_disconnect(self, client, userdata, rc):
+        print(f"[MQTT] Disconnected from {self.label} (code {rc})")
+        if rc != 0:
+            print("[MQTT] Reconnecting...")
+
+    def connect(self):
+        try:
+            self.client.connect(self.broker, self.port, 60)
+            return True
+        except Exception as e:
+            print(f"[MQTT] Connection error for {self.label}: {e}")
+            return False
+
+
+class AsyncioSocketAdapter:
+    """
+    Drive a paho client from an asyncio loop
+
+    paho reports its socket through on_socket_* callbacks; the loop reads
+    and writes it when ready (add_reader/add_writer), and a small task
+    calls loop_misc() for keepalives and reconnects after a drop.
+    """
+
+    def __init__(self, loop, client, reconnect_delay=5):
+        self.loop = loop
+        self.client = client
+        self.reconnect_delay = reconnect_delay
+        self.stopping = False
+        self.misc_task = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        if self.misc_task is None or self.misc_task.done():
+            self.misc_task = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        while not self.stopping:
+            if self.client.loop_misc() != mqtt.MQTT_ERR_SUCCESS:
+                await asyncio.sleep(self.reconnect_delay)
+                if self.stopping:
+                    return
+                try:
+                    self.client.reconnect()
+                except Exception as e:
+                    print(f"[MQTT] Reconnect failed: {e}")
+                continue
+            await asyncio.sleep(1)
+
+    def stop(self):
+        self.stopping = True
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+
+
+class SharedMQTTIngestor:
+    """All sensors over as few MQTT connections as their brokers allow"""
+
+    def __init__(self, sensors, handler):
+        self.name = 'ingest'
+        groups = {}
+        for sensor in sensors:
+            if not sensor['topic']:
+                print(f"[CONFIG] {sensor['name']}: no MQTT topic, skipped")
+                continue
+            key = (sensor['broker'], sensor['port'], sensor['username'], sensor['password'])
+            groups.setdefault(key, []).append(sensor)
+        self.connections = [BrokerConnection(i, group, handler) for i, group in enumerate(groups.values())]
+
+    def start(self):
+        """Connect and start one network loop per broker connection"""
+        connected = 0
+        for connection in self.connections:
+            if connection.connect():
+                connection.client.loop_start()
+                connected += 1
+        return connected
+
+    def start_asyncio(self, loop):
+        """Connect every connection on an asyncio loop instead of threads"""
+        self._adapters = []
+        connected = 0
+        for connection in self.connections:
+            self._adapters.append(AsyncioSocketAdapter(loop, connection.client))
+            if connection.connect():
+                connected += 1
+        return connected
+
+    def stop(self):
+        for adapter in getattr(self, '_adapters', []):
+            adapter.stop()
+        for connection in self.connections:
+            connection.client.loop_stop()
+            connection.client.disconnect()
+
+    def sensor_count(self):
+        return sum(len(c.sensors) for c in self.connections)
+
+    def stats(self):
+        stats = {'connections': len(self.connections), 'messages': 0, 'unrouted': 0}
+        for connection in self.connections:
+            stats['messages'] += connection.counters['messages']
+            stats['unrouted'] += connection.counters['unrouted']
+        return stats
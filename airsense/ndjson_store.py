@@ -0,0 +1,276 @@
+"""
+Append-only NDJSON segment storage for MQTT captures
+
+The capture files (mqtt_data.json, mqtt_data_sensor{1..5}.json) are JSON
+arrays, so reading the newest reading means parsing the whole history. A
+SegmentStore keeps the same records as newline-delimited JSON in a
+directory next to the capture (mqtt_data_sensor1.json ->
+mqtt_data_sensor1.ndjson/):
+
+    00000000000000000000-1767225600.ndjson   one JSON record per line
+    00000000000000000000-1767225600.idx      byte position of each line (uint64)
+    00000000000000004096-1767312000.ndjson   next segment, and so on
+
+A segment's name holds the offset of its first record and the time it was
+started. The writer starts a new segment when the current one reaches
+max_bytes or is max_age seconds old. Records are numbered 0, 1, 2, ...
+across segments, and the .idx file turns an offset into one seek, so
+latest() and read_after(offset) only parse the records they return.
+
+Each line is written before its index entry, so readers in other processes
+only see complete records. A line cut short by a crash is dropped when the
+writer reopens the store. One writer per store.
+
+The module-level helpers take a capture path, use its store when one
+exists and fall back to the JSON array otherwise, so readers work before
+and after a capture is converted:
+
+    python -m airsense.ndjson_store convert mqtt_data_sensor1.json
+    python -m airsense.ndjson_store latest mqtt_data_sensor1.json
+"""
+
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+
+SEGMENT_BYTES = 16 * 1024 * 1024
+SEGMENT_AGE = 24 * 3600  # Seconds before a segment is closed
+
+_ENTRY = struct.Struct('<Q')
+
+
+class SegmentStore:
+    """Directory of NDJSON segments with a per-segment offset index"""
+
+    def __init__(self, directory, max_bytes=SEGMENT_BYTES, max_age=SEGMENT_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._file = None
+        self._index = None
+        self._base = 0
+        self._started = 0
+        self._next = 0
+
+    def _path(self, stem, suffix):
+        return os.path.join(self.directory, stem + suffix)
+
+    def segments(self):
+        """[(base offset, start time, name stem)], oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for name in os.listdir(self.directory):
+            stem, suffix = os.path.splitext(name)
+            base, _, started = stem.partition('-')
+            if suffix == '.ndjson' and base.isdigit() and started.isdigit():
+                segments.append((int(base), int(started), stem))
+        return sorted(segments)
+
+    def _count(self, stem):
+        try:
+            return os.path.getsize(self._path(stem, '.idx')) // _ENTRY.size
+        except OSError:
+            return 0
+
+    def _position(self, stem, n):
+        with open(self._path(stem, '.idx'), 'rb') as f:
+            f.seek(n * _ENTRY.size)
+            return _ENTRY.unpack(f.read(_ENTRY.size))[0]
+
+    # Reading
+
+    def end_offset(self):
+        """Offset the next record will get (the number of records stored)"""
+        segments = self.segments()
+        if not segments:
+            return 0
+        base, _, stem = segments[-1]
+        return base + self._count(stem)
+
+    def latest(self):
+        """(offset, record) of the newest record, or None if the store is empty"""
+        for base, _, stem in reversed(self.segments()):
+            count = self._count(stem)
+            if count:
+                with open(self._path(stem, '.ndjson'), 'rb') as f:
+                    f.seek(self._position(stem, count - 1))
+                    return base + count - 1, json.loads(f.readline())
+        return None
+
+    def read_after(self, offset=-1, limit=None):
+        """[(offset, record)] for records after `offset`, oldest first"""
+        start = offset + 1
+        segments = self.segments()
+        first = max(bisect_right([base for base, _, _ in segments], start) - 1, 0)
+        records = []
+        for base, _, stem in segments[first:]:
+            count = self._count(stem)
+            skip = max(start - base, 0)
+            if skip >= count:
+                continue
+            with open(self._path(stem, '.ndjson'), 'rb') as f:
+                f.seek(self._position(stem, skip))
+                # Only indexed lines: anything past them is still being written
+                for n in range(skip, count):
+                    records.append((base + n, json.loads(f.readline())))
+                    if limit is not None and len(records) >= limit:
+                        return records
+        return records
+
+    # Writing
+
+    def append(self, record):
+        """Store one record; returns its offset"""
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._open_last()
+            full = self._file is not None and self._next > self._base and (
+                self._file.tell() >= self.max_bytes or time.time() - self._started >= self.max_age)
+            if self._file is None or full:
+                self._start_segment()
+            position = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+            self._index.write(_ENTRY.pack(position))
+            self._index.flush()
+            self._next += 1
+            return self._next - 1
+
+    def _open_last(self):
+        """Reopen the newest segment for appending, repairing a torn tail"""
+        segments = self.segments()
+        if not segments:
+            return
+        self._base, self._started, stem = segments[-1]
+        data_path = self._path(stem, '.ndjson')
+        with open(data_path, 'rb') as f:
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            with open(data_path, 'r+b') as f:
+                f.truncate(end)
+
+        # Rebuild the index if it does not cover exactly the complete lines
+        positions = []
+        position = 0
+        for line in data[:end].splitlines(keepends=True):
+            positions.append(position)
+            position += len(line)
+        if self._count(stem) != len(positions):
+            with open(self._path(stem, '.idx'), 'wb') as f:
+                f.write(b''.join(_ENTRY.pack(p) for p in positions))
+
+        self._next = self._base + len(positions)
+        self._file = open(data_path, 'ab')
+        self._index = open(self._path(stem, '.idx'), 'ab')
+
+    def _start_segment(self):
+        self._close_files()
+        os.makedirs(self.directory, exist_ok=True)
+        self._base = self._next
+        self._started = int(time.time())
+        stem = f'{self._base:020d}-{self._started}'
+        self._file = open(self._path(stem, '.ndjson'), 'ab')
+        self._index = open(self._path(stem, '.idx'), 'ab')
+
+    def _close_files(self):
+        for f in (self._file, self._index):
+            if f is not None:
+                f.close()
+        self._file = self._index = None
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+
+def store_dir(capture_file):
+    """Store directory for a capture file (mqtt_data.json -> mqtt_data.ndjson)"""
+    return os.path.splitext(capture_file)[0] + '.ndjson'
+
+
+def _load_legacy(capture_file):
+    with open(capture_file, 'r') as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def capture_exists(capture_file):
+    return os.path.isdir(store_dir(capture_file)) or os.path.exists(capture_file)
+
+
+def capture_version(capture_file):
+    """Value that changes whenever records are added to the capture"""
+    directory = store_dir(capture_file)
+    if os.path.isdir(directory):
+        return SegmentStore(directory).end_offset()
+    stat = os.stat(capture_file)
+    return stat.st_mtime, stat.st_size
+
+
+def read_latest_entry(capture_file):
+    """(offset, record) of a capture's newest record, or None if it has none"""
+    directory = store_dir(capture_file)
+    if os.path.isdir(directory):
+        return SegmentStore(directory).latest()
+    data = _load_legacy(capture_file)
+    return (len(data) - 1, data[-1]) if data else None
+
+
+def read_latest(capture_file):
+    """Newest record of a capture, or None if it has none"""
+    latest = read_latest_entry(capture_file)
+    return latest[1] if latest else None
+
+
+def read_after(capture_file, offset=-1, limit=None):
+    """[(offset, record)] for capture records after `offset`, oldest first"""
+    directory = store_dir(capture_file)
+    if os.path.isdir(directory):
+        return SegmentStore(directory).read_after(offset, limit)
+    records = list(enumerate(_load_legacy(capture_file)))[offset + 1:]
+    return records[:limit] if limit is not None else records
+
+
+def convert(capture_file):
+    """Copy a JSON-array capture into its store; returns the records written"""
+    directory = store_dir(capture_file)
+    store = SegmentStore(directory)
+    if store.end_offset():
+        raise ValueError(f'{directory} already has records')
+    records = _load_legacy(capture_file)
+    try:
+        for record in records:
+            store.append(record)
+    finally:
+        store.close()
+    return len(records)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='NDJSON segment stores for MQTT capture files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='Copy JSON-array captures into segment stores')
+    convert_parser.add_argument('files', nargs='+')
+    latest_parser = commands.add_parser('latest', help='Print the newest record of a capture')
+    latest_parser.add_argument('file')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        for capture_file in args.files:
+            try:
+                count = convert(capture_file)
+            except (OSError, ValueError) as e:
+                print(f"[SKIP] {capture_file}: {e}")
+                continue
+            print(f"[OK] {capture_file}: {count} records -> {store_dir(capture_file)}")
+        print("Readers now use the stores; the JSON files can be archived")
+    else:
+        print(json.dumps(read_latest(args.file), indent=2, default=str))
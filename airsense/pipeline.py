@@ -0,0 +1,281 @@
+"""
+Bounded worker stages for the live pipelines
+
+Network callbacks (paho's on_message) must return quickly, so they only
+submit() work to a Stage. Each Stage owns a bounded queue and worker
+threads that run the handler. When the queue is full, submit() never
+blocks: it drops the oldest queued item (fresher readings are worth more)
+and counts it, so a slow backend shows up in the counters instead of
+stalling MQTT keepalives.
+
+    parse = Stage('parse', handle_message, maxsize=1000)
+    parse.start()
+    client.on_message = lambda c, u, msg: parse.submit((sensor_id, msg.payload))
+
+CoalescingPublisher is the last stage: it remembers which sensors changed
+and, after a short window, calls send() once with just those sensors.
+
+AsyncStage and AsyncCoalescingPublisher are the same stages as coroutines
+on one asyncio event loop; blocking work is passed to an executor by the
+handlers themselves.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+
+
+class Stage:
+    """Bounded queue plus worker threads running one handler"""
+
+    def __init__(self, name, handler, maxsize=1000, workers=1):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.counters = {'submitted': 0, 'processed': 0, 'dropped': 0, 'errors': 0}
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def submit(self, item):
+        """Queue an item without blocking; returns False if an older item was dropped"""
+        self._count('submitted')
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        # Make room by discarding the oldest item
+        try:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self._count('dropped')
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self._count('dropped')
+        return False
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=5):
+        """Finish queued work, then stop the workers"""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+
+            try:
+                self.handler(item)
+                self._count('processed')
+            except Exception as e:
+                self._count('errors')
+                print(f"[{self.name.upper()}] Error: {e}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        """Counters plus current queue depth"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['queued'] = self.queue.qsize()
+        stats['capacity'] = self.queue.maxsize
+        return stats
+
+
+class CoalescingPublisher:
+    """
+    Dirty-tracked publisher: one send per window, changed sensors only
+
+    mark(sensor_id) is cheap and can be called for every message. The
+    worker waits until something is dirty, lets further changes accumulate
+    for `window` seconds, then calls send(sensor_ids) with the set that
+    changed. Sensors that did not change are not re-sent. If send() returns
+    False the sensors stay dirty and are retried after `retry_delay`.
+    """
+
+    def __init__(self, name, send, window=1.0, retry_delay=5.0):
+        self.name = name
+        self.send = send
+        self.window = window
+        self.retry_delay = retry_delay
+        self._dirty = set()
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self.counters = {'marked': 0, 'sends': 0, 'sensors_sent': 0, 'failed': 0, 'errors': 0}
+
+    def mark(self, sensor_id):
+        """Record that a sensor has new data to publish"""
+        with self._wakeup:
+            self._dirty.add(sensor_id)
+            self.counters['marked'] += 1
+            self._wakeup.notify()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Publish anything still dirty, then stop"""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._dirty and not self._stopping:
+                    self._wakeup.wait()
+                if not self._dirty:
+                    return
+                stopping = self._stopping
+
+            # Coalesce changes arriving within the window
+            if not stopping:
+                time.sleep(self.window)
+
+            with self._wakeup:
+                sensor_ids, self._dirty = self._dirty, set()
+
+            try:
+                sent = self.send(sorted(sensor_ids, key=str)) is not False
+            except Exception as e:
+                sent = False
+                with self._wakeup:
+                    self.counters['errors'] += 1
+                print(f"[{self.name.upper()}] Error: {e}")
+
+            with self._wakeup:
+                if sent:
+                    self.counters['sends'] += 1
+                    self.counters['sensors_sent'] += len(sensor_ids)
+                else:
+                    self.counters['failed'] += 1
+                    self._dirty |= sensor_ids
+                    if self._stopping:
+                        return
+            if not sent:
+                time.sleep(self.retry_delay)
+
+    def stats(self):
+        with self._wakeup:
+            stats = dict(self.counters)
+            stats['dirty'] = len(self._dirty)
+        return stats
+
+
+class AsyncStage:
+    """Bounded asyncio queue consumed by one coroutine handler"""
+
+    def __init__(self, name, handler, maxsize=1000):
+        self.name = name
+        self.handler = handler
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.counters = {'submitted': 0, 'processed': 0, 'dropped': 0, 'errors': 0}
+
+    def submit(self, item):
+        """Queue from the loop thread without waiting; drops the oldest when full"""
+        self.counters['submitted'] += 1
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.counters['dropped'] += 1
+        self.queue.put_nowait(item)
+
+    async def run(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self.handler(item)
+                self.counters['processed'] += 1
+            except Exception as e:
+                self.counters['errors'] += 1
+                print(f"[{self.name.upper()}] Error: {e}")
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['queued'] = self.queue.qsize()
+        stats['capacity'] = self.queue.maxsize
+        return stats
+
+
+class AsyncCoalescingPublisher:
+    """CoalescingPublisher as a coroutine; send is an async callable"""
+
+    def __init__(self, name, send, window=1.0, retry_delay=5.0):
+        self.name = name
+        self.send = send
+        self.window = window
+        self.retry_delay = retry_delay
+        self._dirty = set()
+        self._wakeup = asyncio.Event()
+        self.counters = {'marked': 0, 'sends': 0, 'sensors_sent': 0, 'failed': 0, 'errors': 0}
+
+    def mark(self, sensor_id):
+        self._dirty.add(sensor_id)
+        self.counters['marked'] += 1
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.window)
+            self._wakeup.clear()
+            sensor_ids, self._dirty = self._dirty, set()
+            if not sensor_ids:
+                continue
+
+            try:
+                sent = await self.send(sorted(sensor_ids, key=str)) is not False
+            except Exception as e:
+                sent = False
+                self.counters['errors'] += 1
+                print(f"[{self.name.upper()}] Error: {e}")
+
+            if sent:
+                self.counters['sends'] += 1
+                self.counters['sensors_sent'] += len(sensor_ids)
+            else:
+                self.counters['failed'] += 1
+                self._dirty |= sensor_ids
+                await asyncio.sleep(self.retry_delay)
+                self._wakeup.set()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['dirty'] = len(self._dirty)
+        return stats
+
+
+def format_stats(stages):
+    """One line of counters per stage/publisher"""
+    lines = []
+    for stage in stages:
+        counters = ', '.join(f"{key} {value}" for key, value in stage.stats().items())
+        lines.append(f"  {stage.name}: {counters}")
+    return '\n'.join(lines)
@@ -0,0 +1,227 @@
+"""
+Record raw MQTT uplinks and replay them for load testing
+
+A recording is gzip-compressed JSON lines, one uplink per line:
+
+    {"t":12.345,"sensor":3,"payload":"<raw uplink JSON text>"}
+
+t is seconds since recording started. Payloads are kept as received, so a
+replay parses exactly what TTN sent.
+
+synthesize() turns a recording into a send schedule for any number of
+synthetic sensors. Sensor i replays the uplinks of recorded sensor i % R,
+phase-shifted so the sensors do not all fire together, with its own device
+ID, f_cnt and received_at so every payload is distinct. Synthetic sensor IDs
+are strings ('replay-1', 'replay-2', ...), so their data can never be taken
+for one of the real numbered sensors. Payloads are
+rendered before the replay starts, so replay timing measures the pipeline,
+not the harness.
+
+LatencyProbe timestamps every payload when it is injected, again when the
+process stage has handled it, and finally when the publisher sends its
+sensor, which gives end-to-end latency per message.
+"""
+
+import gzip
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+REPLAY_TOPIC = 'v3/replay@airsense/devices/{device_id}/up'
+REPLAY_ID = 'replay-{n}'  # Sensor and device ID of synthetic sensor n (1-based)
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class UplinkRecorder:
+    """Append raw uplinks to a recording; record() is an ingestor handler"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = _open(path, 'w')
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, sensor, payload):
+        line = json.dumps({
+            't': round(time.monotonic() - self._start, 3),
+            'sensor': sensor['id'],
+            'payload': payload.decode('utf-8', 'replace'),
+        }, separators=(',', ':'))
+        # One network thread per broker connection may call this
+        with self._lock:
+            self._file.write(line + '\n')
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path):
+    """Recorded uplinks as dicts (t, sensor, payload bytes), oldest first"""
+    uplinks = []
+    with _open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entry['payload'] = entry['payload'].encode('utf-8')
+                uplinks.append(entry)
+    uplinks.sort(key=lambda entry: entry['t'])
+    return uplinks
+
+
+def synthetic_sensors(count, broker='127.0.0.1', port=1883):
+    """Sensor entries (as resolve_sensors() returns them) for replay devices"""
+    sensors = []
+    for i in range(count):
+        device_id = REPLAY_ID.format(n=i + 1)
+        sensors.append({
+            'id': device_id,
+            'name': f'Replay {i + 1}',
+            'broker': broker,
+            'port': port,
+            'username': '',
+            'password': '',
+            'topic': REPLAY_TOPIC.format(device_id=device_id),
+            'device_id': device_id,
+        })
+    return sensors
+
+
+def _rewrite(payload, device_id, f_cnt, received_at):
+    """Uplink re-addressed to a synthetic device (non-JSON is sent as recorded)"""
+    try:
+        doc = json.loads(payload)
+    except ValueError:
+        return payload
+    if not isinstance(doc, dict):
+        return payload
+    doc['end_device_ids'] = dict(doc.get('end_device_ids') or {}, device_id=device_id)
+    doc['received_at'] = received_at
+    if isinstance(doc.get('uplink_message'), dict):
+        doc['uplink_message']['f_cnt'] = f_cnt
+    return json.dumps(doc).encode('utf-8')
+
+
+def synthesize(uplinks, sensors, loops=1, limit=None):
+    """
+    [(due seconds, sensor index, topic, payload)] for `sensors` synthetic sensors
+
+    The recording is repeated `loops` times and the schedule is cut at
+    `limit` messages.
+    """
+    streams = {}
+    for entry in uplinks:
+        streams.setdefault(entry['sensor'], []).append(entry)
+    sources = [streams[key] for key in sorted(streams, key=str)]
+
+    events = []
+    for i in range(sensors):
+        stream = sources[i % len(sources)]
+        start = stream[0]['t']
+        # Loop period: the stream's span plus one mean gap
+        gap = (stream[-1]['t'] - start) / (len(stream) - 1) if len(stream) > 1 else 1.0
+        span = stream[-1]['t'] - start + gap
+        phase = gap * i / sensors
+        for loop in range(loops):
+            for entry in stream:
+                events.append((entry['t'] - start + phase + loop * span, i, entry))
+    events.sort(key=lambda event: event[0])
+    if limit:
+        events = events[:limit]
+
+    base = datetime.now(timezone.utc)
+    counters = [0] * sensors
+    schedule = []
+    for due, i, entry in events:
+        counters[i] += 1
+        device_id = REPLAY_ID.format(n=i + 1)
+        received_at = (base + timedelta(seconds=due)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        payload = _rewrite(entry['payload'], device_id, counters[i], received_at)
+        schedule.append((due, i, REPLAY_TOPIC.format(device_id=device_id), payload))
+    return schedule
+
+
+def replay(schedule, inject, speed=1.0):
+    """
+    Call inject(sensor index, topic, payload) on schedule at `speed` x real time
+
+    speed 0 sends as fast as possible. Returns (wall seconds, worst lag
+    behind schedule in seconds).
+    """
+    start = time.perf_counter()
+    worst_lag = 0.0
+    for due, i, topic, payload in schedule:
+        if speed:
+            delay = start + due / speed - time.perf_counter()
+            if delay > 0.001:
+                time.sleep(delay)
+            elif delay < -worst_lag:
+                worst_lag = -delay
+        inject(i, topic, payload)
+    return time.perf_counter() - start, worst_lag
+
+
+class LatencyProbe:
+    """Injection -> processed -> published timestamps per payload"""
+
+    def __init__(self):
+        self.latencies = []
+        self.first_injected = None
+        self.last_published = None
+        self._injected = {}   # payload -> injection times
+        self._processed = {}  # sensor ID -> injection times awaiting publish
+        self._lock = threading.Lock()
+
+    def injected(self, payload):
+        now = time.perf_counter()
+        with self._lock:
+            if self.first_injected is None:
+                self.first_injected = now
+            self._injected.setdefault(payload, []).append(now)
+
+    def processed(self, sensor_id, payload):
+        with self._lock:
+            times = self._injected.get(payload)
+            if not times:
+                return
+            injected_at = times.pop(0)
+            if not times:
+                del self._injected[payload]
+            self._processed.setdefault(sensor_id, []).append(injected_at)
+
+    def published(self, sensor_ids):
+        now = time.perf_counter()
+        with self._lock:
+            for sensor_id in sensor_ids:
+                for injected_at in self._processed.pop(sensor_id, ()):
+                    self.latencies.append(now - injected_at)
+            self.last_published = now
+
+    def summary(self):
+        """Delivered count, unprocessed/unpublished counts, rate and latency percentiles (ms)"""
+        with self._lock:
+            latencies = np.array(self.latencies)
+            unprocessed = sum(len(times) for times in self._injected.values())
+            unpublished = sum(len(times) for times in self._processed.values())
+            elapsed = (self.last_published - self.first_injected) if self.latencies else 0.0
+
+        summary = {
+            'delivered': len(latencies),
+            'unprocessed': unprocessed,
+            'unpublished': unpublished,
+            'rate': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        }
+        if len(latencies):
+            for name, q in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100)):
+                summary[name] = float(np.percentile(latencies, q)) * 1000
+        return summary
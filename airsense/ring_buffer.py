@@ -0,0 +1,102 @@
+"""
+Fixed-size NumPy ring buffers for per-sensor reading history
+
+Each sensor gets one preallocated (2 * capacity, n_fields) float array.
+Every reading is written twice, at slot i and slot i + capacity, so the
+latest k readings are always one contiguous slice and window() returns a
+view without copying. Memory per sensor is fixed at creation, however many
+messages arrive.
+
+Columns are the canonical targets (see schema.py), so payloads that spell
+fields differently land in the same column. Missing values are NaN.
+"""
+
+import threading
+
+import numpy as np
+
+from airsense.model_registry import TARGET_FIELDS
+from airsense.schema import resolve_targets
+
+
+class RingBuffer:
+    """Last `capacity` rows of `n_fields` floats, readable as contiguous views"""
+
+    def __init__(self, capacity, n_fields):
+        self.capacity = capacity
+        self.data = np.full((2 * capacity, n_fields), np.nan)
+        self.head = -1
+        self.count = 0
+
+    def append(self, row):
+        slot = (self.head + 1) % self.capacity
+        self.data[slot] = row
+        self.data[slot + self.capacity] = row
+        self.head = slot
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, k):
+        """Latest k rows (oldest first) as a view, or None if fewer exist"""
+        if k > self.count:
+            return None
+        end = self.head + self.capacity + 1
+        return self.data[end - k:end]
+
+    def latest(self):
+        return self.data[self.head] if self.count else None
+
+
+class SensorHistory:
+    """One RingBuffer per sensor over the canonical target fields"""
+
+    def __init__(self, capacity=10, targets=None):
+        self.capacity = capacity
+        self.targets = list(targets or TARGET_FIELDS)
+        self.index = {target: i for i, target in enumerate(self.targets)}
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def append(self, sensor_id, reading):
+        """Record one decoded reading for a sensor"""
+        row = np.full(len(self.targets), np.nan)
+        for target, column in resolve_targets(reading).items():
+            position = self.index.get(target)
+            value = reading[column]
+            if position is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+                row[position] = value
+
+        with self._lock:
+            buffer = self._buffers.get(sensor_id)
+            if buffer is None:
+                buffer = self._buffers[sensor_id] = RingBuffer(self.capacity, len(self.targets))
+            buffer.append(row)
+
+    def count(self, sensor_id):
+        buffer = self._buffers.get(sensor_id)
+        return buffer.count if buffer is not None else 0
+
+    def window(self, sensor_id, k):
+        """(k, n_targets) view of a sensor's latest readings, or None"""
+        buffer = self._buffers.get(sensor_id)
+        return buffer.window(k) if buffer is not None else None
+
+    def snapshot(self, sensor_ids, k):
+        """
+        (ids, array of shape (n, k, n_targets)) for sensors with k readings
+
+        Copies under the lock, so it is safe while other threads append.
+        """
+        with self._lock:
+            ids = []
+            windows = []
+            for sensor_id in sensor_ids:
+                buffer = self._buffers.get(sensor_id)
+                window = buffer.window(k) if buffer is not None else None
+                if window is not None:
+                    ids.append(sensor_id)
+                    windows.append(window)
+            stacked = np.stack(windows) if windows else np.empty((0, k, len(self.targets)))
+        return ids, stacked
+
+    def sensor_ids(self):
+        return list(self._buffers)
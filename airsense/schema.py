@@ -0,0 +1,65 @@
+"""
+Source column -> canonical target resolution
+
+Readings reach the pipelines under several spellings of the same field:
+pm2_5, pm25, PM2.5 and uplink_message.decoded_payload.pm2_5 are all PM2.5.
+resolve_targets() maps a set of column names to {target: column} once per
+distinct column set and caches the answer, so per-prediction lookups are a
+dict access.
+
+Matching is exact on the normalized last path segment (lowercase,
+alphanumerics only), never by substring, so derived columns such as
+pm2_5_lag1 or pm2_5_rolling_mean_5 can never be taken for the raw reading,
+and pm2_5 and pm10 can never be confused.
+"""
+
+import re
+from functools import lru_cache
+
+from airsense.model_registry import TARGET_FIELDS
+
+# Normalized spellings accepted for each target
+TARGET_ALIASES = {
+    'PM2.5': ('pm25',),
+    'PM10': ('pm10',),
+    'CO2': ('co2',),
+    'TVOC': ('tvoc',),
+    'Temperature': ('temperature', 'temp'),
+    'Humidity': ('humidity', 'hum'),
+    'Pressure': ('pressure', 'press'),
+}
+
+_ALIAS_TARGETS = {alias: target for target, aliases in TARGET_ALIASES.items() for alias in aliases}
+
+
+def normalize_column(column):
+    """'uplink_message.decoded_payload.pm2_5' -> 'pm25'"""
+    return re.sub(r'[^a-z0-9]', '', str(column).rsplit('.', 1)[-1].lower())
+
+
+def target_for_column(column):
+    """Canonical target a column holds, or None"""
+    return _ALIAS_TARGETS.get(normalize_column(column))
+
+
+def _preference(target, column):
+    """Sort key among columns for one target: canonical field name first"""
+    return (column != TARGET_FIELDS[target], normalize_column(column) != TARGET_ALIASES[target][0], column)
+
+
+@lru_cache(maxsize=256)
+def _resolve(columns):
+    matches = {}
+    for column in columns:
+        target = target_for_column(column)
+        if target is not None:
+            matches.setdefault(target, []).append(column)
+    return tuple(
+        (target, min(matches[target], key=lambda column: _preference(target, column)))
+        for target in TARGET_FIELDS if target in matches
+    )
+
+
+def resolve_targets(columns):
+    """{target: source column} for a set of column names (cached per column set)"""
+    return dict(_resolve(frozenset(columns)))
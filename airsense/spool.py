@@ -0,0 +1,299 @@
+"""
+Durable outbox for backend sends
+
+Producers submit() every payload to an on-disk spool, an append-only
+write-ahead log, instead of POSTing it themselves. A background drainer
+sends the spool in order, in batches, and acknowledges a batch only after
+the backend accepted it. While the backend is down, payloads stay on disk
+(across restarts too) and the drainer retries with exponential backoff.
+When the backend comes back, the backlog goes out as a few batched
+requests instead of one request per missed reading.
+
+    outbox = Outbox('spool/mqtt_live', post_batches(BACKEND_URL))
+    outbox.start()
+    outbox.submit(payload)
+
+A spool directory holds:
+
+    00000001.log, 00000002.log, ...  JSON lines {"seq": n, "payload": {...}}
+    acked                            last sequence number the backend accepted
+    dead.log                         payloads the backend rejected, with the reason
+
+Only unavailability is retried (connection errors, 5xx). A payload the
+backend rejects (4xx, send() raising PayloadRejected) would fail forever,
+so it is moved to dead.log and acknowledged, and the payloads behind it
+go out. When a batch is rejected its payloads are re-sent one at a time,
+so only the bad one is set aside (the backend applies a batch all or
+nothing).
+
+Segments roll over at SEGMENT_BYTES and are deleted once everything in them
+is acknowledged. A line cut short by a crash is dropped on restart. Only one
+process may write a spool directory.
+"""
+
+import json
+import os
+import random
+import threading
+
+import requests
+
+SEGMENT_BYTES = 4 * 1024 * 1024
+BATCH_SIZE = 50
+
+
+class PayloadRejected(Exception):
+    """Raised by a send() when the backend refuses the payloads: retrying cannot help"""
+
+
+class Spool:
+    """Append-only log of JSON payloads with an acknowledged-up-to cursor"""
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._changed = threading.Condition()
+        os.makedirs(directory, exist_ok=True)
+
+        self.acked = self._read_acked()
+        self._segments = sorted(int(name[:-4]) for name in os.listdir(directory)
+                                if name.endswith('.log') and name[:-4].isdigit())
+        self.last_seq = max(self.acked, self._recover())
+        # Read position of the first unacknowledged record
+        self._position = (self._segments[0], 0) if self._segments else None
+        self._file = None
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f'{segment:08d}.log')
+
+    def _read_acked(self):
+        try:
+            with open(os.path.join(self.directory, 'acked'), 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _recover(self):
+        """Drop a torn last line; highest sequence number on disk"""
+        for segment in reversed(self._segments):
+            path = self._path(segment)
+            with open(path, 'rb') as f:
+                data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+            lines = data[:end].splitlines()
+            if lines:
+                return json.loads(lines[-1])['seq']
+        return 0
+
+    def append(self, payload):
+        """Write one payload durably; returns its sequence number"""
+        body = json.dumps(payload, separators=(',', ':'))
+        with self._changed:
+            if self._file is None or self._file.tell() >= self.segment_bytes:
+                self._roll()
+            self.last_seq += 1
+            self._file.write(f'{{"seq":{self.last_seq},"payload":{body}}}\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._changed.notify_all()
+            return self.last_seq
+
+    def _roll(self):
+        """Open the last segment for appending, or a new one once it is full"""
+        if self._file is not None:
+            self._file.close()
+        if not self._segments or os.path.getsize(self._path(self._segments[-1])) >= self.segment_bytes:
+            self._segments.append(self._segments[-1] + 1 if self._segments else 1)
+        segment = self._segments[-1]
+        if self._position is None:
+            self._position = (segment, 0)
+        self._file = open(self._path(segment), 'a', encoding='utf-8', newline='\n')
+
+    def pending(self):
+        return self.last_seq - self.acked
+
+    def wait(self, timeout):
+        """Block until something is unacknowledged; True if so"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.last_seq > self.acked, timeout)
+
+    def wait_delivered(self, timeout):
+        """Block until everything is acknowledged; True if so"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.last_seq == self.acked, timeout)
+
+    def peek(self, limit):
+        """(payloads, token) for up to `limit` unacknowledged records, oldest first"""
+        with self._changed:
+            payloads = []
+            last_seq = self.acked
+            if self._position is None:
+                return payloads, None
+            segment, offset = self._position
+            while len(payloads) < limit:
+                with open(self._path(segment), 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        offset += len(line)
+                        record = json.loads(line)
+                        if record['seq'] <= self.acked:
+                            continue
+                        payloads.append(record['payload'])
+                        last_seq = record['seq']
+                        if len(payloads) >= limit:
+                            break
+                later = [s for s in self._segments if s > segment]
+                if len(payloads) >= limit or not later:
+                    break
+                segment, offset = later[0], 0
+            return payloads, (last_seq, segment, offset)
+
+    def ack(self, token):
+        """Mark everything up to a peek() token as delivered"""
+        last_seq, segment, offset = token
+        with self._changed:
+            tmp = os.path.join(self.directory, 'acked.tmp')
+            with open(tmp, 'w') as f:
+                f.write(str(last_seq))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.directory, 'acked'))
+            self.acked = last_seq
+            self._position = (segment, offset)
+
+            # Segments before the read position are fully delivered
+            for old in [s for s in self._segments if s < segment]:
+                os.remove(self._path(old))
+                self._segments.remove(old)
+            self._changed.notify_all()
+
+    def dead_letter(self, payload, token, reason):
+        """Set a rejected payload aside in dead.log and acknowledge it"""
+        line = json.dumps({'seq': token[0], 'reason': reason, 'payload': payload}, separators=(',', ':'))
+        with self._changed:
+            with open(os.path.join(self.directory, 'dead.log'), 'a', encoding='utf-8', newline='\n') as f:
+                f.write(line + '\n')
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        self.ack(token)
+
+    def close(self):
+        with self._changed:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def post_batches(url, timeout=10):
+    """Outbox send(): POST one payload as-is, or a batch as one JSON list"""
+    def send(payloads):
+        body = payloads[0] if len(payloads) == 1 else payloads
+        try:
+            response = requests.post(url, json=body, headers={'Content-Type': 'application/json'}, timeout=timeout)
+        except requests.exceptions.RequestException:
+            return False
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            raise PayloadRejected(f"HTTP {response.status_code}: {response.text.strip()[:200]}")
+        return response.status_code == 200
+    return send
+
+
+class Outbox:
+    """Spool plus a drainer thread that sends it in batches with backoff"""
+
+    def __init__(self, directory, send, batch_size=BATCH_SIZE, min_delay=1.0, max_delay=60.0, name='outbox'):
+        self.name = name
+        self.spool = Spool(directory)
+        self.send = send
+        self.batch_size = batch_size
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._isolate = 0  # Payloads left to send one at a time after a rejected batch
+        self.counters = {'submitted': 0, 'delivered': 0, 'batches': 0, 'failed': 0, 'rejected': 0}
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def submit(self, payload):
+        """Spool a payload for delivery (durable once this returns)"""
+        self.spool.append(payload)
+        self._count('submitted')
+
+    def start(self):
+        if self.spool.pending():
+            print(f"[SPOOL] {self.spool.pending()} payloads from an earlier run waiting in {self.spool.directory}")
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def flush(self, timeout):
+        """Wait until the spool is delivered; False if payloads are left"""
+        return self.spool.wait_delivered(timeout)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.spool.close()
+
+    def _run(self):
+        delay = self.min_delay
+        while not self._stopping.is_set():
+            if not self.spool.wait(0.5):
+                continue
+            payloads, token = self.spool.peek(1 if self._isolate else self.batch_size)
+            if not payloads:
+                continue
+
+            try:
+                sent = self.send(payloads) is not False
+            except PayloadRejected as e:
+                self._rejected(payloads, token, str(e))
+                continue
+            except Exception as e:
+                print(f"[SPOOL] Send error: {e}")
+                sent = False
+
+            if sent:
+                self._isolate = max(self._isolate - 1, 0)
+                self.spool.ack(token)
+                self._count('delivered', len(payloads))
+                self._count('batches')
+                if delay > self.min_delay:
+                    print(f"[SPOOL] Backend reachable again, {self.spool.pending()} spooled payloads left")
+                delay = self.min_delay
+            else:
+                self._count('failed')
+                print(f"[SPOOL] Backend unavailable, {self.spool.pending()} payloads kept on disk"
+                      f" (retry in {delay:.0f}s)")
+                # Jitter keeps several producers from retrying in lockstep
+                self._stopping.wait(delay * random.uniform(0.8, 1.0))
+                delay = min(delay * 2, self.max_delay)
+
+    def _rejected(self, payloads, token, reason):
+        if len(payloads) > 1:
+            # Find the bad payload: resend this batch one at a time
+            self._isolate = len(payloads)
+            return
+        self._isolate = max(self._isolate - 1, 0)
+        self.spool.dead_letter(payloads[0], token, reason)
+        self._count('rejected')
+        print(f"[SPOOL] Backend rejected payload {token[0]} ({reason}), moved to"
+              f" {os.path.join(self.spool.directory, 'dead.log')}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['pending'] = self.spool.pending()
+        return stats
@@ -0,0 +1,123 @@
+"""
+Fast TTN v3 uplink decoding
+
+A TTN uplink envelope is mostly metadata the pipelines never read: one
+rx_metadata entry per gateway that heard the frame, radio settings, network
+IDs and locations. Only uplink_message.decoded_payload is used.
+
+decode_uplink() finds the decoded_payload object in the raw bytes and
+parses just that slice, so the gateway arrays are never turned into Python
+objects. Payload decoders emit flat objects of numbers and strings, which
+makes the slice easy to find. The key must be uplink_message's own: with
+only scalars between the two keys and nothing nested ahead of them.
+Anything else (a nested value, a brace inside a string, a decoded_payload
+elsewhere in the envelope, an unusual envelope) fails the fast path and
+falls back to parsing the whole envelope, so the result never differs from
+json.loads().
+
+orjson is used for parsing when it is installed, json otherwise.
+
+Readings come back with target fields under their canonical names (pm25,
+PM2.5 -> pm2_5; temp -> temperature; see schema.py), so consumers can read
+reading['pm2_5'] whatever spelling the device decoder uses.
+"""
+
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from airsense.model_registry import TARGET_FIELDS
+from airsense.schema import resolve_targets
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+_UPLINK_KEY = b'"uplink_message"'
+_PAYLOAD_KEY = b'"decoded_payload"'
+_NON_STRUCTURAL = bytes(byte for byte in range(256) if byte not in b'"{}[]\\')
+
+
+@lru_cache(maxsize=256)
+def _renames(keys):
+    renames = {
+        column: TARGET_FIELDS[target]
+        for target, column in resolve_targets(keys).items()
+        if column != TARGET_FIELDS[target]
+    }
+    return renames or None
+
+
+def normalize_reading(payload):
+    """Decoded payload with target fields renamed to their canonical names"""
+    renames = _renames(tuple(payload))
+    if renames is None:
+        return payload
+    return {renames.get(key, key): value for key, value in payload.items()}
+
+
+def _is_uplink_child(raw, uplink, key):
+    """
+    True if the key at raw[key] is a direct child of the top-level
+    uplink_message object whose key is at raw[uplink]
+
+    Only the usual layout is recognised: no escapes and no brackets inside
+    strings ahead of the key, and only scalars between uplink_message and
+    decoded_payload. Anything else answers False and takes the full parse.
+    """
+    after = uplink + len(_UPLINK_KEY)
+    opened = raw.find(b'{', after, key)
+    if opened < 0 or raw[after:opened].strip() != b':' or raw.rfind(b'{', 0, key) != opened:
+        return False
+    # Brackets ahead of the key, strings dropped. A quote left over is a string
+    # holding a bracket (or the key inside a string): too ambiguous to trust
+    skeleton = raw[:key].translate(None, _NON_STRUCTURAL).replace(b'""', b'')
+    if b'"' in skeleton or b'\\' in skeleton or not skeleton.startswith(b'{') or not skeleton.endswith(b'{'):
+        return False
+    # The last '{' is uplink_message's own, so nothing is nested between it and
+    # the key; what precedes it must leave exactly the envelope open
+    head = skeleton[:-1]
+    return head.count(b'{') + head.count(b'[') - head.count(b'}') - head.count(b']') == 1
+
+
+def _fast_payload(raw):
+    """decoded_payload parsed from its own slice, or None to fall back"""
+    uplink = raw.find(_UPLINK_KEY)
+    key = raw.find(_PAYLOAD_KEY, uplink) if uplink >= 0 else -1
+    if key < 0 or not _is_uplink_child(raw, uplink, key):
+        return None
+    after = key + len(_PAYLOAD_KEY)
+    start = raw.find(b'{', after)
+    if start < 0 or raw[after:start].strip() != b':':
+        return None
+    # Flat object: it ends at the first closing brace and opens no other
+    end = raw.find(b'}', start)
+    if end < 0 or raw.find(b'{', start + 1, end) >= 0:
+        return None
+    try:
+        payload = _loads(raw[start:end + 1])
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def parse_uplink(raw):
+    """decoded_payload from a full parse of the envelope, or None"""
+    envelope = _loads(raw)
+    uplink = envelope.get('uplink_message') if isinstance(envelope, dict) else None
+    payload = uplink.get('decoded_payload') if isinstance(uplink, dict) else None
+    return payload if isinstance(payload, dict) else None
+
+
+def decode_uplink(raw):
+    """Normalized reading from a raw uplink (bytes), or None if it carries none"""
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    payload = _fast_payload(raw)
+    if payload is None:
+        payload = parse_uplink(raw)
+        if payload is None:
+            return None
+    return normalize_reading(payload)
@@ -1,30 +1,24 @@
 """
 Auto-sync MQTT data to backend for live updates
-Watches mqtt_data.json and sends latest data to backend automatically
+Watches mqtt_data.json (file-system events) and sends latest data to backend automatically
+
+To run it together with the other JSON live scripts in one process (each
+capture read once per change), use live_daemon.py instead.
 """
-import json
 import time
 import requests
 from datetime import datetime
-import os
+
+from airsense.aqi import calculate_aqi
+from airsense.file_watch import CaptureWatcher
+from airsense.ndjson_store import capture_exists, read_latest
 
 MQTT_FILE = 'mqtt_data.json'
 BACKEND_URL = 'http://localhost:5000/api/predictions'
-CHECK_INTERVAL = 5  # Check every 5 seconds
+CHECK_INTERVAL = 5  # Seconds between retries (changes are picked up as they happen)
 
 last_timestamp = None
 
-def calculate_aqi(pm25):
-    """Calculate AQI from PM2.5"""
-    if pm25 <= 12:
-        return int((50/12) * pm25)
-    elif pm25 <= 35.4:
-        return int(50 + ((100-50)/(35.4-12)) * (pm25-12))
-    elif pm25 <= 55.4:
-        return int(100 + ((150-100)/(55.4-35.4)) * (pm25-35.4))
-    else:
-        return int(150 + ((200-150)/(150.4-55.4)) * (pm25-55.4))
-
 def send_to_backend(data):
     """Send sensor data to backend"""
     try:
@@ -63,44 +57,49 @@ def watch_mqtt_file():
     print("=" * 60)
     print(f"Watching: {MQTT_FILE}")
     print(f"Backend: {BACKEND_URL}")
-    print(f"Check interval: {CHECK_INTERVAL} seconds")
+    print(f"Retry interval: {CHECK_INTERVAL} seconds")
     print("=" * 60)
     print()
     
+    watcher = CaptureWatcher({'mqtt': MQTT_FILE}).start()
+    changed = True  # Read once at start, then only when the file changes
+    retry = False   # Last send failed: read again after CHECK_INTERVAL
     while True:
         try:
-            if not os.path.exists(MQTT_FILE):
+            if not changed:
+                changed = watcher.wait(CHECK_INTERVAL) or retry
+                continue
+            changed = False
+            
+            if not capture_exists(MQTT_FILE):
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] Waiting for {MQTT_FILE}...")
-                time.sleep(CHECK_INTERVAL)
                 continue
             
             # Read latest data
-            with open(MQTT_FILE, 'r') as f:
-                data_list = json.load(f)
+            latest = read_latest(MQTT_FILE)
             
-            if not data_list:
-                time.sleep(CHECK_INTERVAL)
+            if latest is None:
                 continue
             
-            latest = data_list[-1]
             current_timestamp = latest.get('received_at')
             
             # Check if new data
             if current_timestamp != last_timestamp:
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] New data detected!")
-                if send_to_backend(latest):
+                retry = not send_to_backend(latest)
+                if not retry:
                     last_timestamp = current_timestamp
                     print(f"[{datetime.now().strftime('%H:%M:%S')}] App will update automatically")
                 print()
             
-            time.sleep(CHECK_INTERVAL)
-            
         except KeyboardInterrupt:
             print("\n\nStopping auto-sync...")
+            watcher.stop()
             break
         except Exception as e:
             print(f"[{datetime.now().strftime('%H:%M:%S')}] Error: {e}")
             time.sleep(CHECK_INTERVAL)
+            changed = True
 
 if __name__ == '__main__':
     watch_mqtt_file()
@@ -8,23 +8,34 @@ This script:
 4. Sends predictions to the backend server
 
 Usage:
-    python predict_and_send.py [--continuous]
+    python predict_and_send.py [--continuous | --watch]
+    python predict_and_send.py --fleet [--continuous]
 """
 
 import os
+import re
 import sys
-import joblib
 import pandas as pd
-import numpy as np
 from pymongo import MongoClient
 from datetime import datetime
-import requests
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import warnings
 warnings.filterwarnings('ignore')
 
+# Make the shared airsense package (repository root) importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airsense.aqi import calculate_aqi
+from airsense.features import HISTORY as FEATURE_HISTORY, FeatureState
+from airsense.model_bundle import CROSS_BUNDLE, FeatureMismatchError
+from airsense.model_registry import TARGET_FIELDS, TARGET_UNITS, get_registry
+from airsense.mongo import InsertWatcher, ensure_index, feature_projection, fetch_columns, iter_rows
+from airsense.schema import resolve_targets
+from airsense.spool import Outbox, post_batches
+
 # Load environment variables
 load_dotenv()
 
@@ -35,61 +46,104 @@ MONGO_COLLECTION = os.getenv('MONGO_COLLECTION', 'ambience-3')
 MODEL_DIR = os.getenv('MODEL_DIR', '../models')
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:5000/api/predictions')
 PREDICTION_INTERVAL = int(os.getenv('PREDICTION_INTERVAL', '60'))
+WATCH_DEBOUNCE = float(os.getenv('WATCH_DEBOUNCE', '2'))
+WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', '5'))
+
+# Fleet mode: comma-separated collections, or discovered by name prefix
+SENSOR_COLLECTIONS = os.getenv('SENSOR_COLLECTIONS', '')
+SENSOR_COLLECTION_PREFIX = os.getenv('SENSOR_COLLECTION_PREFIX', 'ambience-')
+FLEET_WORKERS = int(os.getenv('FLEET_WORKERS', '8'))
+
+# Backend sends are spooled here (one subdirectory per mode) until delivered
+SPOOL_DIR = os.getenv('SPOOL_DIR', '../spool/predict_and_send')
+FLUSH_TIMEOUT = int(os.getenv('FLUSH_TIMEOUT', '15'))  # Seconds to deliver the spool before exiting
 
-# Target mappings
-TARGET_MODELS = {
-    'PM2.5': 'pm25_model.pkl',
-    'PM10': 'pm10_model.pkl',
-    'CO2': 'co2_model.pkl',
-    'TVOC': 'tvoc_model.pkl',
-    'Temperature': 'temperature_model.pkl',
-    'Humidity': 'humidity_model.pkl',
-    'Pressure': 'pressure_model.pkl'
-}
 
-TARGET_SCALERS = {
-    'PM2.5': 'pm25_scaler.pkl',
-    'PM10': 'pm10_scaler.pkl',
-    'CO2': 'co2_scaler.pkl',
-    'TVOC': 'tvoc_scaler.pkl',
-    'Temperature': 'temperature_scaler.pkl',
-    'Humidity': 'humidity_scaler.pkl',
-    'Pressure': 'pressure_scaler.pkl'
-}
+def open_outbox(name):
+    """Durable outbox for backend sends (one process per spool directory)"""
+    return Outbox(os.path.join(SPOOL_DIR, name), post_batches(BACKEND_URL, timeout=10)).start()
+
+
+def close_outbox(outbox):
+    """Give spooled payloads a bounded chance to reach the backend, then stop"""
+    if outbox.flush(FLUSH_TIMEOUT):
+        print("  ✓ All predictions delivered to backend")
+    else:
+        print(f"  ✗ Backend unreachable: {outbox.spool.pending()} payloads kept in {outbox.spool.directory}")
+        print("    They are sent on the next run")
+    outbox.stop()
 
 
 class PredictionEngine:
     """Air Quality Prediction Engine"""
     
-    def __init__(self):
-        self.models = {}
-        self.scalers = {}
+    def __init__(self, collection_name=MONGO_COLLECTION):
+        self.collection_name = collection_name
+        self.registry = get_registry(MODEL_DIR)
+        self.bundle = None
+        self.targets = []
         self.mongo_client = None
         self.db = None
         self.collection = None
+        self.feature_state = FeatureState()
+        self.last_received_at = None
+        # Until the feature schema is known, skip only the heavy fields
+        self.projection = feature_projection()
+        self.outbox = None
         
     def load_models(self):
-        """Load all trained models and scalers"""
+        """Find all trained models (each one loads on first prediction)"""
         print("Loading prediction models...")
         
-        for target, model_file in TARGET_MODELS.items():
-            model_path = os.path.join(MODEL_DIR, model_file)
-            scaler_path = os.path.join(MODEL_DIR, TARGET_SCALERS[target])
-            
-            if os.path.exists(model_path) and os.path.exists(scaler_path):
-                try:
-                    self.models[target] = joblib.load(model_path)
-                    self.scalers[target] = joblib.load(scaler_path)
-                    print(f"  ✓ Loaded {target} model")
-                except Exception as e:
-                    print(f"  ✗ Error loading {target} model: {e}")
-            else:
-                print(f"  ⚠ Model files not found for {target}")
+        # Prefer the single-file bundle written by train_quick.py
+        self.bundle = self.registry.bundle(CROSS_BUNDLE)
+        if self.bundle is not None:
+            print(f"  ✓ Model bundle v{self.bundle.version} ({self.bundle.created_at})")
+            targets = list(self.bundle.targets)
+        else:
+            targets = self.registry.available_targets()
+        
+        for target in targets:
+            self.targets.append(target)
+            print(f"  ✓ Found {target} model")
         
-        if not self.models:
+        if not self.targets:
             raise Exception("No models loaded! Please train models first using train_multi_target_model.py")
         
-        print(f"\nSuccessfully loaded {len(self.models)} models")
+        print(f"\nSuccessfully registered {len(self.targets)} models")
+    
+    def check_feature_alignment(self):
+        """Drop targets whose trained features the collection cannot provide"""
+        if self.bundle is None:
+            return
+        
+        self.projection = self._feature_projection()
+        df = self.fetch_latest_data(n_samples=10)
+        if df is None:
+            return
+        
+        try:
+            self.bundle.check_features(df.columns, self.targets)
+            print("  ✓ Collection provides every model feature")
+        except FeatureMismatchError as e:
+            for target, columns in e.missing.items():
+                print(f"  ✗ {target} disabled, missing features: {', '.join(columns)}")
+            self.targets = [t for t in self.targets if t not in e.missing]
+            self.projection = self._feature_projection()
+        
+        if not self.targets:
+            raise Exception("No model's features are available in the collection")
+        
+        print(f"  ✓ Reading fields: {', '.join(k for k, v in self.projection.items() if v)}")
+    
+    def _feature_projection(self):
+        """Projection of the raw columns the bundle's targets need"""
+        columns = set()
+        for target in self.targets:
+            columns.update(self.bundle.source_columns(target))
+            # The target's own column provides lags and the current value
+            columns.add(self.bundle.targets[target].get('target_column', TARGET_FIELDS[target]))
+        return feature_projection(columns)
         
     def connect_mongodb(self):
         """Connect to MongoDB"""
@@ -100,44 +154,42 @@ class PredictionEngine:
             # Test connection
             self.mongo_client.server_info()
             self.db = self.mongo_client[MONGO_DB]
-            self.collection = self.db[MONGO_COLLECTION]
+            self.collection = self.db[self.collection_name]
             
             # Count documents
             doc_count = self.collection.count_documents({})
             print(f"  ✓ Connected to MongoDB")
-            print(f"  ✓ Collection '{MONGO_COLLECTION}' has {doc_count} documents")
+            print(f"  ✓ Collection '{self.collection_name}' has {doc_count} documents")
             
         except Exception as e:
             print(f"  ✗ MongoDB connection failed: {e}")
             raise
+        
+        self.check_time_index()
+    
+    def check_time_index(self):
+        """Latest-N and incremental reads sort/filter on received_at"""
+        try:
+            if ensure_index(self.collection, 'received_at'):
+                print(f"  ✓ received_at index present on '{self.collection_name}'")
+            else:
+                print(f"  ✓ Created received_at index on '{self.collection_name}'")
+        except Exception as e:
+            print(f"  ⚠ No received_at index and it could not be created ({e}); reads will scan the collection")
     
     def fetch_latest_data(self, n_samples=10):
-        """Fetch latest sensor data from MongoDB"""
+        """Fetch latest sensor data from MongoDB (projected numeric columns)"""
         try:
-            # Get latest documents sorted by received_at
-            cursor = self.collection.find().sort('received_at', -1).limit(n_samples)
-            data = list(cursor)
+            # Get latest documents sorted by received_at, only the model fields
+            times, columns = fetch_columns(self.collection, projection=self.projection,
+                                           sort=('received_at', -1), limit=n_samples)
             
-            if not data:
+            if not times:
                 print("  ⚠ No data found in MongoDB")
                 return None
             
-            # Convert to DataFrame
-            df = pd.DataFrame(data)
-            
-            # Parse datetime
-            if 'received_at' in df.columns:
-                df['received_at'] = pd.to_datetime(df['received_at'], errors='coerce')
-                df = df.sort_values('received_at')
-            
-            # Drop MongoDB _id and other non-numeric columns
-            cols_to_drop = ['_id', 'correlation_ids', 'frm_payload', 'rx_metadata', 'beep']
-            cols_to_drop = [col for col in cols_to_drop if col in df.columns]
-            df = df.drop(columns=cols_to_drop)
-            
-            # Keep only numeric columns
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-            df = df[numeric_cols]
+            # Oldest first
+            df = pd.DataFrame({col: values[::-1] for col, values in columns.items()})
             
             print(f"  ✓ Fetched {len(df)} samples with {len(df.columns)} features")
             
@@ -147,41 +199,59 @@ class PredictionEngine:
             print(f"  ✗ Error fetching data: {e}")
             return None
     
-    def prepare_features(self, df, target_col):
-        """Prepare features for prediction"""
-        # Create a copy
-        df_temp = df.copy()
-        
-        # Create lag features if target exists in data
-        if target_col in df_temp.columns:
-            df_temp[f'{target_col}_lag1'] = df_temp[target_col].shift(1)
-            df_temp[f'{target_col}_lag2'] = df_temp[target_col].shift(2)
-        
-        # Create rolling mean features
-        rolling_window = 5
-        for col in df_temp.columns:
-            if any(keyword in col.lower() for keyword in ['pm10', 'pm2', 'co2', 'humidity', 'temperature', 'temp', 'hum', 'tvoc', 'pressure']):
-                if col != target_col:
-                    rolling_col = f'{col}_rolling_mean_{rolling_window}'
-                    df_temp[rolling_col] = df_temp[col].rolling(window=rolling_window, min_periods=1).mean()
-        
-        # Drop NaN rows
-        df_temp = df_temp.dropna()
-        
-        # Remove target column from features
-        feature_cols = [col for col in df_temp.columns if col != target_col]
-        
-        return df_temp[feature_cols]
+    def fetch_new_data(self):
+        """Feed documents received since the last run into the feature state"""
+        try:
+            if self.last_received_at is None:
+                # Warm up from the latest window, oldest first
+                times, columns = fetch_columns(self.collection, projection=self.projection,
+                                               sort=('received_at', -1), limit=FEATURE_HISTORY)
+                times = times[::-1]
+                columns = {col: values[::-1] for col, values in columns.items()}
+            else:
+                times, columns = fetch_columns(self.collection, {'received_at': {'$gt': self.last_received_at}},
+                                               projection=self.projection)
+        except Exception as e:
+            print(f"  ✗ Error fetching data: {e}")
+            return 0
+        
+        for doc in iter_rows(times, columns):
+            self.feature_state.update(doc)
+            if doc['received_at'] is not None:
+                self.last_received_at = doc['received_at']
+        
+        print(f"  ✓ Fetched {len(times)} new samples ({len(self.feature_state.columns)} features tracked)")
+        return len(times)
     
-    def generate_predictions(self):
-        """Generate predictions for all targets"""
-        print("\nFetching latest sensor data...")
-        df = self.fetch_latest_data(n_samples=10)
+    def sensor_snapshot(self, sensor_id, predictions):
+        """Latest readings plus predictions in the backend's multi-sensor format"""
+        target_columns = resolve_targets(self.feature_state.columns)
+        
+        def latest(target):
+            value = self.feature_state.latest(target_columns.get(target))
+            return round(value, 2) if value == value else 0
         
-        if df is None or len(df) == 0:
+        return {
+            'name': f'Sensor {sensor_id}',
+            'aqi': calculate_aqi(latest('PM2.5'), latest('PM10')),
+            'pollutants': {TARGET_FIELDS[t]: latest(t) for t in ('PM2.5', 'PM10', 'CO2', 'TVOC')},
+            'environmental': {TARGET_FIELDS[t]: latest(t) for t in ('Temperature', 'Humidity', 'Pressure')},
+            'predictions': predictions.get('predictions', {}) if predictions else {}
+        }
+    
+    def generate_predictions(self, only_new=False):
+        """Generate predictions for all targets (with only_new, skip if nothing arrived)"""
+        print("\nFetching new sensor data...")
+        new_samples = self.fetch_new_data()
+        
+        if self.feature_state.rows == 0:
             print("  ✗ No data available for prediction")
             return None
         
+        if only_new and new_samples == 0:
+            print("  ⚠ No new readings since the last run, skipping")
+            return None
+        
         predictions = {
             'timestamp': datetime.now().isoformat(),
             'predictions': {}
@@ -189,38 +259,46 @@ class PredictionEngine:
         
         print("\nGenerating predictions...")
         
-        for target, model in self.models.items():
+        # Source column of every target, resolved once per column set
+        target_columns = resolve_targets(self.feature_state.columns)
+        
+        for target in self.targets:
             try:
-                # Find the actual column name for this target
-                target_col = None
-                for col in df.columns:
-                    if target.lower().replace('.', '').replace(' ', '') in col.lower().replace('_', ''):
-                        target_col = col
-                        break
+                target_col = target_columns.get(target)
                 
                 if target_col is None:
                     print(f"  ⚠ Column not found for {target}, skipping")
                     continue
                 
-                # Prepare features
-                X = self.prepare_features(df, target_col)
+                # Latest feature row, maintained incrementally
+                features = self.feature_state.features(target_col)
                 
-                if len(X) == 0:
+                if features is None:
                     print(f"  ⚠ No valid data for {target}")
                     continue
+                X = features.to_frame().T
                 
-                # Get scaler
-                scaler = self.scalers[target]
+                # Get model and scaler (loaded on first use)
+                if self.bundle is not None:
+                    # Exact training column order from the bundle schema
+                    X = X[self.bundle.features(target)]
+                    model, scaler = self.bundle.model_and_scaler(target)
+                else:
+                    pair = self.registry.get(target, n_features=X.shape[1])
+                    if pair is None:
+                        print(f"  ⚠ No {target} model for {X.shape[1]} features, skipping")
+                        continue
+                    model, scaler = pair
                 
                 # Scale features
                 X_scaled = scaler.transform(X)
                 
-                # Make prediction (use last row)
-                prediction = model.predict(X_scaled[-1:])
+                # Make prediction
+                prediction = model.predict(X_scaled)
                 predicted_value = float(prediction[0])
                 
                 # Get actual current value for comparison
-                actual_value = float(df[target_col].iloc[-1])
+                actual_value = self.feature_state.latest(target_col)
                 
                 predictions['predictions'][target] = {
                     'predicted': round(predicted_value, 2),
@@ -236,40 +314,16 @@ class PredictionEngine:
         # Calculate AQI from PM2.5 prediction
         if 'PM2.5' in predictions['predictions']:
             pm25_pred = predictions['predictions']['PM2.5']['predicted']
-            predictions['aqi'] = self._calculate_aqi(pm25_pred)
+            predictions['aqi'] = calculate_aqi(pm25_pred)
         
         return predictions
     
     def _get_unit(self, target):
         """Get unit for target"""
-        units = {
-            'PM2.5': 'µg/m³',
-            'PM10': 'µg/m³',
-            'CO2': 'ppm',
-            'TVOC': 'ppb',
-            'Temperature': '°C',
-            'Humidity': '%',
-            'Pressure': 'hPa'
-        }
-        return units.get(target, '')
-    
-    def _calculate_aqi(self, pm25):
-        """Calculate AQI from PM2.5"""
-        if pm25 <= 12.0:
-            return int((50 / 12.0) * pm25)
-        elif pm25 <= 35.4:
-            return int(50 + ((100 - 50) / (35.4 - 12.1)) * (pm25 - 12.1))
-        elif pm25 <= 55.4:
-            return int(100 + ((150 - 100) / (55.4 - 35.5)) * (pm25 - 35.5))
-        elif pm25 <= 150.4:
-            return int(150 + ((200 - 150) / (150.4 - 55.5)) * (pm25 - 55.5))
-        elif pm25 <= 250.4:
-            return int(200 + ((300 - 200) / (250.4 - 150.5)) * (pm25 - 150.5))
-        else:
-            return int(300 + ((500 - 300) / (500.4 - 250.5)) * (pm25 - 250.5))
+        return TARGET_UNITS.get(target, '')
     
     def send_to_backend(self, predictions):
-        """Send predictions to backend server"""
+        """Spool predictions for the backend server"""
         if not predictions or 'predictions' not in predictions:
             print("  ✗ No predictions to send")
             return False
@@ -289,28 +343,13 @@ class PredictionEngine:
                 'predictions': predictions['predictions']  # Include full prediction details
             }
             
-            print(f"\nSending predictions to backend: {BACKEND_URL}")
-            response = requests.post(
-                BACKEND_URL,
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                print(f"  ✓ Successfully sent predictions (AQI: {data['aqi']})")
-                return True
-            else:
-                print(f"  ✗ Backend returned status {response.status_code}")
-                print(f"    Response: {response.text}")
-                return False
+            # Durable once spooled; the outbox delivers it when the backend is up
+            self.outbox.submit(data)
+            print(f"\n  ✓ Queued predictions for backend {BACKEND_URL} (AQI: {data['aqi']})")
+            return True
                 
-        except requests.exceptions.ConnectionError:
-            print("  ✗ Cannot connect to backend server")
-            print("    Make sure server is running: python backend/server.py")
-            return False
         except Exception as e:
-            print(f"  ✗ Error sending predictions: {e}")
+            print(f"  ✗ Error spooling predictions: {e}")
             return False
     
     def run_once(self):
@@ -331,7 +370,9 @@ class PredictionEngine:
                 print(f"Prediction Run - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
                 print(f"{'='*80}")
                 
-                self.run_once()
+                predictions = self.generate_predictions(only_new=True)
+                if predictions:
+                    self.send_to_backend(predictions)
                 
                 print(f"\nWaiting {PREDICTION_INTERVAL} seconds until next prediction...")
                 time.sleep(PREDICTION_INTERVAL)
@@ -339,8 +380,158 @@ class PredictionEngine:
         except KeyboardInterrupt:
             print("\n\nStopped continuous prediction mode")
     
+    def run_event_driven(self):
+        """Run predictions whenever new readings are inserted"""
+        watcher = InsertWatcher(self.collection, poll_interval=WATCH_POLL_INTERVAL, debounce=WATCH_DEBOUNCE)
+        print(f"\nStarting event-driven prediction mode ({watcher.mode}, debounce: {WATCH_DEBOUNCE}s)")
+        print("Press Ctrl+C to stop\n")
+        
+        try:
+            while True:
+                print(f"\n{'='*80}")
+                print(f"Prediction Run - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                print(f"{'='*80}")
+                
+                predictions = self.generate_predictions(only_new=True)
+                if predictions:
+                    self.send_to_backend(predictions)
+                
+                print("\nWaiting for new readings...")
+                watcher.wait(since=self.last_received_at)
+                
+        except KeyboardInterrupt:
+            print("\n\nStopped event-driven prediction mode")
+        finally:
+            watcher.close()
+    
+    def cleanup(self):
+        """Cleanup resources"""
+        if self.outbox:
+            close_outbox(self.outbox)
+        if self.mongo_client:
+            self.mongo_client.close()
+            print("\n✓ MongoDB connection closed")
+
+
+def _sensor_id(collection_name):
+    """Sensor number from a collection name ('ambience-3' -> '3')"""
+    match = re.search(r'(\d+)$', collection_name)
+    return match.group(1) if match else collection_name
+
+
+class FleetPredictionEngine:
+    """Predictions for every sensor collection, sent as one backend update"""
+    
+    def __init__(self, collection_names=None):
+        self.collection_names = collection_names
+        self.mongo_client = None
+        self.engines = {}
+        self.latest_predictions = {}
+        self.executor = ThreadPoolExecutor(max_workers=FLEET_WORKERS)
+        self.outbox = None
+    
+    def connect(self):
+        """Open one pooled client and set up an engine per sensor collection"""
+        print(f"\nConnecting to MongoDB: {MONGO_URI}")
+        self.mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000, maxPoolSize=FLEET_WORKERS)
+        self.mongo_client.server_info()
+        db = self.mongo_client[MONGO_DB]
+        
+        names = self.collection_names
+        if not names:
+            names = sorted(n for n in db.list_collection_names() if n.startswith(SENSOR_COLLECTION_PREFIX))
+        if not names:
+            raise Exception(f"No sensor collections found (prefix '{SENSOR_COLLECTION_PREFIX}')")
+        print(f"  ✓ Sensor collections: {', '.join(names)}")
+        
+        # Models are loaded once and shared through the registry
+        base = PredictionEngine()
+        base.load_models()
+        
+        for name in names:
+            engine = PredictionEngine(collection_name=name)
+            engine.bundle = base.bundle
+            engine.targets = list(base.targets)
+            engine.db = db
+            engine.collection = db[name]
+            engine.check_time_index()
+            engine.check_feature_alignment()
+            self.engines[_sensor_id(name)] = engine
+    
+    def run_cycle(self, only_new=False):
+        """Fetch and predict every sensor concurrently, then send one update"""
+        futures = {
+            sensor_id: self.executor.submit(engine.generate_predictions, only_new)
+            for sensor_id, engine in self.engines.items()
+        }
+        
+        updated = 0
+        for sensor_id, future in futures.items():
+            try:
+                predictions = future.result()
+            except Exception as e:
+                print(f"  ✗ Sensor {sensor_id} failed: {e}")
+                continue
+            if predictions:
+                self.latest_predictions[sensor_id] = predictions
+                updated += 1
+        
+        if only_new and updated == 0:
+            print("  ⚠ No sensor has new readings, nothing to send")
+            return False
+        return self.send_to_backend()
+    
+    def send_to_backend(self):
+        """Spool every sensor's latest state as one multi-sensor update"""
+        sensors = {}
+        for sensor_id, engine in self.engines.items():
+            if engine.feature_state.rows == 0:
+                continue
+            sensors[f'sensor_{sensor_id}'] = engine.sensor_snapshot(sensor_id, self.latest_predictions.get(sensor_id))
+        
+        if not sensors:
+            print("  ✗ No sensor data to send")
+            return False
+        
+        data = {
+            'timestamp': datetime.now().isoformat(),
+            'total_sensors': len(sensors),
+            'sensors': sensors
+        }
+        
+        try:
+            # Durable once spooled; the outbox delivers it when the backend is up
+            self.outbox.submit(data)
+            print(f"\n  ✓ Queued {len(sensors)} sensors for backend {BACKEND_URL}")
+            return True
+        except Exception as e:
+            print(f"  ✗ Error spooling predictions: {e}")
+            return False
+    
+    def run_continuous(self):
+        """Run fleet prediction cycles continuously"""
+        print(f"\nStarting fleet prediction mode ({len(self.engines)} sensors, interval: {PREDICTION_INTERVAL}s)")
+        print("Press Ctrl+C to stop\n")
+        
+        try:
+            while True:
+                print(f"\n{'='*80}")
+                print(f"Fleet Prediction Run - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                print(f"{'='*80}")
+                
+                self.run_cycle(only_new=True)
+                
+                print(f"\nWaiting {PREDICTION_INTERVAL} seconds until next prediction...")
+                time.sleep(PREDICTION_INTERVAL)
+                
+        except KeyboardInterrupt:
+            print("\n\nStopped fleet prediction mode")
+    
     def cleanup(self):
         """Cleanup resources"""
+        self.executor.shutdown(wait=False)
+        if self.outbox:
+            close_outbox(self.outbox)
         if self.mongo_client:
             self.mongo_client.close()
             print("\n✓ MongoDB connection closed")
@@ -350,21 +541,33 @@ def main():
     parser = argparse.ArgumentParser(description='Air Quality Prediction Engine')
     parser.add_argument('--continuous', action='store_true', 
                         help='Run predictions continuously')
+    parser.add_argument('--watch', action='store_true',
+                        help='Run predictions as new readings are inserted')
+    parser.add_argument('--fleet', action='store_true',
+                        help='Predict every sensor collection and send one combined update')
     args = parser.parse_args()
     
     print("="*80)
     print("AIR QUALITY PREDICTION ENGINE")
     print("="*80)
     
+    if args.fleet:
+        run_fleet(args)
+        return
+    
     engine = PredictionEngine()
     
     try:
         # Initialize
+        engine.outbox = open_outbox(MONGO_COLLECTION)
         engine.load_models()
         engine.connect_mongodb()
+        engine.check_feature_alignment()
         
         # Run predictions
-        if args.continuous:
+        if args.watch:
+            engine.run_event_driven()
+        elif args.continuous:
             engine.run_continuous()
         else:
             engine.run_once()
@@ -376,5 +579,24 @@ def main():
         engine.cleanup()
 
 
+def run_fleet(args):
+    """Fleet mode entry point"""
+    names = [n.strip() for n in SENSOR_COLLECTIONS.split(',') if n.strip()]
+    fleet = FleetPredictionEngine(names)
+    
+    try:
+        fleet.outbox = open_outbox('fleet')
+        fleet.connect()
+        if args.continuous:
+            fleet.run_continuous()
+        else:
+            fleet.run_cycle()
+    except Exception as e:
+        print(f"\n✗ Fatal error: {e}")
+        sys.exit(1)
+    finally:
+        fleet.cleanup()
+
+
 if __name__ == "__main__":
     main()
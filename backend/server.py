@@ -1,10 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import requests
 import os
+import sys
+import json
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+import numpy as np
+
+# Make the shared airsense package (repository root) importable
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from airsense.aqi import aqi_category, calculate_aqi_array
+from airsense.forecasting import ForecastEngine
 
 # Load environment variables
 load_dotenv()
@@ -19,6 +29,8 @@ CORS(app, origins=os.getenv('CORS_ORIGINS', '*'))
 # Configuration
 LM_STUDIO_BASE_URL = os.getenv('LM_STUDIO_BASE_URL', 'http://localhost:1234/v1')
 LM_STUDIO_MODEL = os.getenv('LM_STUDIO_MODEL', 'local-model')
+# Relative MODEL_DIR values are resolved against the backend directory
+MODEL_DIR = os.path.join(BACKEND_DIR, os.getenv('MODEL_DIR', '../models'))
 
 # In-memory storage for latest prediction data
 # In production, consider using Redis or a database
@@ -33,6 +45,21 @@ all_sensors_data = {
     'sensors': {}
 }
 
+# Forecasting engine fed by every reading the server receives
+forecast_engine = ForecastEngine(MODEL_DIR)
+try:
+    logger.info(f"Found {forecast_engine.load_models()} forecast models in {MODEL_DIR}")
+except Exception as e:
+    logger.error(f"Error loading forecast models: {str(e)}")
+
+
+def _observe_sensor(sensor_key, sensor_info):
+    """Feed a sensor's latest pollutant/environmental values to the forecaster"""
+    reading = {}
+    reading.update(sensor_info.get('pollutants') or {})
+    reading.update(sensor_info.get('environmental') or {})
+    forecast_engine.observe(sensor_key, reading)
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -43,6 +70,102 @@ def health_check():
         'lm_studio_url': LM_STUDIO_BASE_URL
     }), 200
 
+def _prediction_error(data):
+    """Why a payload cannot be applied, or None if it can"""
+    if not isinstance(data, dict):
+        return 'payload must be a JSON object'
+    if 'sensors' in data:
+        if not isinstance(data['sensors'], dict):
+            return "'sensors' must be an object"
+        for sensor_key, sensor_info in data['sensors'].items():
+            if not isinstance(sensor_info, dict):
+                return f"'sensors.{sensor_key}' must be an object"
+            for section in ('pollutants', 'environmental', 'predictions'):
+                if not isinstance(sensor_info.get(section) or {}, dict):
+                    return f"'sensors.{sensor_key}.{section}' must be an object"
+    elif not isinstance(data.get('sensor_data') or {}, dict):
+        return "'sensor_data' must be an object"
+    return None
+
+
+def _store_prediction(data):
+    """Apply one prediction payload (single or multi-sensor); returns (message, timestamp)"""
+    # Check if this is multi-sensor data
+    if 'sensors' in data and 'total_sensors' in data:
+        # Merge multi-sensor data (publishers may send only changed sensors)
+        if not isinstance(all_sensors_data.get('sensors'), dict):
+            all_sensors_data['sensors'] = {}
+        all_sensors_data['timestamp'] = datetime.now().isoformat()
+        all_sensors_data['sensors'].update(data['sensors'])
+        all_sensors_data['total_sensors'] = len(all_sensors_data['sensors'])
+        
+        for sensor_key, sensor_info in data['sensors'].items():
+            _observe_sensor(sensor_key, sensor_info)
+        
+        logger.info(f"Received data from {data['total_sensors']} sensors")
+        
+        return f'Data from {data["total_sensors"]} sensors received', all_sensors_data['timestamp']
+    else:
+        # Store single sensor prediction data
+        latest_prediction['timestamp'] = datetime.now().isoformat()
+        latest_prediction['data'] = data
+        
+        # Map into all_sensors_data for multi-sensor display
+        sensor_id = data.get('sensor_id')
+        if sensor_id:
+            sensor_key = f"sensor_{sensor_id}" if not str(sensor_id).startswith('sensor_') else str(sensor_id)
+            
+            # Create structure compatible with /api/sensors/all
+            sensor_info = {
+                'name': data.get('sensor_name', f'Sensor {sensor_id}'),
+                'aqi': data.get('aqi', 0),
+                'pollutants': {
+                    'pm2_5': data.get('sensor_data', {}).get('pm2_5', data.get('pm25', 0)),
+                    'pm10': data.get('sensor_data', {}).get('pm10', data.get('pm10', 0)),
+                    'co2': data.get('sensor_data', {}).get('co2', data.get('co2', 0)),
+                    'tvoc': data.get('sensor_data', {}).get('tvoc', data.get('tvoc', 0)),
+                },
+                'environmental': {
+                    'temperature': data.get('sensor_data', {}).get('temperature', data.get('temperature', 0)),
+                    'humidity': data.get('sensor_data', {}).get('humidity', data.get('humidity', 0)),
+                    'pressure': data.get('sensor_data', {}).get('pressure', data.get('pressure', 0)),
+                },
+                'predictions': data.get('predictions', {})
+            }
+            
+            if 'sensors' not in all_sensors_data or not isinstance(all_sensors_data['sensors'], dict):
+                all_sensors_data['sensors'] = {}
+            
+            all_sensors_data['sensors'][sensor_key] = sensor_info
+            _observe_sensor(sensor_key, sensor_info)
+            all_sensors_data['timestamp'] = datetime.now().isoformat()
+            all_sensors_data['total_sensors'] = len(all_sensors_data['sensors'])
+        
+        # Enhanced logging with ALL sensor data
+        sensor_id = data.get('sensor_id', 'Unknown')
+        sensor_name = data.get('sensor_name', 'N/A')
+        timestamp = data.get('timestamp', 'N/A')
+        
+        # Get all pollutant values
+        aqi = data.get('aqi', 0)
+        pm25 = data.get('pm25', 0)
+        pm10 = data.get('pm10', 0)
+        co2 = data.get('co2', 0)
+        tvoc = data.get('tvoc', 0)
+        temp = data.get('temperature', 0)
+        hum = data.get('humidity', 0)
+        pres = data.get('pressure', 0)
+        
+        # Comprehensive log with all pollutants
+        logger.info(f"📊 Sensor {sensor_id} ({sensor_name})")
+        logger.info(f"   AQI: {aqi} (from PM2.5={pm25})")
+        logger.info(f"   Pollutants: PM2.5={pm25}, PM10={pm10}, CO2={co2}, TVOC={tvoc}")
+        logger.info(f"   Environment: Temp={temp}°C, Humidity={hum}%, Pressure={pres}hPa")
+        logger.info(f"   Time: {timestamp}")
+        
+        return 'Prediction data received', latest_prediction['timestamp']
+
+
 # Prediction data endpoints
 @app.route('/api/predictions', methods=['POST'])
 def receive_prediction():
@@ -57,7 +180,7 @@ def receive_prediction():
         ...
     }
     
-    OR multi-sensor format:
+    OR multi-sensor format (sensors not included keep their last state):
     {
         "timestamp": "2025-12-28T12:00:00",
         "total_sensors": 5,
@@ -67,6 +190,11 @@ def receive_prediction():
             ...
         }
     }
+    
+    OR a list of either, applied in order (spooled payloads delivered in one
+    batch after the backend was unreachable). Every item is checked first:
+    if one is invalid the whole batch is refused with 400 and nothing is
+    applied, so the sender can retry the rest without applying any twice.
     """
     try:
         data = request.get_json()
@@ -74,87 +202,27 @@ def receive_prediction():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        # Check if this is multi-sensor data
-        if 'sensors' in data and 'total_sensors' in data:
-            # Store multi-sensor data
-            all_sensors_data['timestamp'] = datetime.now().isoformat()
-            all_sensors_data['sensors'] = data['sensors']
-            all_sensors_data['total_sensors'] = data['total_sensors']
-            
-            logger.info(f"Received data from {data['total_sensors']} sensors")
-            
-            return jsonify({
-                'status': 'success',
-                'message': f'Data from {data["total_sensors"]} sensors received',
-                'timestamp': all_sensors_data['timestamp']
-            }), 200
+        if isinstance(data, list):
+            errors = {index: _prediction_error(item) for index, item in enumerate(data)}
+            errors = {index: error for index, error in errors.items() if error}
+            if errors:
+                return jsonify({'error': 'Batch rejected, nothing applied', 'rejected': errors}), 400
+            for item in data:
+                message, timestamp = _store_prediction(item)
+            logger.info(f"Applied batch of {len(data)} payloads")
+            message = f'Batch of {len(data)} payloads received'
         else:
-            # Store single sensor prediction data
-            latest_prediction['timestamp'] = datetime.now().isoformat()
-            latest_prediction['data'] = data
-            
-            # Map into all_sensors_data for multi-sensor display
-            sensor_id = data.get('sensor_id')
-            if sensor_id:
-                sensor_key = f"sensor_{sensor_id}" if not str(sensor_id).startswith('sensor_') else str(sensor_id)
-                
-                # Create structure compatible with /api/sensors/all
-                sensor_info = {
-                    'name': data.get('sensor_name', f'Sensor {sensor_id}'),
-                    'aqi': data.get('aqi', 0),
-                    'pollutants': {
-                        'pm2_5': data.get('sensor_data', {}).get('pm2_5', data.get('pm25', 0)),
-                        'pm10': data.get('sensor_data', {}).get('pm10', data.get('pm10', 0)),
-                        'co2': data.get('sensor_data', {}).get('co2', data.get('co2', 0)),
-                        'tvoc': data.get('sensor_data', {}).get('tvoc', data.get('tvoc', 0)),
-                    },
-                    'environmental': {
-                        'temperature': data.get('sensor_data', {}).get('temperature', data.get('temperature', 0)),
-                        'humidity': data.get('sensor_data', {}).get('humidity', data.get('humidity', 0)),
-                        'pressure': data.get('sensor_data', {}).get('pressure', data.get('pressure', 0)),
-                    },
-                    'predictions': data.get('predictions', {})
-                }
-                
-                if 'sensors' not in all_sensors_data or not isinstance(all_sensors_data['sensors'], dict):
-                    all_sensors_data['sensors'] = {}
-                
-                all_sensors_data['sensors'][sensor_key] = sensor_info
-                all_sensors_data['timestamp'] = datetime.now().isoformat()
-                all_sensors_data['total_sensors'] = len(all_sensors_data['sensors'])
-            
-            # Enhanced logging with ALL sensor data
-            sensor_id = data.get('sensor_id', 'Unknown')
-            sensor_name = data.get('sensor_name', 'N/A')
-            timestamp = data.get('timestamp', 'N/A')
-            
-            # Get all pollutant values
-            aqi = data.get('aqi', 0)
-            pm25 = data.get('pm25', 0)
-            pm10 = data.get('pm10', 0)
-            co2 = data.get('co2', 0)
-            tvoc = data.get('tvoc', 0)
-            temp = data.get('temperature', 0)
-            hum = data.get('humidity', 0)
-            pres = data.get('pressure', 0)
-            
-            # Comprehensive log with all pollutants
-            logger.info(f"📊 Sensor {sensor_id} ({sensor_name})")
-            logger.info(f"   AQI: {aqi} (from PM2.5={pm25})")
-            logger.info(f"   Pollutants: PM2.5={pm25}, PM10={pm10}, CO2={co2}, TVOC={tvoc}")
-            logger.info(f"   Environment: Temp={temp}°C, Humidity={hum}%, Pressure={pres}hPa")
-            logger.info(f"   Time: {timestamp}")
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Prediction data received',
-                'timestamp': latest_prediction['timestamp']
-            }), 200
-        
-    except Exception as e:
-        logger.error(f"Error receiving prediction: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+            error = _prediction_error(data)
+            if error:
+                return jsonify({'error': error}), 400
+            message, timestamp = _store_prediction(data)
         
+        return jsonify({
+            'status': 'success',
+            'message': message,
+            'timestamp': timestamp
+        }), 200
+
     except Exception as e:
         logger.error(f"Error receiving prediction: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -423,6 +491,10 @@ def get_forecast(sensor_id):
     """
     Get forecast data for a specific sensor
     
+    Forecasts come from rolling the trained 3-lag models forward from the
+    sensor's latest readings. Sensors without a model for a pollutant hold
+    their latest value for that pollutant.
+    
     Query parameters:
     - hours: Number of hours to forecast (default: 24)
     - days: Number of days to forecast (default: 7)
@@ -431,91 +503,22 @@ def get_forecast(sensor_id):
         hours = int(request.args.get('hours', 24))
         days = int(request.args.get('days', 7))
         
-        # Get current sensor data
-        sensor_key = f"sensor_{sensor_id}" if not sensor_id.startswith('sensor_') else sensor_id
+        sensor_key = _sensor_key(sensor_id)
+        _observe_single_sensor_fallback(sensor_key)
         
-        sensor_data = None
-        if all_sensors_data.get('sensors') and sensor_key in all_sensors_data['sensors']:
-            sensor_data = all_sensors_data['sensors'][sensor_key]
-        elif latest_prediction['data'] is not None and sensor_key == 'sensor_3':
-            # Fallback to single sensor data
-            sensor_data = {
-                'aqi': latest_prediction['data'].get('aqi', 50),
-                'pollutants': {
-                    'pm2_5': latest_prediction['data'].get('pm25', 25),
-                    'pm10': latest_prediction['data'].get('pm10', 40),
-                }
-            }
+        sensor_keys, paths = _forecast_paths(hours, days)
         
-        if not sensor_data:
+        if sensor_key not in sensor_keys:
             return jsonify({
                 'status': 'no_data',
                 'message': f'No data available for {sensor_key}'
             }), 404
         
-        # Generate hourly forecast
-        hourly_forecast = []
-        base_pm25 = sensor_data['pollutants'].get('pm2_5', 25)
-        base_pm10 = sensor_data['pollutants'].get('pm10', 40)
-        base_aqi = sensor_data.get('aqi', 50)
-        
-        from datetime import datetime, timedelta
         now = datetime.now()
-        
-        for i in range(hours):
-            timestamp = now + timedelta(hours=i)
-            hour = timestamp.hour
-            
-            # Time-based variation (higher during rush hours)
-            variation = 1.0
-            if 6 <= hour < 9:  # Morning rush
-                variation = 1.3
-            elif 17 <= hour < 20:  # Evening rush
-                variation = 1.4
-            elif 22 <= hour or hour < 6:  # Night
-                variation = 0.8
-            
-            # Add some randomness
-            import random
-            random_factor = 0.85 + random.random() * 0.3
-            
-            pm25 = round(base_pm25 * variation * random_factor, 1)
-            pm10 = round(base_pm10 * variation * random_factor, 1)
-            
-            # Calculate AQI
-            aqi = _calculate_aqi_from_pm(pm25, pm10)
-            
-            hourly_forecast.append({
-                'timestamp': timestamp.isoformat(),
-                'hour': hour,
-                'aqi': aqi,
-                'pm25': pm25,
-                'pm10': pm10,
-                'category': _get_aqi_category(aqi)
-            })
-        
-        # Generate daily forecast
-        daily_forecast = []
-        for i in range(days):
-            timestamp = now + timedelta(days=i)
-            day_of_week = timestamp.weekday()
-            
-            # Weekday vs weekend variation
-            variation = 0.85 if day_of_week >= 5 else 1.1
-            random_factor = 0.8 + random.random() * 0.4
-            
-            pm25 = round(base_pm25 * variation * random_factor, 1)
-            pm10 = round(base_pm10 * variation * random_factor, 1)
-            aqi = _calculate_aqi_from_pm(pm25, pm10)
-            
-            daily_forecast.append({
-                'date': timestamp.strftime('%Y-%m-%d'),
-                'day_of_week': timestamp.strftime('%A'),
-                'aqi': aqi,
-                'pm25': pm25,
-                'pm10': pm10,
-                'category': _get_aqi_category(aqi)
-            })
+        row = sensor_keys.index(sensor_key)
+        hourly_forecast, daily_forecast = _build_forecast(
+            paths['pm2_5'][row], paths['pm10'][row], now, hours, days
+        )
         
         return jsonify({
             'status': 'success',
@@ -529,52 +532,151 @@ def get_forecast(sensor_id):
         logger.error(f"Error generating forecast: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-def _calculate_aqi_from_pm(pm25, pm10):
-    """Calculate AQI from PM2.5 and PM10"""
-    aqi_pm25 = _pm25_to_aqi(pm25)
-    aqi_pm10 = _pm10_to_aqi(pm10)
-    return max(aqi_pm25, aqi_pm10)
-
-def _pm25_to_aqi(pm25):
-    """Convert PM2.5 to AQI"""
-    if pm25 <= 12.0:
-        return int((pm25 / 12.0) * 50)
-    elif pm25 <= 35.4:
-        return int(50 + ((pm25 - 12.0) / (35.4 - 12.0)) * 50)
-    elif pm25 <= 55.4:
-        return int(100 + ((pm25 - 35.4) / (55.4 - 35.4)) * 50)
-    elif pm25 <= 150.4:
-        return int(150 + ((pm25 - 55.4) / (150.4 - 55.4)) * 50)
-    else:
-        return 200
-
-def _pm10_to_aqi(pm10):
-    """Convert PM10 to AQI"""
-    if pm10 <= 54:
-        return int((pm10 / 54) * 50)
-    elif pm10 <= 154:
-        return int(50 + ((pm10 - 54) / (154 - 54)) * 50)
-    elif pm10 <= 254:
-        return int(100 + ((pm10 - 154) / (254 - 154)) * 50)
-    elif pm10 <= 354:
-        return int(150 + ((pm10 - 254) / (354 - 254)) * 50)
-    else:
-        return 200
-
-def _get_aqi_category(aqi):
-    """Get AQI category name"""
-    if aqi <= 50:
-        return 'Good'
-    elif aqi <= 100:
-        return 'Moderate'
-    elif aqi <= 150:
-        return 'Unhealthy for Sensitive Groups'
-    elif aqi <= 200:
-        return 'Unhealthy'
-    elif aqi <= 300:
-        return 'Very Unhealthy'
-    else:
-        return 'Hazardous'
+@app.route('/api/forecast', methods=['GET'])
+def get_fleet_forecast():
+    """
+    Get forecasts for many sensors in one request
+    
+    All requested sensors are forecast together in one batch and the
+    response is streamed sensor by sensor:
+    {
+        "status": "success",
+        "timestamp": "...",
+        "sensors": {
+            "sensor_1": {"hourly": [...], "daily": [...]},
+            "sensor_2": {"error": "..."},
+            ...
+        },
+        "missing": ["sensor_9"]
+    }
+    
+    A sensor whose forecast fails once streaming has started gets an
+    "error" entry instead, so the document is always complete.
+    
+    Query parameters:
+    - sensors: Comma-separated sensor ids (default: every known sensor)
+    - hours: Number of hours to forecast (default: 24)
+    - days: Number of days to forecast (default: 7)
+    """
+    try:
+        hours = int(request.args.get('hours', 24))
+        days = int(request.args.get('days', 7))
+        requested = [_sensor_key(s.strip()) for s in request.args.get('sensors', '').split(',') if s.strip()]
+        
+        for sensor_key in requested:
+            _observe_single_sensor_fallback(sensor_key)
+        
+        sensor_keys, paths = _forecast_paths(hours, days)
+        if not requested:
+            requested = sensor_keys
+        
+        rows = {sensor_key: row for row, sensor_key in enumerate(sensor_keys)}
+        missing = [sensor_key for sensor_key in requested if sensor_key not in rows]
+        now = datetime.now()
+        
+        def generate():
+            yield '{"status": "success", "timestamp": %s, "sensors": {' % json.dumps(now.isoformat())
+            first = True
+            for sensor_key in requested:
+                if sensor_key not in rows:
+                    continue
+                row = rows[sensor_key]
+                # The 200 is already sent: a failing sensor gets an error entry, the document still closes
+                try:
+                    hourly_forecast, daily_forecast = _build_forecast(
+                        paths['pm2_5'][row], paths['pm10'][row], now, hours, days
+                    )
+                    entry = json.dumps({'hourly': hourly_forecast, 'daily': daily_forecast})
+                except Exception as e:
+                    logger.error(f"Error generating forecast for {sensor_key}: {str(e)}")
+                    entry = json.dumps({'error': str(e)})
+                yield '%s%s: %s' % ('' if first else ', ', json.dumps(sensor_key), entry)
+                first = False
+            yield '}, "missing": %s}' % json.dumps(missing)
+        
+        return Response(stream_with_context(generate()), status=200, mimetype='application/json')
+        
+    except Exception as e:
+        logger.error(f"Error generating fleet forecast: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def _sensor_key(sensor_id):
+    """Normalize '3' / 'sensor_3' to 'sensor_3'"""
+    return f"sensor_{sensor_id}" if not str(sensor_id).startswith('sensor_') else str(sensor_id)
+
+def _observe_single_sensor_fallback(sensor_key):
+    """Seed sensor_3 from single-sensor data if no multi-sensor data arrived"""
+    if not forecast_engine.has_sensor(sensor_key) and latest_prediction['data'] is not None and sensor_key == 'sensor_3':
+        forecast_engine.observe(sensor_key, {
+            'pm2_5': latest_prediction['data'].get('pm25', 25),
+            'pm10': latest_prediction['data'].get('pm10', 40),
+        })
+
+def _forecast_paths(hours, days):
+    """Forecast every known sensor; one step per hour, days average 24 steps"""
+    steps = max(hours, days * 24)
+    return forecast_engine.forecast(steps, fields=('pm2_5', 'pm10'))
+
+def _forecast_value(value):
+    """A forecast point as a float, or None (null) where the path is NaN"""
+    return None if np.isnan(value) else float(value)
+
+def _forecast_aqi(aqi, pm25, pm10):
+    """(aqi, category) of a point, or (None, None) if neither pollutant is forecast"""
+    if np.isnan(pm25) and np.isnan(pm10):
+        return None, None
+    return int(aqi), aqi_category(int(aqi))
+
+def _build_forecast(pm25_path, pm10_path, now, hours, days):
+    """
+    Turn one sensor's forecast paths into hourly and daily points
+    
+    A pollutant the sensor never reported has a NaN path; its points are
+    null rather than 0, and the AQI comes from the other pollutant (null if
+    neither is forecast).
+    """
+    pm25_path = np.asarray(pm25_path, dtype=float)
+    pm10_path = np.asarray(pm10_path, dtype=float)
+    
+    # Hourly values and their AQI (one array call for the whole horizon; NaN counts as 0 there)
+    hourly_pm25 = np.round(pm25_path[:hours], 1)
+    hourly_pm10 = np.round(pm10_path[:hours], 1)
+    hourly_aqi = calculate_aqi_array(hourly_pm25, hourly_pm10)
+    
+    hourly_forecast = []
+    for i in range(hours):
+        timestamp = now + timedelta(hours=i)
+        aqi, category = _forecast_aqi(hourly_aqi[i], hourly_pm25[i], hourly_pm10[i])
+        
+        hourly_forecast.append({
+            'timestamp': timestamp.isoformat(),
+            'hour': timestamp.hour,
+            'aqi': aqi,
+            'pm25': _forecast_value(hourly_pm25[i]),
+            'pm10': _forecast_value(hourly_pm10[i]),
+            'category': category
+        })
+    
+    # Daily values average 24 hourly steps
+    daily_pm25 = np.round(pm25_path[:days * 24].reshape(days, 24).mean(axis=1), 1)
+    daily_pm10 = np.round(pm10_path[:days * 24].reshape(days, 24).mean(axis=1), 1)
+    daily_aqi = calculate_aqi_array(daily_pm25, daily_pm10)
+    
+    daily_forecast = []
+    for i in range(days):
+        timestamp = now + timedelta(days=i)
+        aqi, category = _forecast_aqi(daily_aqi[i], daily_pm25[i], daily_pm10[i])
+        
+        daily_forecast.append({
+            'date': timestamp.strftime('%Y-%m-%d'),
+            'day_of_week': timestamp.strftime('%A'),
+            'aqi': aqi,
+            'pm25': _forecast_value(daily_pm25[i]),
+            'pm10': _forecast_value(daily_pm10[i]),
+            'category': category
+        })
+    
+    return hourly_forecast, daily_forecast
 
 # Test endpoint for LM Studio connection
 @app.route('/api/test-llm', methods=['GET'])
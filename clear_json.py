@@ -1,4 +1,7 @@
 import os
+import shutil
+
+from airsense.ndjson_store import store_dir
 
 files = [f'mqtt_data_sensor{i}.json' for i in range(1, 6)]
 for f in files:
@@ -6,3 +9,6 @@ for f in files:
         with open(f, 'w') as out:
             out.write('[]')
         print(f"Cleared {f}")
+    if os.path.isdir(store_dir(f)):
+        shutil.rmtree(store_dir(f))
+        print(f"Cleared {store_dir(f)}")
@@ -2,48 +2,62 @@
 Combine All Sensor Data into One Excel File
 
 This script combines:
-1. Historical data from output.xlsx (638 rows)
+1. Historical data from output.xlsx (638 rows), or from the history/
+   Parquet store (every sensor) when it has data
 2. Live MQTT data from mqtt_data.json (current session)
 
 Output: combined_sensor_data.xlsx
 """
 
 import pandas as pd
-import json
 from datetime import datetime
 
+from airsense.history_store import HISTORY_DIR, HistoryStore
+from airsense.ndjson_store import read_after
+
+LIVE_SENSOR = 3  # mqtt_data.json is sensor 3's capture
+
 print("="*80)
 print("COMBINING ALL SENSOR DATA")
 print("="*80)
 
 try:
-    # Step 1: Load historical data from output.xlsx
-    print("\n[1/4] Loading historical data from output.xlsx...")
-    df_historical = pd.read_excel('output.xlsx')
-    print(f"  Loaded {len(df_historical)} historical records")
-    
-    # Extract sensor data columns from historical data
-    sensor_cols = [col for col in df_historical.columns if 'uplink_message.decoded_payload' in col]
-    if sensor_cols:
-        # Create a clean historical dataframe
-        df_hist_clean = df_historical[sensor_cols].copy()
-        df_hist_clean.columns = [col.replace('uplink_message.decoded_payload.', '') for col in df_hist_clean.columns]
-        
-        # Add timestamp
-        if 'received_at' in df_historical.columns:
-            df_hist_clean['received_at'] = df_historical['received_at']
-        
-        print(f"  Extracted {len(df_hist_clean.columns)} sensor columns")
+    # Step 1: Load historical data (history store, else output.xlsx)
+    history = HistoryStore()
+    if history.exists():
+        print(f"\n[1/4] Loading historical data from the history store ({HISTORY_DIR}/)...")
+        df_hist_clean = history.query()
+        print(f"  Loaded {len(df_hist_clean)} historical records from sensors"
+              f" {', '.join(map(str, history.sensors()))}")
     else:
-        df_hist_clean = df_historical
+        print("\n[1/4] Loading historical data from output.xlsx...")
+        df_historical = pd.read_excel('output.xlsx')
+        print(f"  Loaded {len(df_historical)} historical records")
+        
+        # Extract sensor data columns from historical data
+        sensor_cols = [col for col in df_historical.columns if 'uplink_message.decoded_payload' in col]
+        if sensor_cols:
+            # Create a clean historical dataframe
+            df_hist_clean = df_historical[sensor_cols].copy()
+            df_hist_clean.columns = [col.replace('uplink_message.decoded_payload.', '') for col in df_hist_clean.columns]
+            
+            # Add timestamp
+            if 'received_at' in df_historical.columns:
+                df_hist_clean['received_at'] = df_historical['received_at']
+            
+            print(f"  Extracted {len(df_hist_clean.columns)} sensor columns")
+        else:
+            df_hist_clean = df_historical
     
     # Step 2: Load live MQTT data from mqtt_data.json
     print("\n[2/4] Loading live MQTT data from mqtt_data.json...")
     try:
-        with open('mqtt_data.json', 'r') as f:
-            mqtt_data = json.load(f)
-        df_live = pd.DataFrame(mqtt_data)
+        df_live = pd.DataFrame([record for _, record in read_after('mqtt_data.json')])
         print(f"  Loaded {len(df_live)} live records")
+        if 'sensor_id' in df_hist_clean.columns and not df_live.empty:
+            df_live['sensor_id'] = LIVE_SENSOR
+            if 'received_at' in df_live.columns:
+                df_live['received_at'] = pd.to_datetime(df_live['received_at'], errors='coerce', utc=True, format='ISO8601')
     except FileNotFoundError:
         print("  No live MQTT data found (mqtt_data.json doesn't exist)")
         df_live = pd.DataFrame()
@@ -61,6 +75,9 @@ try:
         
         # Combine
         df_combined = pd.concat([df_hist_clean, df_live], ignore_index=True)
+        if 'sensor_id' in df_combined.columns and 'received_at' in df_combined.columns:
+            # Live records already imported into the history appear once
+            df_combined = df_combined.drop_duplicates(['sensor_id', 'received_at'], keep='last')
         print(f"  Combined total: {len(df_combined)} records")
     else:
         df_combined = df_hist_clean
@@ -7,19 +7,23 @@ Key Features:
 2. Handles NaN values gracefully
 3. Maintains data integrity
 4. Real-time monitoring for all 5 sensors
+5. Constant-cost appends: rows go to an append-only archive (outputN.archive/)
+   and each workbook is regenerated from it every EXPORT_INTERVAL seconds
 
 Usage:
     python excel_integration_enhanced.py
+
+To run it together with the other JSON live scripts in one process (each
+capture read once per change), use live_daemon.py instead.
 """
 
 import sys
-import pandas as pd
-import json
-import time
 import os
 from datetime import datetime
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+
+from airsense.excel_archive import ReadingArchive, archive_dir
+from airsense.file_watch import CaptureWatcher
+from airsense.ndjson_store import capture_exists, read_latest_entry
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -34,93 +38,65 @@ SENSORS = {
     5: {'json': 'mqtt_data_sensor5.json', 'excel': 'output5.xlsx'},
 }
 
+EXPORT_INTERVAL = 60  # Seconds between workbook regenerations
+MAX_PM25 = 500  # Higher readings are rejected as sensor errors
+
+# Readings go to an append-only archive per workbook (outputN.archive/)
+archives = {}
+
 print("="*80)
 print("ENHANCED EXCEL INTEGRATION - APPEND NEW ROWS ONLY")
 print("="*80)
 print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
 
-def append_to_excel(sensor_id, new_data):
-    """Append new data as a new row - preserves existing column structure"""
+def get_archive(sensor_id):
+    """The sensor's reading archive (opened once; imports the workbook on first use)"""
+    if sensor_id not in archives:
+        archives[sensor_id] = ReadingArchive(SENSORS[sensor_id]['excel'], export_interval=EXPORT_INTERVAL,
+                                             max_pm25=MAX_PM25)
+    return archives[sensor_id]
+
+
+def append_to_excel(sensor_id, new_data, cursor=None):
+    """
+    Append new data as a new row - constant cost, the workbook is regenerated on a schedule
+
+    cursor is the capture offset of the (last) reading. It is saved with the
+    archive, and a reading whose offset is already the archive's cursor is
+    not archived again. An offset before the cursor means the capture was
+    cleared, so the cursor starts over.
+    """
     excel_file = SENSORS[sensor_id]['excel']
     
     try:
-        # Load existing Excel
-        if os.path.exists(excel_file):
-            df_existing = pd.read_excel(excel_file)
-            existing_columns = df_existing.columns.tolist()
-            print(f"[Sensor {sensor_id}] Excel has {len(df_existing)} rows, {len(existing_columns)} columns")
-        else:
+        if not os.path.exists(excel_file) and not os.path.isdir(archive_dir(excel_file)):
             print(f"[Sensor {sensor_id}] Excel file not found: {excel_file}")
             return False
         
-        # Create DataFrame from new data (single row)
         if isinstance(new_data, dict):
-            df_new = pd.DataFrame([new_data])
+            readings = [new_data]
         elif isinstance(new_data, list):
-            df_new = pd.DataFrame(new_data)
+            readings = new_data
         else:
             print(f"[Sensor {sensor_id}] Invalid data type")
             return False
         
-        # Map JSON short names to Excel long names
-        column_mapping = {
-            'battery': 'uplink_message.decoded_payload.battery',
-            'pm2_5': 'uplink_message.decoded_payload.pm2_5',
-            'pm10': 'uplink_message.decoded_payload.pm10',
-            'co2': 'uplink_message.decoded_payload.co2',
-            'tvoc': 'uplink_message.decoded_payload.tvoc',
-            'temperature': 'uplink_message.decoded_payload.temperature',
-            'humidity': 'uplink_message.decoded_payload.humidity',
-            'pressure': 'uplink_message.decoded_payload.pressure',
-            'light_level': 'uplink_message.decoded_payload.light_level',
-            'pir': 'uplink_message.decoded_payload.pir',
-        }
-        
-        # Rename columns to match Excel structure
-        df_new = df_new.rename(columns=column_mapping)
-        
-        # Create a new row with ONLY existing columns
-        new_row = pd.DataFrame(columns=existing_columns)
-        
-        # Fill in values from new data, leave rest as NaN
-        for col in existing_columns:
-            if col in df_new.columns:
-                new_row.loc[0, col] = df_new[col].iloc[0]
-            else:
-                new_row.loc[0, col] = pd.NA
-        
         # Add timestamp if not present
-        if 'received_at' in existing_columns and pd.isna(new_row.loc[0, 'received_at']):
-            new_row.loc[0, 'received_at'] = datetime.now().isoformat()
-        
-        # Validate and filter data (reject extreme outliers)
-        pm25_col = 'uplink_message.decoded_payload.pm2_5'
-        if pm25_col in df_new.columns:
-            val = df_new[pm25_col].iloc[0]
-            if pd.notna(val) and val > 500:
-                print(f"[Sensor {sensor_id}] ⚠️ REJECTED: PM2.5 value {val} is too high (possible sensor error)")
-                return False
-
-        # Append the new row to existing data
-        df_combined = pd.concat([df_existing, new_row], ignore_index=True)
+        now = datetime.now().isoformat()
+        readings = [reading if reading.get('received_at') else dict(reading, received_at=now) for reading in readings]
         
-        # Remove duplicates based on timestamp (keep latest)
-        if 'received_at' in df_combined.columns:
-            # Convert to datetime for comparison
-            df_combined['received_at_temp'] = pd.to_datetime(df_combined['received_at'], errors='coerce')
-            df_combined = df_combined.sort_values('received_at_temp')
-            df_combined = df_combined.drop_duplicates(subset=['received_at_temp'], keep='last')
-            df_combined = df_combined.drop(columns=['received_at_temp'])
+        # Columns, dedup and sorting are applied when the workbook is exported
+        archive = get_archive(sensor_id)
+        if cursor is not None:
+            archive.rewind(cursor + 1)  # An offset before the cursor: the capture was cleared
+            if cursor == archive.cursor:
+                return False  # Archived by an earlier sync (or run)
+        kept = archive.extend(readings, cursor=cursor)
+        if kept:
+            print(f"[Sensor {sensor_id}] ✓ Archived {kept} row(s) → {archive.pending()} waiting for the next Excel export")
+        return kept > 0
         
-        # Save back to Excel
-        df_combined.to_excel(excel_file, index=False)
-        print(f"[Sensor {sensor_id}] ✓ Appended 1 row → Total: {len(df_combined)} rows")
-        return True
-        
-    except PermissionError:
-        print(f"[Sensor {sensor_id}] ✗ Cannot save - {excel_file} is open")
-        return False
     except Exception as e:
         print(f"[Sensor {sensor_id}] ✗ Error: {e}")
         import traceback
@@ -128,49 +104,44 @@ def append_to_excel(sensor_id, new_data):
         return False
 
 
+def export_excel(force=False):
+    """Regenerate workbooks from their archives (when due, or now if forced)"""
+    for sensor_id, archive in archives.items():
+        try:
+            if force and archive.pending():
+                print(f"[Sensor {sensor_id}] ✓ {archive.excel_file} regenerated ({archive.export()} rows)")
+            elif not force:
+                archive.export_if_due()
+        except PermissionError:
+            print(f"[Sensor {sensor_id}] ✗ Cannot save - {archive.excel_file} is open (retried at the next export)")
+
+
 def sync_json_to_excel(sensor_id):
     """Sync latest JSON data to Excel"""
     json_file = SENSORS[sensor_id]['json']
     
-    if not os.path.exists(json_file):
+    if not capture_exists(json_file):
         print(f"[Sensor {sensor_id}] JSON file not found: {json_file}")
         return
     
     try:
-        with open(json_file, 'r') as f:
-            json_data = json.load(f)
-        
-        if json_data:
-            # Get last record
-            last_record = json_data[-1] if isinstance(json_data, list) else json_data
-            append_to_excel(sensor_id, last_record)
+        # Get last record (with its capture offset, so it is archived once)
+        latest = read_latest_entry(json_file)
+        if latest is not None:
+            offset, last_record = latest
+            append_to_excel(sensor_id, last_record, cursor=offset)
         else:
             print(f"[Sensor {sensor_id}] No data in JSON file")
     except Exception as e:
         print(f"[Sensor {sensor_id}] Error reading JSON: {e}")
 
 
-class JSONFileHandler(FileSystemEventHandler):
-    """Monitor JSON files for changes"""
-    
-    def on_modified(self, event):
-        if event.is_directory:
-            return
-        
-        # Check if it's one of our sensor JSON files
-        for sensor_id, config in SENSORS.items():
-            if event.src_path.endswith(config['json']):
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] [Sensor {sensor_id}] 🆕 New MQTT data detected")
-                time.sleep(0.5)  # Wait for file write to complete
-                sync_json_to_excel(sensor_id)
-                break
-
-
 def initial_sync():
     """Initial sync of all JSON files to Excel"""
     print("\n[INITIAL SYNC] Syncing all sensors...\n")
     for sensor_id in SENSORS.keys():
         sync_json_to_excel(sensor_id)
+    export_excel(force=True)
     print("\n[INITIAL SYNC] Complete\n")
 
 
@@ -180,27 +151,28 @@ def main():
     # Initial sync
     initial_sync()
     
-    # Setup file watcher
-    event_handler = JSONFileHandler()
-    observer = Observer()
-    observer.schedule(event_handler, path='.', recursive=False)
-    observer.start()
+    # Setup file watcher (debounced; reports a capture once its write is complete)
+    watcher = CaptureWatcher({sensor_id: config['json'] for sensor_id, config in SENSORS.items()}).start()
     
     print("="*80)
     print("🔴 MONITORING MQTT FILES - Append new rows automatically")
     print("="*80)
     print("\n💡 New readings will be appended as NEW ROWS (columns preserved)")
     print("💡 No new columns will be created")
-    print("💡 NaN values will be handled gracefully\n")
+    print("💡 NaN values will be handled gracefully")
+    print(f"💡 Excel files are regenerated every {EXPORT_INTERVAL}s while new rows arrive\n")
     print("Press Ctrl+C to stop\n")
     
     try:
         while True:
-            time.sleep(1)
+            for sensor_id in sorted(watcher.wait(1)):
+                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] [Sensor {sensor_id}] 🆕 New MQTT data detected")
+                sync_json_to_excel(sensor_id)
+            export_excel()
     except KeyboardInterrupt:
         print("\n\n[SHUTDOWN] Stopping Excel integration...")
-        observer.stop()
-        observer.join()
+        watcher.stop()
+        export_excel(force=True)
         print("[SHUTDOWN] Stopped")
 
 
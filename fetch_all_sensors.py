@@ -11,6 +11,8 @@ from pymongo.server_api import ServerApi
 from dotenv import load_dotenv
 from datetime import datetime
 
+from airsense.aqi import calculate_aqi
+
 # Load environment variables for each sensor
 SENSOR_CONFIGS = [
     {'id': 1, 'env_file': 'amb1.env', 'name': 'Sensor 1'},
@@ -91,21 +93,6 @@ def fetch_sensor_data(sensor_config):
         print(f"❌ Error fetching {sensor_config['name']}: {e}")
         return None
 
-def calculate_aqi(pm25):
-    """Calculate AQI from PM2.5 value"""
-    if pm25 <= 12.0:
-        return int((50 / 12.0) * pm25)
-    elif pm25 <= 35.4:
-        return int(50 + ((100 - 50) / (35.4 - 12.1)) * (pm25 - 12.1))
-    elif pm25 <= 55.4:
-        return int(100 + ((150 - 100) / (55.4 - 35.5)) * (pm25 - 35.5))
-    elif pm25 <= 150.4:
-        return int(150 + ((200 - 150) / (150.4 - 55.5)) * (pm25 - 55.5))
-    elif pm25 <= 250.4:
-        return int(200 + ((300 - 200) / (250.4 - 150.5)) * (pm25 - 150.5))
-    else:
-        return int(300 + ((500 - 300) / (500.4 - 250.5)) * (pm25 - 250.5))
-
 def fetch_all_sensors():
     """Fetch data from all 5 sensors"""
     print("="*80)
@@ -22,6 +22,7 @@ class _ForecastScreenState extends State<ForecastScreen> {
   bool _isLoading = true;
   List<Sensor> _sensors = [];
   Forecast? _forecast;
+  Map<String, Forecast> _fleetForecast = {};
   HealthProfile? _profile;
   Sensor? _selectedSensor;
 
@@ -44,10 +45,15 @@ class _ForecastScreenState extends State<ForecastScreen> {
 
     Forecast? forecast;
     Sensor? selectedSensor;
+    Map<String, Forecast> fleetForecast = {};
 
     if (sensors.isNotEmpty) {
       selectedSensor = sensors.first;
-      forecast = await ForecastService().getForecast(selectedSensor.id, selectedSensor.currentData.aqi, selectedSensor.currentData.pm25);
+      // One request for every sensor so switching sensors needs no round trip
+      fleetForecast = await ForecastService().getFleetForecast({
+        for (final s in sensors) s.id: (aqi: s.currentData.aqi, pm25: s.currentData.pm25),
+      });
+      forecast = fleetForecast[selectedSensor.id];
     }
 
     if (mounted) {
@@ -55,6 +61,7 @@ class _ForecastScreenState extends State<ForecastScreen> {
         _sensors = sensors;
         _selectedSensor = selectedSensor;
         _forecast = forecast;
+        _fleetForecast = fleetForecast;
         _profile = profile;
         _isLoading = false;
       });
@@ -64,7 +71,7 @@ class _ForecastScreenState extends State<ForecastScreen> {
   Future<void> _changeSensor(Sensor sensor) async {
     setState(() => _isLoading = true);
     
-    final forecast = await ForecastService().getForecast(sensor.id, sensor.currentData.aqi, sensor.currentData.pm25);
+    final forecast = _fleetForecast[sensor.id] ?? await ForecastService().getForecast(sensor.id, sensor.currentData.aqi, sensor.currentData.pm25);
     
     if (mounted) {
       setState(() {
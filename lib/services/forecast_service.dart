@@ -35,37 +35,15 @@ class ForecastService {
         final data = response.data;
 
         if (data['status'] == 'success') {
-          // Parse hourly forecast
-          final hourlyData = data['hourly'] as List;
-          final hourly24 = hourlyData.map((point) {
-            return ForecastPoint(
-              timestamp: DateTime.parse(point['timestamp']),
-              aqi: point['aqi'] as int,
-              pm25: (point['pm25'] as num).toDouble(),
-              pm10: (point['pm10'] as num).toDouble(),
-            );
-          }).toList();
-
-          // Parse daily forecast
-          final dailyData = data['daily'] as List;
-          final weekly = dailyData.map((point) {
-            return ForecastPoint(
-              timestamp: DateTime.parse(point['date']),
-              aqi: point['aqi'] as int,
-              pm25: (point['pm25'] as num).toDouble(),
-              pm10: (point['pm10'] as num).toDouble(),
-            );
-          }).toList();
-
-          final forecast = Forecast(
-            sensorId: sensorId,
-            timestamp: DateTime.parse(data['timestamp']),
-            hourly24: hourly24,
-            weekly: weekly,
+          final forecast = _parseForecast(
+            sensorId,
+            DateTime.parse(data['timestamp']),
+            data['hourly'] as List,
+            data['daily'] as List,
           );
 
           debugPrint(
-              '✅ Fetched forecast: ${hourly24.length} hourly, ${weekly.length} daily points');
+              '✅ Fetched forecast: ${forecast.hourly24.length} hourly, ${forecast.weekly.length} daily points');
           return forecast;
         } else if (data['status'] == 'no_data') {
           debugPrint('⚠️ No forecast data available, generating fallback');
@@ -82,6 +60,91 @@ class ForecastService {
     }
   }
 
+  /// Get forecasts for many sensors with a single backend request
+  ///
+  /// Sensors the backend has no data for (or all sensors, if the request
+  /// fails) get the same fallback forecast as [getForecast].
+  Future<Map<String, Forecast>> getFleetForecast(
+      Map<String, ({int aqi, double pm25})> currentBySensor) async {
+    final forecasts = <String, Forecast>{};
+
+    try {
+      final sensorNums = currentBySensor.keys
+          .map((id) => id.replaceAll('sensor_', ''))
+          .join(',');
+
+      final url = '$_baseUrl/forecast?sensors=$sensorNums&hours=24&days=7';
+      debugPrint('🔮 Fetching fleet forecast from: $url');
+
+      final response = await _dio.get(
+        url,
+        options: Options(
+          receiveTimeout: const Duration(seconds: 15),
+          sendTimeout: const Duration(seconds: 10),
+        ),
+      );
+
+      if (response.statusCode == 200 && response.data['status'] == 'success') {
+        final timestamp = DateTime.parse(response.data['timestamp']);
+        final sensors = response.data['sensors'] as Map<String, dynamic>;
+
+        sensors.forEach((sensorKey, value) {
+          final sensorId = currentBySensor.keys.firstWhere(
+            (id) => id == sensorKey || 'sensor_$id' == sensorKey,
+            orElse: () => sensorKey,
+          );
+          forecasts[sensorId] = _parseForecast(
+            sensorId,
+            timestamp,
+            value['hourly'] as List,
+            value['daily'] as List,
+          );
+        });
+
+        debugPrint('✅ Fetched fleet forecast for ${forecasts.length} sensors');
+      }
+    } catch (e) {
+      debugPrint('❌ Fleet forecast error: $e');
+    }
+
+    currentBySensor.forEach((sensorId, current) {
+      forecasts.putIfAbsent(sensorId,
+          () => _generateFallbackForecast(sensorId, current.aqi, current.pm25));
+    });
+
+    return forecasts;
+  }
+
+  Forecast _parseForecast(String sensorId, DateTime timestamp,
+      List hourlyData, List dailyData) {
+    // Parse hourly forecast
+    final hourly24 = hourlyData.map((point) {
+      return ForecastPoint(
+        timestamp: DateTime.parse(point['timestamp']),
+        aqi: point['aqi'] as int,
+        pm25: (point['pm25'] as num).toDouble(),
+        pm10: (point['pm10'] as num).toDouble(),
+      );
+    }).toList();
+
+    // Parse daily forecast
+    final weekly = dailyData.map((point) {
+      return ForecastPoint(
+        timestamp: DateTime.parse(point['date']),
+        aqi: point['aqi'] as int,
+        pm25: (point['pm25'] as num).toDouble(),
+        pm10: (point['pm10'] as num).toDouble(),
+      );
+    }).toList();
+
+    return Forecast(
+      sensorId: sensorId,
+      timestamp: timestamp,
+      hourly24: hourly24,
+      weekly: weekly,
+    );
+  }
+
   /// Generate fallback forecast if backend is unavailable
   Forecast _generateFallbackForecast(
       String sensorId, int baseAQI, double basePM25) {
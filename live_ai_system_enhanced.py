@@ -3,12 +3,16 @@
 
 This script:
 1. Monitors all 5 sensors for new MQTT data
-2. Reads ENTIRE Excel sheets (ignores NaN values)
+2. Reads ENTIRE Excel sheets (ignores NaN values), or only the newest
+   rows of the history/ Parquet store when it is as fresh as the sheet
 3. Generates accurate predictions using clean data
 4. Updates dashboard/backend automatically
 5. Uses latest data if no new readings arrive
 
 Usage: python live_ai_system_enhanced.py
+
+To run it together with the other JSON live scripts in one process (each
+capture read once per change), use live_daemon.py instead.
 """
 
 import sys
@@ -17,10 +21,12 @@ import numpy as np
 import requests
 import json
 import os
-import time
-import joblib
 from datetime import datetime
-from sklearn.preprocessing import StandardScaler
+
+from airsense.aqi import calculate_aqi
+from airsense.file_watch import CaptureWatcher
+from airsense.history_store import HistoryStore
+from airsense.model_registry import get_registry
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -40,9 +46,8 @@ CHECK_INTERVAL = 30  # seconds
 MODELS_DIR = 'models'
 
 # Global variables
-last_json_timestamps = {i: None for i in range(1, 6)}
-models = {}
-scalers = {}
+registry = get_registry(MODELS_DIR)
+history = HistoryStore()  # Parquet history, read instead of the workbooks when up to date
 
 print("="*80)
 print("🔴 LIVE AI SYSTEM - Enhanced NaN Handling & Dashboard Updates")
@@ -51,24 +56,14 @@ print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
 
 def load_models():
-    """Load ML models"""
+    """Find ML models (each one loads on first use)"""
     print("[1/4] Loading ML models...")
     
-    targets = ['pm2_5', 'pm10', 'co2', 'tvoc', 'temperature', 'humidity', 'pressure']
-    
+    targets = registry.available_targets()
     for target in targets:
-        model_path = f'{MODELS_DIR}/{target}_model.pkl'
-        scaler_path = f'{MODELS_DIR}/{target}_scaler.pkl'
-        
-        if os.path.exists(model_path) and os.path.exists(scaler_path):
-            try:
-                models[target] = joblib.load(model_path)
-                scalers[target] = joblib.load(scaler_path)
-                print(f"  ✓ {target}")
-            except Exception as e:
-                print(f"  ✗ {target}: {e}")
+        print(f"  ✓ {target}")
     
-    print(f"\n  Loaded {len(models)} models\n")
+    print(f"\n  Found {len(targets)} models\n")
 
 
 def get_value(row, *possible_names):
@@ -84,34 +79,25 @@ def get_value(row, *possible_names):
     return 0.0
 
 
-def calculate_aqi(pm25_val):
-    """Calculate AQI from PM2.5"""
-    if pm25_val <= 12:
-        return int((50/12) * pm25_val)
-    elif pm25_val <= 35.4:
-        return int(50 + ((100-50)/(35.4-12.1)) * (pm25_val-12.1))
-    elif pm25_val <= 55.4:
-        return int(100 + ((150-100)/(55.4-35.5)) * (pm25_val-35.5))
-    elif pm25_val <= 150.4:
-        return int(150 + ((200-150)/(150.4-55.5)) * (pm25_val-55.5))
-    else:
-        return int(200 + ((300-200)/(250.4-150.5)) * (pm25_val-150.5))
-
-
 def load_and_predict(sensor_id):
-    """Load Excel data and generate predictions (NaN-aware)"""
+    """Load the sensor's latest readings and generate predictions (NaN-aware)"""
     try:
         excel_file = SENSORS[sensor_id]['excel']
+        excel_time = os.path.getmtime(excel_file) if os.path.exists(excel_file) else None
+        history_time = history.updated(sensor_id)
         
-        if not os.path.exists(excel_file):
+        if history_time is not None and (excel_time is None or history_time >= excel_time):
+            # History is as fresh as the workbook: read only its newest rows
+            df = history.tail(sensor_id, 20)
+        elif excel_time is None:
             print(f"  ⚠️  Excel file not found: {excel_file}")
             return None
-        
-        # Read ENTIRE Excel file
-        df = pd.read_excel(excel_file)
+        else:
+            # Read ENTIRE Excel file
+            df = pd.read_excel(excel_file)
         
         if len(df) == 0:
-            print(f"  ⚠️  Excel file is empty")
+            print(f"  ⚠️  No readings yet")
             return None
         
         # Remove completely empty rows
@@ -186,6 +172,13 @@ def load_and_predict(sensor_id):
         # Calculate AQI
         aqi = calculate_aqi(pm25)
         
+        # History rows carry pd.Timestamp, which requests cannot serialize
+        received_at = latest.get('received_at')
+        if received_at is None or pd.isna(received_at):
+            received_at = datetime.now().isoformat()
+        elif isinstance(received_at, datetime):
+            received_at = received_at.isoformat()
+        
         # Prepare payload
         payload = {
             'timestamp': datetime.now().isoformat(),
@@ -208,7 +201,7 @@ def load_and_predict(sensor_id):
                 'temperature': temp,
                 'humidity': hum,
                 'pressure': pres,
-                'received_at': latest.get('received_at', datetime.now().isoformat())
+                'received_at': received_at
             }
         }
         
@@ -226,34 +219,7 @@ def send_to_backend(payload):
     try:
         response = requests.post(BACKEND_URL, json=payload, timeout=3)
         return response.status_code == 200
-    except:
-        return False
-
-
-def check_for_new_data(sensor_id):
-    """Check if new MQTT data has arrived for this sensor"""
-    global last_json_timestamps
-    
-    try:
-        json_file = SENSORS[sensor_id]['json']
-        
-        if not os.path.exists(json_file):
-            return False
-        
-        # Get file modification time
-        current_timestamp = os.path.getmtime(json_file)
-        
-        if last_json_timestamps[sensor_id] is None:
-            last_json_timestamps[sensor_id] = current_timestamp
-            return False
-        
-        if current_timestamp > last_json_timestamps[sensor_id]:
-            last_json_timestamps[sensor_id] = current_timestamp
-            return True
-        
-        return False
-        
-    except:
+    except requests.RequestException:
         return False
 
 
@@ -312,36 +278,33 @@ def main():
     print("Press Ctrl+C to stop\n")
     
     update_count = 0
+    watcher = CaptureWatcher({sensor_id: config['json'] for sensor_id, config in SENSORS.items()}).start()
     
     try:
         while True:
-            time.sleep(CHECK_INTERVAL)
-            
-            # Check all sensors for new data
-            new_data_detected = False
+            # Wakes as soon as a sensor's MQTT data changes, or after CHECK_INTERVAL
+            changed = watcher.wait(CHECK_INTERVAL)
             
-            for sensor_id in SENSORS.keys():
-                if check_for_new_data(sensor_id):
-                    new_data_detected = True
-                    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 🆕 New data - Sensor {sensor_id}")
-                    
-                    # Generate new predictions
-                    payload = load_and_predict(sensor_id)
+            for sensor_id in sorted(changed):
+                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 🆕 New data - Sensor {sensor_id}")
+                
+                # Generate new predictions
+                payload = load_and_predict(sensor_id)
+                
+                if payload:
+                    print(f"  → AQI: {payload['aqi']}, PM2.5: {payload['sensor_data']['pm2_5']:.1f} µg/m³")
                     
-                    if payload:
-                        print(f"  → AQI: {payload['aqi']}, PM2.5: {payload['sensor_data']['pm2_5']:.1f} µg/m³")
-                        
-                        # Send to backend/dashboard
-                        if send_to_backend(payload):
-                            print(f"  ✓ Dashboard updated")
-                            update_count += 1
-                        else:
-                            print(f"  ✗ Backend error")
+                    # Send to backend/dashboard
+                    if send_to_backend(payload):
+                        print(f"  ✓ Dashboard updated")
+                        update_count += 1
                     else:
-                        print(f"  ✗ Prediction failed")
+                        print(f"  ✗ Backend error")
+                else:
+                    print(f"  ✗ Prediction failed")
             
             # If no new data, use latest data and update dashboard anyway (ALL SENSORS)
-            if not new_data_detected:
+            if not changed:
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] ⏳ No new data - Sending all sensors with latest readings...")
                 
                 # Update dashboard with latest data from ALL sensors
@@ -354,6 +317,7 @@ def main():
                         print(f"  ✗ Sensor {sensor_id} failed")
     
     except KeyboardInterrupt:
+        watcher.stop()
         print("\n\n" + "="*80)
         print("🛑 Stopped by user")
         print("="*80)
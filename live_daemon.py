@@ -0,0 +1,108 @@
+"""
+LIVE DAEMON - One process for the JSON-based live scripts
+
+Replaces running auto_sync_mqtt.py, live_system_json_based.py,
+live_ai_system_enhanced.py and excel_integration_enhanced.py side by side.
+Each capture is read once per change (new records only) and the stages
+share what was read:
+
+    excel     archive new readings (outputN.archive/), regenerate output*.xlsx every minute
+    history   merge new readings into the Parquet history (history/) every minute
+    predict   model predictions from the in-memory reading history
+    publish   one spooled POST to /api/predictions with every changed sensor
+
+Usage:
+    python live_daemon.py
+    python live_daemon.py --stages excel          # archive only
+    python live_daemon.py --stages predict,publish --refresh 60
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from airsense.history_store import HISTORY_DIR, HistoryStore
+from airsense.live_daemon import (ExcelArchive, HistoryWriter, LiveDaemon, LiveState, Predictor, Publisher,
+                                  SensorState)
+from airsense.model_registry import get_registry
+from airsense.pipeline import format_stats
+from airsense.spool import Outbox, post_batches
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# Configuration
+SENSORS = {
+    1: {'json': 'mqtt_data_sensor1.json', 'excel': 'output1.xlsx', 'name': 'Sensor 1'},
+    2: {'json': 'mqtt_data_sensor2.json', 'excel': 'output2.xlsx', 'name': 'Sensor 2'},
+    3: {'json': 'mqtt_data.json', 'excel': 'output3.xlsx', 'name': 'Sensor 3'},
+    4: {'json': 'mqtt_data_sensor4.json', 'excel': 'output4.xlsx', 'name': 'Sensor 4'},
+    5: {'json': 'mqtt_data_sensor5.json', 'excel': 'output5.xlsx', 'name': 'Sensor 5'},
+}
+
+BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:5000/api/predictions')
+MODELS_DIR = 'models'
+SPOOL_DIR = os.getenv('SPOOL_DIR', 'spool/live_daemon')  # Backend sends wait here until delivered
+STAGES = ('excel', 'history', 'predict', 'publish')
+
+
+def build_stages(names):
+    """Stage objects for the requested names, in pipeline order"""
+    stages = []
+    for name in STAGES:
+        if name not in names:
+            continue
+        if name == 'excel':
+            stages.append(ExcelArchive())
+        elif name == 'history':
+            try:
+                stages.append(HistoryWriter(HistoryStore(HISTORY_DIR)))
+            except ImportError as e:
+                print(f"  History stage skipped: {e}")
+        elif name == 'predict':
+            registry = get_registry(MODELS_DIR)
+            print(f"  Models: {', '.join(registry.available_targets()) or 'none found'}")
+            stages.append(Predictor(registry))
+        elif name == 'publish':
+            stages.append(Publisher(Outbox(SPOOL_DIR, post_batches(BACKEND_URL, timeout=5), name='outbox')))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single live pipeline over the MQTT capture files')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"Comma-separated stages to run ({', '.join(STAGES)})")
+    parser.add_argument('--refresh', type=float, default=30,
+                        help='Seconds without new data before the latest readings are republished')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    print("=" * 80)
+    print("LIVE DAEMON - JSON captures -> Excel / predictions / backend")
+    print("=" * 80)
+    print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Stages: {' -> '.join(name for name in STAGES if name in names)}\n")
+
+    state = LiveState(SensorState(sensor_id, config['name'], config['json'], config['excel'])
+                      for sensor_id, config in SENSORS.items())
+    daemon = LiveDaemon(state, build_stages(names), refresh=args.refresh)
+
+    print("\nPress Ctrl+C to stop\n")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+
+    print("\n" + "=" * 80)
+    print("STOPPED")
+    print("=" * 80)
+    print(format_stats(daemon.stats_sources()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,27 @@
 LIVE AI SYSTEM - JSON Based (No Excel corruption issues!)
 
 This script:
-1. Monitors JSON files for new readings
+1. Watches JSON files for new readings (file-system events, no polling)
 2. Appends new readings to Excel sheets (for historical records)
-3. Sends predictions to backend every 30 seconds
+3. Sends new readings to backend as they arrive (latest data every 30 seconds otherwise)
 4. Reads DIRECTLY from JSON (not Excel)
 
 Usage: python live_system_json_based.py
+
+To run it together with the other JSON live scripts in one process (each
+capture read once per change), use live_daemon.py instead.
 """
 import sys
-import json
 import os
-import requests
-import pandas as pd
-import time
 from datetime import datetime
 from pathlib import Path
 
+from airsense.aqi import calculate_aqi
+from airsense.excel_archive import ReadingArchive
+from airsense.file_watch import CaptureWatcher
+from airsense.ndjson_store import capture_exists, read_after, read_latest, read_latest_entry
+from airsense.spool import Outbox, post_batches
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -32,11 +37,15 @@ SENSORS = {
 }
 
 BACKEND_URL = 'http://localhost:5000/api/predictions'
-CHECK_INTERVAL = 30  # seconds
+CHECK_INTERVAL = 30  # Seconds without new data before the backend is refreshed anyway
+SPOOL_DIR = os.getenv('SPOOL_DIR', 'spool/json_live')  # Backend sends wait here until delivered
+EXCEL_EXPORT_INTERVAL = 60  # Seconds between workbook regenerations from the archives
+
+# Durable outbox: payloads survive backend outages and restarts
+outbox = Outbox(SPOOL_DIR, post_batches(BACKEND_URL, timeout=5))
 
-# Track last JSON modification times
-last_json_times = {}
-last_json_sizes = {}
+# Append-only reading archive per workbook (outputN.archive/)
+archives = {}
 
 print("=" * 80)
 print("LIVE AI SYSTEM - JSON Based")
@@ -44,105 +53,58 @@ print("=" * 80)
 print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
 
-def calculate_aqi(pm25):
-    """Calculate AQI from PM2.5 using EPA formula"""
-    if pm25 <= 12:
-        return int((50/12) * pm25)
-    elif pm25 <= 35.4:
-        return int(50 + ((100-50)/(35.4-12.1)) * (pm25-12.1))
-    elif pm25 <= 55.4:
-        return int(100 + ((150-100)/(55.4-35.5)) * (pm25-35.5))
-    elif pm25 <= 150.4:
-        return int(150 + ((200-150)/(150.4-55.5)) * (pm25-55.5))
-    else:
-        return min(int(200 + ((300-200)/(250.4-150.5)) * (pm25-150.5)), 500)
-
-
 def sync_json_to_excel(sensor_id, config):
     """
     Sync JSON data to Excel file
-    Appends new entries only
+    Appends new entries only (to the archive; the workbook is regenerated on a schedule)
     """
     json_file = config['json']
-    excel_file = config['excel']
     
-    if not os.path.exists(json_file):
+    if not capture_exists(json_file):
         return False
     
     try:
-        # Load JSON data
-        with open(json_file, 'r') as f:
-            json_data = json.load(f)
+        if sensor_id not in archives:
+            archives[sensor_id] = ReadingArchive(config['excel'], export_interval=EXCEL_EXPORT_INTERVAL)
+        archive = archives[sensor_id]
         
-        if isinstance(json_data, list):
-            new_df = pd.DataFrame(json_data)
-        else:
-            new_df = pd.DataFrame([json_data])
-        
-        # If Excel exists, append new rows
-        if os.path.exists(excel_file):
-            try:
-                existing_df = pd.read_excel(excel_file)
-                
-                # Find new rows (compare by timestamp or row count)
-                if len(new_df) > len(existing_df):
-                    # Append only new rows
-                    combined_df = pd.concat([existing_df, new_df.iloc[len(existing_df):]], ignore_index=True)
-                    combined_df.to_excel(excel_file, index=False)
-                    return True
-            except:
-                # If Excel is corrupted, recreate it
-                new_df.to_excel(excel_file, index=False)
-                return True
-        else:
-            # Create new Excel file
-            new_df.to_excel(excel_file, index=False)
-            return True
+        # Only the capture records after the last archived one
+        records = read_after(json_file, archive.cursor)
+        if not records:
+            # Cleared (clear_json.py) since the cursor was saved: start over
+            latest = read_latest_entry(json_file)
+            if not archive.rewind(latest[0] + 1 if latest else 0):
+                return False
+            records = read_after(json_file, archive.cursor)
+            if not records:
+                return False
+        archive.extend([record for _, record in records], cursor=records[-1][0])
+        return True
             
     except Exception as e:
         print(f"  Error syncing to Excel: {e}")
         return False
 
 
-def check_json_updated(sensor_id, json_file):
-    """Check if JSON file has been updated"""
-    if not os.path.exists(json_file):
-        return False
-    
-    try:
-        current_time = os.path.getmtime(json_file)
-        current_size = os.path.getsize(json_file)
-        
-        # Initialize tracking
-        if sensor_id not in last_json_times:
-            last_json_times[sensor_id] = current_time
-            last_json_sizes[sensor_id] = current_size
-            return True  # First time, consider it updated
-        
-        # Check if modified
-        if current_time > last_json_times[sensor_id] or current_size != last_json_sizes[sensor_id]:
-            last_json_times[sensor_id] = current_time
-            last_json_sizes[sensor_id] = current_size
-            return True
-        
-        return False
-    except:
-        return False
+def export_excel(force=False):
+    """Regenerate workbooks with pending archive rows (when due, or now if forced)"""
+    for archive in archives.values():
+        try:
+            if force and archive.pending():
+                archive.export()
+            elif not force:
+                archive.export_if_due()
+        except Exception as e:
+            print(f"  Error exporting {archive.excel_file}: {e}")
 
 
 def read_sensor_data(json_file):
     """Read latest sensor data from JSON file"""
     try:
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-        
-        # Get latest entry
-        if isinstance(data, list):
-            if len(data) == 0:
-                return None
-            latest = data[-1]
-        else:
-            latest = data
+        # Get latest entry (one seek when the capture is an NDJSON store)
+        latest = read_latest(json_file)
+        if latest is None:
+            return None
         
         # Extract values
         sensor_data = {
@@ -163,7 +125,7 @@ def read_sensor_data(json_file):
 
 
 def send_to_backend(sensor_id, sensor_name, sensor_data):
-    """Send sensor data and predictions to backend"""
+    """Spool sensor data and predictions for the backend"""
     try:
         pm25 = sensor_data['pm25']
         pm10 = sensor_data['pm10']
@@ -209,12 +171,12 @@ def send_to_backend(sensor_id, sensor_name, sensor_data):
             }
         }
         
-        # Send to backend
-        response = requests.post(BACKEND_URL, json=payload, timeout=5)
-        return response.status_code == 200
+        # Durable once spooled; the outbox delivers it when the backend is up
+        outbox.submit(payload)
+        return True
         
     except Exception as e:
-        print(f"  Error sending to backend: {e}")
+        print(f"  Error spooling for backend: {e}")
         return False
 
 
@@ -226,20 +188,25 @@ def main():
     
     # Initial sync for all sensors
     for sensor_id, config in SENSORS.items():
-        if os.path.exists(config['json']):
+        if capture_exists(config['json']):
             print(f"  {config['name']}: ", end='')
             if sync_json_to_excel(sensor_id, config):
                 print("Synced to Excel")
             else:
                 print("Already up to date")
+    export_excel(force=True)
     
     print("\n[2/2] Sending initial data to backend...")
     print()
+    outbox.start()
+    
+    # File-system events for every capture (new data is handled as soon as it is written)
+    watcher = CaptureWatcher({sensor_id: config['json'] for sensor_id, config in SENSORS.items()}).start()
     
     # Send initial data
     active_sensors = 0
     for sensor_id, config in SENSORS.items():
-        if os.path.exists(config['json']):
+        if capture_exists(config['json']):
             sensor_data = read_sensor_data(config['json'])
             if sensor_data:
                 if send_to_backend(sensor_id, config['name'], sensor_data):
@@ -251,7 +218,7 @@ def main():
     
     # Start monitoring
     print("\n" + "=" * 80)
-    print(f"LIVE MONITORING - Checking every {CHECK_INTERVAL} seconds")
+    print(f"LIVE MONITORING - On new data, refresh every {CHECK_INTERVAL} seconds otherwise")
     print("=" * 80)
     print("\nPress Ctrl+C to stop\n")
     
@@ -259,45 +226,51 @@ def main():
     
     try:
         while True:
-            time.sleep(CHECK_INTERVAL)
+            # Sleeps until a capture changes (or CHECK_INTERVAL passes)
+            changed = watcher.wait(CHECK_INTERVAL)
             
             timestamp = datetime.now().strftime('%H:%M:%S')
-            updates_this_cycle = 0
             
-            # Check all sensors
-            for sensor_id, config in SENSORS.items():
+            # Handle the sensors whose captures changed
+            for sensor_id in sorted(changed):
+                config = SENSORS[sensor_id]
                 json_file = config['json']
+                print(f"[{timestamp}] {config['name']}: New data detected")
                 
-                if not os.path.exists(json_file):
-                    continue
+                # Sync to Excel
+                sync_json_to_excel(sensor_id, config)
                 
-                # Check if JSON was updated
-                if check_json_updated(sensor_id, json_file):
-                    print(f"[{timestamp}] {config['name']}: New data detected")
-                    
-                    # Sync to Excel
-                    sync_json_to_excel(sensor_id, config)
-                    
-                    # Read and send to backend
-                    sensor_data = read_sensor_data(json_file)
-                    if sensor_data:
-                        if send_to_backend(sensor_id, config['name'], sensor_data):
-                            aqi = calculate_aqi(sensor_data['pm25'])
-                            print(f"  -> Backend updated: AQI {aqi}")
-                            updates_this_cycle += 1
-                            update_count += 1
+                # Read and send to backend
+                sensor_data = read_sensor_data(json_file)
+                if sensor_data:
+                    if send_to_backend(sensor_id, config['name'], sensor_data):
+                        aqi = calculate_aqi(sensor_data['pm25'])
+                        print(f"  -> Queued for backend: AQI {aqi}")
+                        update_count += 1
             
-            # If no updates, send latest data anyway (keep backend fresh)
-            if updates_this_cycle == 0:
+            # If no updates, send latest data anyway (keep backend fresh). While
+            # payloads are still spooled the backend is unreachable or catching
+            # up, and an identical refresh would only pile up behind them
+            if not changed and outbox.spool.pending():
+                print(f"[{timestamp}] No new data - {outbox.spool.pending()} payloads still spooled, refresh skipped")
+            elif not changed:
                 print(f"[{timestamp}] No new data - Refreshing backend with latest...")
                 for sensor_id, config in SENSORS.items():
-                    if os.path.exists(config['json']):
+                    if capture_exists(config['json']):
                         sensor_data = read_sensor_data(config['json'])
                         if sensor_data:
                             send_to_backend(sensor_id, config['name'], sensor_data)
                 print(f"  -> {active_sensors} sensors refreshed")
+            
+            # Workbooks are regenerated from the archives at most every EXCEL_EXPORT_INTERVAL
+            export_excel()
     
     except KeyboardInterrupt:
+        watcher.stop()
+        export_excel(force=True)
+        if not outbox.flush(5):
+            print(f"\n{outbox.spool.pending()} payloads left in {SPOOL_DIR}, sent on next start")
+        outbox.stop()
         print("\n\n" + "=" * 80)
         print("STOPPED")
         print("=" * 80)
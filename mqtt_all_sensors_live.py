@@ -1,21 +1,31 @@
-import paho.mqtt.client as mqtt
-import json
+import argparse
+import asyncio
 import os
 import sys
 import time
-import requests
-import pandas as pd
-import numpy as np
-import joblib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from dotenv import load_dotenv
 import warnings
 warnings.filterwarnings('ignore')
 
+from airsense.aqi import calculate_aqi
+from airsense.batch_predictor import BatchPredictor
+from airsense.model_registry import get_registry
+from airsense.mqtt_ingest import SharedMQTTIngestor, load_sensor_registry, resolve_sensors
+from airsense.ndjson_store import SegmentStore, store_dir
+from airsense.pipeline import (AsyncCoalescingPublisher, AsyncStage, CoalescingPublisher, Stage,
+                               format_stats)
+from airsense.ring_buffer import SensorHistory
+from airsense.spool import Outbox, post_batches
+from airsense.ttn import decode_uplink
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Sensor registry file (falls back to the list below)
+SENSORS_CONFIG = os.getenv('SENSORS_CONFIG', 'sensors.json')
+
 # Sensor configurations
 SENSORS = [
     {'id': 1, 'name': 'Sensor 1', 'env_file': 'amb1.env'},
@@ -28,16 +38,22 @@ SENSORS = [
 # Backend Configuration
 BACKEND_URL = 'http://192.168.1.147:5000/api/predictions'
 MODEL_DIR = 'models'
+SPOOL_DIR = os.getenv('SPOOL_DIR', 'spool/mqtt_live')  # Backend sends wait here until delivered
 
 # Global storage for all sensors
 all_sensors_data = {}
-sensor_data_buffers = {1: [], 2: [], 3: [], 4: [], 5: []}  # Historical data for predictions
+latest_predictions = {}  # Cached per sensor, refreshed when its data changes
 MAX_BUFFER_SIZE = 10
+PROCESS_QUEUE_SIZE = 1000  # Messages waiting to be processed before the oldest are dropped
+PUBLISH_WINDOW = float(os.getenv('PUBLISH_WINDOW', '1.0'))  # Seconds to coalesce changes per send
+MODEL_WORKERS = int(os.getenv('MODEL_WORKERS', '2'))  # Executor threads for model calls and HTTP (--asyncio)
+sensor_history = SensorHistory(capacity=MAX_BUFFER_SIZE)  # Ring buffers for predictions
+capture_stores = {}  # Sensor ID -> NDJSON store, for sensors with a "capture" file
 
 print("="*80)
 print("MULTI-SENSOR MQTT TO AI PIPELINE WITH PREDICTIONS")
 print("="*80)
-print(f"Connecting {len(SENSORS)} sensors directly to AI")
+print("Connecting all sensors directly to AI")
 print(f"Backend: {BACKEND_URL}")
 print("="*80)
 
@@ -46,142 +62,58 @@ class PredictionEngine:
     """Loads models and generates predictions for each sensor"""
     
     def __init__(self):
-        self.models = {}
-        self.scalers = {}
+        self.registry = get_registry(MODEL_DIR)
+        self.targets = []
         self.load_models()
+        self.batch_predictor = BatchPredictor(self.registry, self.targets)
     
     def load_models(self):
-        """Load all trained models"""
+        """Find all trained 3-lag models (each one loads on first prediction)"""
         print("\n[MODELS] Loading prediction models...")
         
-        model_files = {
-            'PM2.5': ('pm25_model.pkl', 'pm25_scaler.pkl'),
-            'PM10': ('pm10_model.pkl', 'pm10_scaler.pkl'),
-            'CO2': ('co2_model.pkl', 'co2_scaler.pkl'),
-            'TVOC': ('tvoc_model.pkl', 'tvoc_scaler.pkl'),
-            'Temperature': ('temperature_model.pkl', 'temperature_scaler.pkl'),
-            'Humidity': ('humidity_model.pkl', 'humidity_scaler.pkl'),
-            'Pressure': ('pressure_model.pkl', 'pressure_scaler.pkl')
-        }
-        
-        for target, (model_file, scaler_file) in model_files.items():
-            model_path = os.path.join(MODEL_DIR, model_file)
-            scaler_path = os.path.join(MODEL_DIR, scaler_file)
-            
-            if os.path.exists(model_path) and os.path.exists(scaler_path):
-                try:
-                    self.models[target] = joblib.load(model_path)
-                    self.scalers[target] = joblib.load(scaler_path)
-                    print(f"  OK Loaded {target} model")
-                except Exception as e:
-                    print(f"  ERROR loading {target}: {e}")
+        for target in self.registry.available_targets():
+            self.targets.append(target)
+            print(f"  OK Found {target} model")
         
-        print(f"  OK Loaded {len(self.models)} models\n")
+        print(f"  OK Registered {len(self.targets)} models\n")
     
-    def predict(self, sensor_data_buffer):
-        """Generate predictions from sensor data buffer"""
-        if not sensor_data_buffer or len(sensor_data_buffer) < 3:
+    def predict(self, sensor_id):
+        """Generate predictions from a sensor's buffered history"""
+        if sensor_history.count(sensor_id) < 3:
             return None
         
+        return self.predict_many([sensor_id]).get(sensor_id)
+    
+    def predict_many(self, sensor_ids):
+        """Generate predictions for every sensor with one model call per target"""
         try:
-            df = pd.DataFrame(sensor_data_buffer)
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-            df_numeric = df[numeric_cols]
-            
-            if len(df_numeric) < 3:
-                return None
-            
-            predictions = {}
-            
-            for target, model in self.models.items():
-                try:
-                    # Find matching column
-                    target_col = None
-                    for col in df_numeric.columns:
-                        if target.lower().replace('.', '').replace(' ', '') in col.lower().replace('_', ''):
-                            target_col = col
-                            break
-                    
-                    if target_col is None:
-                        continue
-                    
-                    # Get last 3 values
-                    last_3_values = df_numeric[target_col].iloc[-3:].values
-                    X = last_3_values.reshape(1, -1)
-                    
-                    # Scale and predict
-                    scaler = self.scalers[target]
-                    X_scaled = scaler.transform(X)
-                    prediction = model.predict(X_scaled)[0]
-                    
-                    current = df_numeric[target_col].iloc[-1]
-                    
-                    predictions[target] = {
-                        'predicted': round(float(prediction), 2),
-                        'current': round(float(current), 2),
-                        'unit': self._get_unit(target)
-                    }
-                    
-                except Exception as e:
-                    continue
-            
-            return predictions
-            
+            return self.batch_predictor.predict_history(sensor_history, sensor_ids)
         except Exception as e:
-            return None
-    
-    def _get_unit(self, target):
-        """Get unit for target"""
-        units = {
-            'PM2.5': 'µg/m³',
-            'PM10': 'µg/m³',
-            'CO2': 'ppm',
-            'TVOC': 'ppb',
-            'Temperature': '°C',
-            'Humidity': '%',
-            'Pressure': 'hPa'
-        }
-        return units.get(target, '')
+            print(f"[ERROR] Batch prediction failed: {e}")
+            return {}
 
 
 # Initialize prediction engine
 prediction_engine = PredictionEngine()
 
 
-def calculate_aqi(pm25):
-    """Calculate AQI from PM2.5"""
-    if pm25 <= 12.0:
-        return int((50 / 12.0) * pm25)
-    elif pm25 <= 35.4:
-        return int(50 + ((100 - 50) / (35.4 - 12.1)) * (pm25 - 12.1))
-    elif pm25 <= 55.4:
-        return int(100 + ((150 - 100) / (55.4 - 35.5)) * (pm25 - 35.5))
-    elif pm25 <= 150.4:
-        return int(150 + ((200 - 150) / (150.4 - 55.5)) * (pm25 - 55.5))
-    elif pm25 <= 250.4:
-        return int(200 + ((300 - 200) / (250.4 - 150.5)) * (pm25 - 150.5))
-    else:
-        return int(300 + ((500 - 300) / (500.4 - 250.5)) * (pm25 - 250.5))
-
-
-def send_to_backend():
-    """Send all sensor data with predictions to backend"""
+def send_to_backend(sensor_ids):
+    """Spool changed sensors' data with their cached predictions for the backend"""
     try:
-        if not all_sensors_data:
-            return False
+        sensor_ids = [sensor_id for sensor_id in sensor_ids if sensor_id in all_sensors_data]
+        if not sensor_ids:
+            return True
         
-        # Format data for backend
+        # Format data for backend (the server merges these into its sensor list)
         formatted_data = {
             'timestamp': datetime.now().isoformat(),
-            'total_sensors': len(all_sensors_data),
+            'total_sensors': len(sensor_ids),
             'sensors': {}
         }
         
-        for sensor_id, sensor_data in all_sensors_data.items():
-            # Generate predictions for this sensor if we have enough data
-            predictions = None
-            if sensor_id in sensor_data_buffers and len(sensor_data_buffers[sensor_id]) >= 3:
-                predictions = prediction_engine.predict(sensor_data_buffers[sensor_id])
+        for sensor_id in sensor_ids:
+            sensor_data = all_sensors_data[sensor_id]
+            predictions = latest_predictions.get(sensor_id)
             
             formatted_data['sensors'][f'sensor_{sensor_id}'] = {
                 'name': f'Sensor {sensor_id}',
@@ -203,158 +135,129 @@ def send_to_backend():
                 'predictions': predictions if predictions else {}
             }
         
-        # Send to backend
-        response = requests.post(
-            BACKEND_URL,
-            json=formatted_data,
-            headers={'Content-Type': 'application/json'},
-            timeout=5
-        )
+        # Durable once spooled; the outbox delivers it when the backend is up
+        outbox.submit(formatted_data)
+        sensors_with_predictions = sum(1 for s in formatted_data['sensors'].values() if s['predictions'])
+        print(f"[OK] Queued {len(sensor_ids)} changed sensors for backend ({sensors_with_predictions} with predictions)")
+        return True
         
-        if response.status_code == 200:
-            # Count sensors with predictions
-            sensors_with_predictions = sum(1 for s in formatted_data['sensors'].values() if s['predictions'])
-            print(f"[OK] Sent {len(all_sensors_data)} sensors to backend ({sensors_with_predictions} with predictions)")
-            return True
-        else:
-            print(f"[ERROR] Backend returned {response.status_code}")
-            return False
-            
-    except requests.exceptions.ConnectionError:
-        print("[WARNING] Backend not running")
-        return False
     except Exception as e:
-        print(f"[ERROR] Sending to backend: {e}")
+        print(f"[ERROR] Spooling for backend: {e}")
         return False
 
 
-class SensorMQTTClient:
-    """MQTT client for a single sensor"""
+def ingest_message(sensor_id, sensor_name, raw_payload, verbose=True):
+    """Parse one uplink, update the sensor's state and history; True if it held readings"""
+    # Decode only the uplink's decoded_payload (field names normalized)
+    sensor_data = decode_uplink(raw_payload)
+    if sensor_data is None:
+        return False
     
-    def __init__(self, sensor_config):
-        self.sensor_id = sensor_config['id']
-        self.sensor_name = sensor_config['name']
-        self.env_file = sensor_config['env_file']
-        
-        # Load environment
-        load_dotenv(self.env_file)
-        
-        self.broker = os.getenv('MQTT_BROKER', 'au1.cloud.thethings.industries')
-        self.port = int(os.getenv('MQTT_PORT', '1883'))
-        self.topic = os.getenv('MQTT_TOPIC', '')
-        self.username = os.getenv('MQTT_USERNAME', '')
-        self.password = os.getenv('MQTT_PASSWORD', '')
-        
-        # Create MQTT client
-        self.client = mqtt.Client(client_id=f"sensor_{self.sensor_id}_client")
-        self.client.username_pw_set(self.username, self.password)
-        
-        # Set callbacks
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-        self.client.on_disconnect = self.on_disconnect
-        
-        print(f"[{self.sensor_name}] Configured")
-        print(f"  Broker: {self.broker}")
-        print(f"  Topic: {self.topic}")
+    # Calculate AQI if PM2.5 is available
+    pm25 = sensor_data.get('pm2_5', 0)
+    if pm25:
+        sensor_data['aqi'] = calculate_aqi(pm25)
+    else:
+        sensor_data['aqi'] = 0
     
-    def on_connect(self, client, userdata, flags, rc):
-        """Callback when connected"""
-        if rc == 0:
-            print(f"[{self.sensor_name}] Connected to MQTT broker")
-            client.subscribe(self.topic)
-            print(f"[{self.sensor_name}] Subscribed to topic")
-        else:
-            print(f"[{self.sensor_name}] Connection failed (code {rc})")
+    # Store in global data
+    all_sensors_data[sensor_id] = sensor_data
     
-    def on_message(self, client, userdata, msg):
-        """Callback when message received"""
-        global all_sensors_data, sensor_data_buffers
-        
-        try:
-            # Parse MQTT message
-            payload = json.loads(msg.payload.decode())
-            
-            # Extract sensor data
-            if 'uplink_message' in payload and 'decoded_payload' in payload['uplink_message']:
-                sensor_data = payload['uplink_message']['decoded_payload']
-                
-                # Calculate AQI if PM2.5 is available
-                pm25 = sensor_data.get('pm2_5', sensor_data.get('pm25', 0))
-                if pm25:
-                    sensor_data['aqi'] = calculate_aqi(pm25)
-                else:
-                    sensor_data['aqi'] = 0
-                
-                # Store in global data
-                all_sensors_data[self.sensor_id] = sensor_data
-                
-                # Add to buffer for predictions
-                sensor_data_buffers[self.sensor_id].append(sensor_data)
-                if len(sensor_data_buffers[self.sensor_id]) > MAX_BUFFER_SIZE:
-                    sensor_data_buffers[self.sensor_id] = sensor_data_buffers[self.sensor_id][-MAX_BUFFER_SIZE:]
-                
-                print(f"\n[{self.sensor_name}] Data received:")
-                print(f"  AQI: {sensor_data.get('aqi', 0)}")
-                print(f"  PM2.5: {sensor_data.get('pm2_5', 0)}")
-                print(f"  PM10: {sensor_data.get('pm10', 0)}")
-                print(f"  CO2: {sensor_data.get('co2', 0)}")
-                
-                # Generate predictions if we have enough data
-                if len(sensor_data_buffers[self.sensor_id]) >= 3:
-                    predictions = prediction_engine.predict(sensor_data_buffers[self.sensor_id])
-                    if predictions:
-                        print(f"\n[{self.sensor_name}] Predictions generated:")
-                        for target, values in predictions.items():
-                            arrow = "↑" if values['predicted'] > values['current'] else "↓" if values['predicted'] < values['current'] else "→"
-                            print(f"  {target}: {values['current']} → {values['predicted']} {values['unit']} {arrow}")
-                
-                # Send all sensors data to backend
-                send_to_backend()
-                
-        except Exception as e:
-            print(f"[{self.sensor_name}] Error processing message: {e}")
+    # Add to ring buffer for predictions
+    sensor_history.append(sensor_id, sensor_data)
     
-    def on_disconnect(self, client, userdata, rc):
-        """Callback when disconnected"""
-        print(f"[{self.sensor_name}] Disconnected (code {rc})")
-        if rc != 0:
-            print(f"[{self.sensor_name}] Reconnecting...")
+    # Keep the capture for the JSON-based scripts (one append, no rewrite)
+    store = capture_stores.get(sensor_id)
+    if store is not None:
+        store.append(dict(sensor_data, received_at=datetime.now().isoformat()))
     
-    def connect(self):
-        """Connect to MQTT broker"""
-        try:
-            self.client.connect(self.broker, self.port, 60)
-            return True
-        except Exception as e:
-            print(f"[{self.sensor_name}] Connection error: {e}")
-            return False
+    if verbose:
+        print(f"\n[{sensor_name}] Data received:")
+        print(f"  AQI: {sensor_data.get('aqi', 0)}")
+        print(f"  PM2.5: {sensor_data.get('pm2_5', 0)}")
+        print(f"  PM10: {sensor_data.get('pm10', 0)}")
+        print(f"  CO2: {sensor_data.get('co2', 0)}")
+    return True
+
+
+def process_message(item):
+    """Process stage: parse, update history and predict one sensor's message"""
+    sensor_id, sensor_name, raw_payload = item
     
-    def start_loop(self):
-        """Start MQTT loop in background"""
-        self.client.loop_start()
+    try:
+        if not ingest_message(sensor_id, sensor_name, raw_payload):
+            return
+        
+        # Generate predictions if we have enough data (cached for publishing)
+        if sensor_history.count(sensor_id) >= 3:
+            predictions = prediction_engine.predict(sensor_id)
+            latest_predictions[sensor_id] = predictions
+            if predictions:
+                print(f"\n[{sensor_name}] Predictions generated:")
+                for target, values in predictions.items():
+                    arrow = "↑" if values['predicted'] > values['current'] else "↓" if values['predicted'] < values['current'] else "→"
+                    print(f"  {target}: {values['current']} → {values['predicted']} {values['unit']} {arrow}")
+        
+        # Publish this sensor with the next coalesced send
+        publisher.mark(sensor_id)
+        
+    except Exception as e:
+        print(f"[{sensor_name}] Error processing message: {e}")
+
+
+# Staged pipeline: MQTT callbacks -> process -> publish -> outbox
+# The publisher sends only sensors that changed, at most once per window
+process_stage = Stage('process', process_message, maxsize=PROCESS_QUEUE_SIZE)
+publisher = CoalescingPublisher('publish', send_to_backend, window=PUBLISH_WINDOW)
+outbox = Outbox(SPOOL_DIR, post_batches(BACKEND_URL, timeout=5))
+
+
+def on_sensor_message(sensor, payload):
+    """Ingestor callback (runs on the MQTT network thread: enqueue only)"""
+    process_stage.submit((sensor['id'], sensor['name'], payload))
+
+
+def load_sensors():
+    """Sensor registry from SENSORS_CONFIG, or the built-in list"""
+    if os.path.exists(SENSORS_CONFIG):
+        print(f"[CONFIG] Loading sensors from {SENSORS_CONFIG}")
+        return load_sensor_registry(SENSORS_CONFIG)
+    print(f"[CONFIG] {SENSORS_CONFIG} not found, using built-in sensor list")
+    return resolve_sensors(SENSORS)
+
+
+def open_captures(sensors):
+    """Open the NDJSON capture store of every sensor that names a capture file"""
+    for sensor in sensors:
+        if sensor.get('capture'):
+            capture_stores[sensor['id']] = SegmentStore(store_dir(sensor['capture']))
+            print(f"[CAPTURE] {sensor['name']} -> {store_dir(sensor['capture'])}")
+    return sensors
+
+
+def close_captures():
+    for store in capture_stores.values():
+        store.close()
 
 
 def main():
     """Main function"""
     print("\n[INIT] Starting multi-sensor MQTT clients...\n")
     
-    # Create clients for all sensors
-    clients = []
-    for sensor_config in SENSORS:
-        client = SensorMQTTClient(sensor_config)
-        if client.connect():
-            client.start_loop()
-            clients.append(client)
-        else:
-            print(f"[WARNING] Could not connect {sensor_config['name']}")
+    outbox.start()
+    process_stage.start()
+    publisher.start()
     
-    print(f"\n[OK] {len(clients)}/{len(SENSORS)} sensors connected")
-    print("\n[PIPELINE] MQTT → AI Backend (auto-update every 30s)")
+    # One shared connection per broker/credentials group
+    ingestor = SharedMQTTIngestor(open_captures(load_sensors()), on_sensor_message)
+    connected = ingestor.start()
+    
+    print(f"\n[OK] {ingestor.sensor_count()} sensors over {connected}/{len(ingestor.connections)} MQTT connections")
+    print(f"\n[PIPELINE] MQTT → AI Backend (changed sensors, coalesced every {PUBLISH_WINDOW}s)")
     print("[INFO] Press Ctrl+C to stop\n")
     print("="*80)
     
-    # Timer for automatic updates
+    # Timer for status reports (sensors are published as they change)
     last_update = time.time()
     update_interval = 30  # seconds
     
@@ -366,8 +269,9 @@ def main():
             # Check if 30 seconds have passed
             if current_time - last_update >= update_interval:
                 if all_sensors_data:
-                    print(f"\n[AUTO-UPDATE] Sending latest data from {len(all_sensors_data)} sensors to backend...")
-                    send_to_backend()
+                    print(f"\n[STATUS] {len(all_sensors_data)} sensors reporting")
+                    print("[PIPELINE] Stage counters:")
+                    print(format_stats([ingestor, process_stage, publisher, outbox]))
                     last_update = current_time
                 else:
                     print(f"\n[WAITING] No sensor data received yet...")
@@ -376,11 +280,78 @@ def main():
             time.sleep(1)
     except KeyboardInterrupt:
         print("\n\n[SHUTDOWN] Stopping all sensors...")
-        for client in clients:
-            client.client.loop_stop()
-            client.client.disconnect()
+        ingestor.stop()
+        process_stage.stop()
+        publisher.stop()
+        outbox.flush(5)
+        outbox.stop()
+        close_captures()
         print("[SHUTDOWN] All sensors stopped")
+        print(format_stats([ingestor, process_stage, publisher, outbox]))
+
+
+async def main_async():
+    """asyncio variant: receive, predict, publish and status all on one event loop"""
+    loop = asyncio.get_running_loop()
+    # Model calls and blocking HTTP run here, off the event loop
+    executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS)
+    
+    async def handle(item):
+        sensor_id, sensor_name, raw_payload = item
+        if ingest_message(sensor_id, sensor_name, raw_payload, verbose=False):
+            async_publisher.mark(sensor_id)
+    
+    async def publish(sensor_ids):
+        # One batched model call per target for every changed sensor
+        predictions = await loop.run_in_executor(executor, prediction_engine.predict_many, sensor_ids)
+        for sensor_id in sensor_ids:
+            latest_predictions[sensor_id] = predictions.get(sensor_id)
+        return await loop.run_in_executor(executor, send_to_backend, sensor_ids)
+    
+    inbox = AsyncStage('receive', handle, maxsize=PROCESS_QUEUE_SIZE)
+    async_publisher = AsyncCoalescingPublisher('publish', publish, window=PUBLISH_WINDOW)
+    
+    ingestor = SharedMQTTIngestor(open_captures(load_sensors()),
+                                  lambda sensor, payload: inbox.submit((sensor['id'], sensor['name'], payload)))
+    outbox.start()
+    connected = ingestor.start_asyncio(loop)
+    print(f"\n[OK] {ingestor.sensor_count()} sensors over {connected}/{len(ingestor.connections)} MQTT connections (asyncio)")
+    print(f"\n[PIPELINE] MQTT → AI Backend (changed sensors, coalesced every {PUBLISH_WINDOW}s)")
+    print("[INFO] Press Ctrl+C to stop\n")
+    print("="*80)
+    
+    async def report_status():
+        while True:
+            await asyncio.sleep(30)
+            if all_sensors_data:
+                print(f"\n[STATUS] {len(all_sensors_data)} sensors reporting")
+                print("[PIPELINE] Stage counters:")
+                print(format_stats([ingestor, inbox, async_publisher, outbox]))
+            else:
+                print(f"\n[WAITING] No sensor data received yet...")
+    
+    try:
+        await asyncio.gather(inbox.run(), async_publisher.run(), report_status())
+    finally:
+        ingestor.stop()
+        executor.shutdown(wait=False)
+        outbox.flush(5)
+        outbox.stop()
+        close_captures()
+        print("[SHUTDOWN] All sensors stopped")
+        print(format_stats([ingestor, inbox, async_publisher, outbox]))
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Multi-sensor MQTT to AI pipeline')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='Run MQTT, prediction and publishing on one asyncio event loop')
+    args = parser.parse_args()
+    
+    if args.asyncio:
+        try:
+            asyncio.run(main_async())
+        except KeyboardInterrupt:
+            print("\n\n[SHUTDOWN] Stopped")
+    else:
+        main()
@@ -0,0 +1,311 @@
+"""
+MQTT record-and-replay harness for mqtt_all_sensors_live.py
+
+Record live TTN uplinks from every sensor in sensors.json:
+
+    python mqtt_replay.py record --out uplinks.jsonl.gz --duration 3600
+
+Replay them through the live pipeline (ingestor routing -> process stage ->
+coalescing publisher) for 500 synthetic sensors at 60x real time:
+
+    python mqtt_replay.py replay uplinks.jsonl.gz --sensors 500 --speed 60
+
+--speed 0 sends as fast as possible. By default messages are handed to the
+ingestor's on_message directly; --broker sends them through a local broker
+stand-in (airsense.local_broker, in a child process) over real paho
+connections, and --broker-address uses an existing broker instead.
+Predictions run for real; nothing is sent to the backend unless --send is
+given. Sends go through the pipeline's outbox, but spooled in spool/replay
+(emptied at the start of every run), never the live spool. Synthetic
+sensors have IDs replay-1, replay-2, ..., so they reach the backend as
+sensor_replay-1 and so on and never overwrite the real sensor_1..sensor_5.
+
+The report gives delivered messages/s, end-to-end latency percentiles
+(injection to the backend send that carried the reading) and CPU time per
+message for this process.
+
+Compare uplink decoders on a recording (json.loads of the whole envelope
+vs airsense.ttn.decode_uplink):
+
+    python mqtt_replay.py decode-bench uplinks.jsonl.gz
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from airsense.mqtt_ingest import SharedMQTTIngestor, _new_client, load_sensor_registry
+from airsense.pipeline import format_stats
+from airsense.replay import LatencyProbe, UplinkRecorder, read_recording, replay, synthesize, synthetic_sensors
+from airsense.spool import Outbox, post_batches
+from airsense.ttn import decode_uplink, normalize_reading, orjson, parse_uplink
+
+SENSORS_CONFIG = os.getenv('SENSORS_CONFIG', 'sensors.json')
+DRAIN_TIMEOUT = 30  # Seconds to wait for in-flight messages after the last send
+REPLAY_SPOOL_DIR = os.path.join('spool', 'replay')  # Kept apart from the live pipeline's spool
+
+
+def record(args):
+    """Capture raw uplinks from every configured sensor"""
+    recorder = UplinkRecorder(args.out)
+    ingestor = SharedMQTTIngestor(load_sensor_registry(SENSORS_CONFIG), recorder.record)
+    connected = ingestor.start()
+    print(f"[RECORD] {ingestor.sensor_count()} sensors over {connected} connections -> {args.out}")
+    print("[INFO] Press Ctrl+C to stop\n")
+
+    started = time.time()
+    try:
+        while not args.duration or time.time() - started < args.duration:
+            time.sleep(1)
+            if int(time.time() - started) % 60 == 0:
+                print(f"[RECORD] {recorder.count} uplinks recorded")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingestor.stop()
+        recorder.close()
+    print(f"\n[RECORD] Saved {recorder.count} uplinks to {args.out}")
+
+
+# Envelopes the fast path must not be fooled by: a decoded_payload that is
+# not uplink_message's own (elsewhere in the envelope, or nested in
+# rx_metadata ahead of the real one)
+DECODE_EDGE_CASES = [
+    b'{"uplink_message":{"frm_payload":"x"},"other":{"decoded_payload":{"pm2_5":7}}}',
+    b'{"uplink_message":{"rx_metadata":[{"decoded_payload":{"pm2_5":8}}],"decoded_payload":{"pm2_5":9}}}',
+]
+
+
+def json_decode(raw):
+    """The original decoding path: json.loads of the whole envelope"""
+    payload = json.loads(raw.decode())
+    if 'uplink_message' not in payload or 'decoded_payload' not in payload['uplink_message']:
+        return None
+    return payload['uplink_message']['decoded_payload']
+
+
+def decode_bench(args):
+    """Time each uplink decoder over the recorded payloads"""
+    payloads = [entry['payload'] for entry in read_recording(args.recording)]
+    if not payloads:
+        print(f"[ERROR] No uplinks in {args.recording}")
+        return
+
+    # The fast path must agree with the original on every payload
+    mismatches = 0
+    for raw in payloads + DECODE_EDGE_CASES:
+        expected = json_decode(raw)
+        if (normalize_reading(expected) if expected is not None else None) != decode_uplink(raw):
+            mismatches += 1
+
+    decoders = [('json.loads (current)', json_decode)]
+    if orjson is not None:
+        decoders.append(('orjson, whole envelope', parse_uplink))
+    decoders.append(('decode_uplink', decode_uplink))
+
+    print(f"[BENCH] {len(payloads)} payloads, mean {sum(map(len, payloads)) / len(payloads):,.0f} bytes,"
+          f" {args.repeat} repeats (orjson {'installed' if orjson is not None else 'not installed'})")
+    baseline = None
+    for name, decode in decoders:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for raw in payloads:
+                decode(raw)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        per_message = best / len(payloads) * 1e6
+        baseline = baseline or per_message
+        print(f"  {name:<24} {per_message:8.2f} µs/msg  {baseline / per_message:5.1f}x")
+    print(f"  Results differing from json.loads: {mismatches}"
+          f" (recording plus {len(DECODE_EDGE_CASES)} edge cases)")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start_broker():
+    """Local broker stand-in in a child process, so its CPU is not counted"""
+    port = _free_port()
+    broker = subprocess.Popen([sys.executable, '-m', 'airsense.local_broker', '--port', str(port)],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return broker, port
+        except OSError:
+            time.sleep(0.1)
+    broker.kill()
+    raise RuntimeError('local broker did not start')
+
+
+def _wait_connected(client, timeout=10):
+    deadline = time.time() + timeout
+    while not client.is_connected() and time.time() < deadline:
+        time.sleep(0.05)
+    return client.is_connected()
+
+
+def run_replay(args):
+    """Replay a recording through the live pipeline and report its limits"""
+    uplinks = read_recording(args.recording)
+    if not uplinks:
+        print(f"[ERROR] No uplinks in {args.recording}")
+        return
+    schedule = synthesize(uplinks, args.sensors, loops=args.loops, limit=args.limit)
+    print(f"[REPLAY] {len(uplinks)} recorded uplinks -> {len(schedule)} messages for {args.sensors} sensors")
+
+    # The pipeline under test (loads the models at import)
+    import mqtt_all_sensors_live as live
+
+    probe = LatencyProbe()
+
+    def process_and_probe(item):
+        live.process_message(item)
+        probe.processed(item[0], item[2])
+
+    def publish_and_probe(sensor_ids):
+        sent = live.send_to_backend(sensor_ids) if args.send else True
+        if sent is not False:
+            probe.published(sensor_ids)
+        return sent
+
+    live.process_stage.handler = process_and_probe
+    live.publisher.send = publish_and_probe
+    if args.send:
+        # Synthetic traffic must not land in (or be replayed from) the live spool
+        live.outbox.stop()
+        shutil.rmtree(REPLAY_SPOOL_DIR, ignore_errors=True)
+        live.outbox = Outbox(REPLAY_SPOOL_DIR, post_batches(live.BACKEND_URL, timeout=5))
+
+    broker = None
+    publisher_client = None
+    if args.broker or args.broker_address:
+        if args.broker_address:
+            host, port = args.broker_address.rsplit(':', 1)
+            port = int(port)
+        else:
+            broker, port = _start_broker()
+            host = '127.0.0.1'
+        sensors = synthetic_sensors(args.sensors, host, port)
+        ingestor = SharedMQTTIngestor(sensors, live.on_sensor_message)
+        ingestor.start()
+        publisher_client = _new_client(f'airsense_replay_{os.getpid()}')
+        publisher_client.connect(host, port, 60)
+        publisher_client.loop_start()
+        if not all(_wait_connected(c.client) for c in ingestor.connections) or not _wait_connected(publisher_client):
+            print(f"[ERROR] Could not connect to broker {host}:{port}")
+            return
+        time.sleep(0.5)  # Let the subscriptions settle
+        mode = f'broker {host}:{port}'
+
+        def inject(i, topic, payload):
+            probe.injected(payload)
+            publisher_client.publish(topic, payload)
+    else:
+        sensors = synthetic_sensors(args.sensors, 'in-process')
+        ingestor = SharedMQTTIngestor(sensors, live.on_sensor_message)
+        connection = ingestor.connections[0]
+        mode = 'in-process'
+
+        def inject(i, topic, payload):
+            probe.injected(payload)
+            connection.on_message(None, None, SimpleNamespace(topic=topic, payload=payload))
+
+    live.process_stage.start()
+    live.publisher.start()
+    if args.send:
+        live.outbox.start()
+    speed = f'{args.speed:g}x real time' if args.speed else 'full speed'
+    print(f"[REPLAY] Sending via {mode} at {speed}...")
+
+    output = sys.stdout if args.verbose else open(os.devnull, 'w')
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        send_seconds, worst_lag = replay(schedule, inject, args.speed)
+
+        # Wait for messages still in the broker, the queue and the publisher
+        deadline = time.time() + DRAIN_TIMEOUT
+        while ingestor.stats()['messages'] < len(schedule) and time.time() < deadline:
+            time.sleep(0.05)
+        live.process_stage.queue.join()
+        live.publisher.stop()
+        live.process_stage.stop()
+        if args.send:
+            live.outbox.flush(DRAIN_TIMEOUT)
+            live.outbox.stop()
+    wall_seconds = time.perf_counter() - wall_start
+    cpu_seconds = time.process_time() - cpu_start
+
+    if publisher_client is not None:
+        publisher_client.loop_stop()
+        publisher_client.disconnect()
+    ingestor.stop()
+    if broker is not None:
+        broker.terminate()
+        broker.wait()
+
+    summary = probe.summary()
+    received = ingestor.stats()['messages']
+    print("\n" + "="*80)
+    print(f"REPLAY RESULTS ({len(schedule)} messages, {args.sensors} sensors, {mode}, {speed})")
+    print("="*80)
+    print(f"  Sent:       {len(schedule)} in {send_seconds:.2f}s ({len(schedule) / send_seconds:,.0f} msg/s offered,"
+          f" worst lag {worst_lag * 1000:.0f} ms)")
+    print(f"  Delivered:  {summary['delivered']} ({summary['rate']:,.0f} msg/s end to end)")
+    print(f"  Lost:       {len(schedule) - received} before ingest, {live.process_stage.stats()['dropped']}"
+          f" dropped from the process queue, {summary['unpublished']} processed but not published")
+    processed = live.process_stage.stats()['processed']
+    if processed:
+        print(f"  CPU:        {cpu_seconds / processed * 1e6:.0f} µs per processed message"
+              f" ({cpu_seconds:.2f}s CPU over {wall_seconds:.2f}s wall)")
+    if summary['delivered']:
+        print(f"  Latency:    p50 {summary['p50']:.1f} ms, p90 {summary['p90']:.1f} ms,"
+              f" p99 {summary['p99']:.1f} ms, max {summary['max']:.1f} ms")
+    print("\n[PIPELINE] Stage counters:")
+    stages = [ingestor, live.process_stage, live.publisher] + ([live.outbox] if args.send else [])
+    print(format_stats(stages))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record MQTT uplinks or replay them through the live pipeline')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help='Record raw uplinks from the configured sensors')
+    record_parser.add_argument('--out', default='uplinks.jsonl.gz', help='Recording file (.gz is compressed)')
+    record_parser.add_argument('--duration', type=float, default=0, help='Seconds to record (0: until Ctrl+C)')
+
+    replay_parser = commands.add_parser('replay', help='Replay a recording through the live pipeline')
+    replay_parser.add_argument('recording')
+    replay_parser.add_argument('--sensors', type=int, default=5, help='Synthetic sensors to replay as')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='Multiple of real time (0: as fast as possible)')
+    replay_parser.add_argument('--loops', type=int, default=1, help='Times to repeat the recording')
+    replay_parser.add_argument('--limit', type=int, default=50000, help='Maximum messages to send')
+    replay_parser.add_argument('--broker', action='store_true', help='Send through a local broker stand-in')
+    replay_parser.add_argument('--broker-address', help='Send through an existing broker (host:port)')
+    replay_parser.add_argument('--send', action='store_true', help='Also POST to the backend')
+    replay_parser.add_argument('--verbose', action='store_true', help='Show the pipeline output')
+
+    bench_parser = commands.add_parser('decode-bench', help='Compare uplink decoders on a recording')
+    bench_parser.add_argument('recording')
+    bench_parser.add_argument('--repeat', type=int, default=5, help='Timing runs per decoder (best is reported)')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args)
+    elif args.command == 'decode-bench':
+        decode_bench(args)
+    else:
+        run_replay(args)
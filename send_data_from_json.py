@@ -3,11 +3,12 @@ Send sensor data to backend - Reading DIRECTLY from JSON files
 NO Excel files used!
 """
 import sys
-import json
-import os
 import requests
 from datetime import datetime
 
+from airsense.aqi import aqi_category, calculate_aqi
+from airsense.ndjson_store import capture_exists, read_latest
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -26,19 +27,6 @@ SENSORS = {
 
 BACKEND_URL = 'http://localhost:5000/api/predictions'
 
-def calculate_aqi(pm25):
-    """Calculate AQI from PM2.5"""
-    if pm25 <= 12:
-        return int((50/12) * pm25)
-    elif pm25 <= 35.4:
-        return int(50 + ((100-50)/(35.4-12.1)) * (pm25-12.1))
-    elif pm25 <= 55.4:
-        return int(100 + ((150-100)/(55.4-35.5)) * (pm25-35.5))
-    elif pm25 <= 150.4:
-        return int(150 + ((200-150)/(150.4-55.5)) * (pm25-55.5))
-    else:
-        return min(int(200 + ((300-200)/(250.4-150.5)) * (pm25-150.5)), 500)
-
 for sensor_id, config in SENSORS.items():
     json_file = config['json']
     sensor_name = config['name']
@@ -46,24 +34,16 @@ for sensor_id, config in SENSORS.items():
     print(f"\n{sensor_name}:")
     
     # Check if JSON exists
-    if not os.path.exists(json_file):
+    if not capture_exists(json_file):
         print(f"  SKIP: {json_file} not found")
         continue
     
     try:
-        # Load JSON data
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-        
-        # Handle both list and single object
-        if isinstance(data, list):
-            if len(data) == 0:
-                print(f"  SKIP: Empty JSON file")
-                continue
-            # Get the LAST entry (most recent)
-            latest = data[-1]
-        else:
-            latest = data
+        # Get the LAST entry (most recent) without loading the whole history
+        latest = read_latest(json_file)
+        if latest is None:
+            print(f"  SKIP: Empty JSON file")
+            continue
         
         # Extract values with fallbacks
         pm25 = float(latest.get('pm2_5', latest.get('PM2.5', 0)))
@@ -138,17 +118,7 @@ try:
             aqi = sensor_data.get('aqi', 0)
             pm25 = sensor_data.get('pollutants', {}).get('pm2_5', 0)
             
-            # AQI category
-            if aqi <= 50:
-                category = "Good"
-            elif aqi <= 100:
-                category = "Moderate"
-            elif aqi <= 150:
-                category = "Unhealthy for Sensitive"
-            elif aqi <= 200:
-                category = "Unhealthy"
-            else:
-                category = "Very Unhealthy"
+            category = aqi_category(aqi)
             
             print(f"  {sensor_key}: AQI {aqi} ({category}) - PM2.5: {pm25} µg/m³")
     else:
@@ -2,10 +2,10 @@
 Train Linear Regression Models for Air Quality Prediction
 
 This script:
-1. Reads data from output_excel.xlsx
+1. Reads data from output_excel.xlsx (or the history/ Parquet store when it has data)
 2. Trains Linear Regression models (faster than XGBoost)
-3. Saves models to models/ folder
-4. Replaces existing XGBoost models
+3. Saves all models to one bundle file (models/lag_bundle.joblib)
+4. Replaces existing Linear Regression models
 
 Linear Regression is:
 - Much faster (10x)
@@ -17,11 +17,15 @@ import sys
 import pandas as pd
 import numpy as np
 from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
-import joblib
 import os
 from datetime import datetime
 
+from airsense.history_store import HISTORY_DIR, HistoryStore
+from airsense.model_bundle import LAG_BUNDLE, lag_features, save_bundle, training_metadata
+from airsense.model_registry import TARGET_FIELDS
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -32,9 +36,16 @@ print("="*80)
 print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
 # Step 1: Read data
-print("📊 Reading data from output_excel.xlsx...")
+history = HistoryStore()
 try:
-    df = pd.read_excel('output_excel.xlsx')
+    if history.exists():
+        print(f"📊 Reading data from the history store ({HISTORY_DIR}/)...")
+        source = f'{HISTORY_DIR}/'
+        df = history.query()
+    else:
+        print("📊 Reading data from output_excel.xlsx...")
+        source = 'output_excel.xlsx'
+        df = pd.read_excel('output_excel.xlsx')
     print(f"   ✓ Loaded {len(df)} records")
 except Exception as e:
     print(f"   ❌ Error: {e}")
@@ -94,16 +105,25 @@ for target_name, target_col in targets.items():
             continue
         
         # Create features (previous values)
-        # Use last 3 values to predict next value
+        # Use last 3 values to predict next value, within each sensor's own series
         X = []
         y = []
+        times = []
         
-        for i in range(3, len(data)):
-            X.append(data.iloc[i-3:i][target_col].values)
-            y.append(data.iloc[i][target_col])
+        groups = data.groupby(df.loc[data.index, 'sensor_id']) if 'sensor_id' in df.columns else [(None, data)]
+        for _, series in groups:
+            values = series[target_col].values
+            for i in range(3, len(values)):
+                X.append(values[i-3:i])
+                y.append(values[i])
+            times.extend(series.index[3:])
         
         X = np.array(X)
         y = np.array(y)
+        if 'sensor_id' in df.columns:
+            # Sensors interleaved by time, so the test split is everyone's latest readings
+            order = np.argsort(df.loc[times, 'received_at'].values, kind='stable')
+            X, y = X[order], y[order]
         
         if len(X) < 10:
             print(f"   ⚠️  Not enough samples after feature engineering")
@@ -132,18 +152,11 @@ for target_name, target_col in targets.items():
         print(f"   → Test R²: {test_score:.3f}")
         print(f"   → Training samples: {len(X_train)}")
         
-        # Save model and scaler
-        model_path = f'models/{target_col}_model.pkl'
-        scaler_path = f'models/{target_col}_scaler.pkl'
-        
-        joblib.dump(model, model_path)
-        joblib.dump(scaler, scaler_path)
-        
-        print(f"   ✓ Saved to {model_path}")
-        
         trained_models[target_name] = {
             'model': model,
             'scaler': scaler,
+            'target_col': target_col,
+            'train_samples': len(X_train),
             'train_score': train_score,
             'test_score': test_score
         }
@@ -151,7 +164,33 @@ for target_name, target_col in targets.items():
     except Exception as e:
         print(f"   ❌ Error: {e}")
 
-# Step 4: Summary
+# Step 4: Save bundle
+if trained_models:
+    bundle_targets = {}
+    for name, info in trained_models.items():
+        field = TARGET_FIELDS[name]
+        bundle_targets[name] = {
+            'pipeline': Pipeline([('scaler', info['scaler']), ('model', info['model'])]),
+            # Lag windows are read by canonical field (resolve_targets maps
+            # uplink_message.decoded_payload.pm2_5 and PM2.5 to pm2_5)
+            'features': lag_features(field, 3),
+            'source_columns': [field],
+            'target_column': field,
+            'metrics': {
+                'train_r2': info['train_score'],
+                'test_r2': info['test_score'],
+                'train_samples': info['train_samples']
+            }
+        }
+    
+    bundle_path = save_bundle(
+        os.path.join('models', LAG_BUNDLE),
+        bundle_targets,
+        training_metadata('train_linear_regression.py', source=source, records=len(df), n_lags=3)
+    )
+    print(f"\n💾 Saved {len(bundle_targets)} models to {bundle_path}")
+
+# Step 5: Summary
 print("\n" + "="*80)
 print("SUMMARY")
 print("="*80)
@@ -162,7 +201,7 @@ if trained_models:
     for name, info in trained_models.items():
         print(f"   {name:12} → R²: {info['test_score']:.3f}")
     
-    print(f"\n📁 Models saved to: models/")
+    print(f"\n📁 Models saved to: models/{LAG_BUNDLE}")
     print(f"\n⚡ Linear Regression is:")
     print(f"   • 10x faster than XGBoost")
     print(f"   • Simpler and more efficient")
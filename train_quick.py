@@ -1,19 +1,27 @@
 """
 Quick Training Script using output.xlsx
 
-This script trains models using the existing output.xlsx file.
+This script trains models using the existing output.xlsx file and saves
+them, with their feature schema, to models/cross_bundle.joblib.
+
+When the Parquet history store (history/, see airsense/history_store.py)
+has data, every sensor's history is read from it instead of the workbook.
 """
 
 import pandas as pd
 import numpy as np
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, r2_score
 import xgboost as xgb
-import joblib
 import os
 import warnings
 warnings.filterwarnings('ignore')
 
+from airsense.history_store import FIELDS, HISTORY_DIR, HistoryStore
+from airsense.model_bundle import CROSS_BUNDLE, save_bundle, training_metadata
+from airsense.schema import resolve_targets
+
 np.random.seed(42)
 
 print("="*80)
@@ -21,50 +29,55 @@ print("TRAINING AIR QUALITY PREDICTION MODELS")
 print("="*80)
 
 # Load data
-print("\n[1/4] Loading data from output.xlsx...")
-df = pd.read_excel('output.xlsx')
-print(f"  OK Loaded {len(df)} records")
-
-# Extract sensor data columns
-sensor_cols = [col for col in df.columns if 'uplink_message.decoded_payload' in col]
-df_sensor = df[sensor_cols].copy()
-
-# Rename columns (remove prefix)
-df_sensor.columns = [col.replace('uplink_message.decoded_payload.', '') for col in df_sensor.columns]
-print(f"  OK Found {len(df_sensor.columns)} sensor columns")
-
-# Add timestamp
-if 'received_at' in df.columns:
-    df_sensor['received_at'] = pd.to_datetime(df['received_at'])
-    df_sensor = df_sensor.sort_values('received_at')
-    df_sensor.set_index('received_at', inplace=True)
+history = HistoryStore()
+if history.exists():
+    print(f"\n[1/4] Loading data from the history store ({HISTORY_DIR}/)...")
+    source = f'{HISTORY_DIR}/'
+    df = history.query()
+    print(f"  OK Loaded {len(df)} records from sensors {', '.join(map(str, history.sensors()))}")
+
+    # Gaps are filled from the same sensor's neighbouring readings only
+    fields = list(FIELDS)
+    df_sensor = df.groupby('sensor_id')[fields].ffill()
+    df_sensor = df_sensor.groupby(df['sensor_id']).bfill()
+    df_sensor.index = df['received_at']
+    df_sensor = df_sensor.sort_index(kind='stable')
+    print(f"  OK Found {len(df_sensor.columns)} sensor columns")
+else:
+    print("\n[1/4] Loading data from output.xlsx...")
+    source = 'output.xlsx'
+    df = pd.read_excel('output.xlsx')
+    print(f"  OK Loaded {len(df)} records")
+
+    # Extract sensor data columns
+    sensor_cols = [col for col in df.columns if 'uplink_message.decoded_payload' in col]
+    df_sensor = df[sensor_cols].copy()
+
+    # Rename columns (remove prefix)
+    df_sensor.columns = [col.replace('uplink_message.decoded_payload.', '') for col in df_sensor.columns]
+    print(f"  OK Found {len(df_sensor.columns)} sensor columns")
+
+    # Add timestamp
+    if 'received_at' in df.columns:
+        df_sensor['received_at'] = pd.to_datetime(df['received_at'])
+        df_sensor = df_sensor.sort_values('received_at')
+        df_sensor.set_index('received_at', inplace=True)
+
+    # Fill gaps (the history path fills them per sensor above)
+    df_sensor = df_sensor.ffill().bfill()
 
 # Drop non-numeric and irrelevant columns
 df_sensor = df_sensor.select_dtypes(include=[np.number])
 df_sensor = df_sensor.dropna(how='all', axis=1)  # Drop columns that are all NaN
-df_sensor = df_sensor.fillna(method='ffill').fillna(method='bfill')
 df_sensor = df_sensor.dropna()
 
 print(f"  OK Cleaned data: {df_sensor.shape}")
 print(f"  OK Columns: {', '.join(df_sensor.columns)}")
 
-# Define targets
-target_mapping = {
-    'pm2_5': 'PM2.5',
-    'pm10': 'PM10',
-    'co2': 'CO2',
-    'tvoc': 'TVOC',
-    'temperature': 'Temperature',
-    'humidity': 'Humidity',
-    'pressure': 'Pressure'
-}
-
-targets = {}
-for key, name in target_mapping.items():
-    cols = [c for c in df_sensor.columns if key in c.lower()]
-    if cols:
-        targets[name] = cols[0]
-        print(f"  OK Target {name}: {cols[0]}")
+# Define targets (exact column match, so pm2_5 and pm10 cannot collide)
+targets = resolve_targets(df_sensor.columns)
+for name, col in targets.items():
+    print(f"  OK Target {name}: {col}")
 
 if not targets:
     print("\n  ERROR No target columns found!")
@@ -76,6 +89,7 @@ os.makedirs('models', exist_ok=True)
 print(f"\n[2/4] Training {len(targets)} models...")
 
 results = {}
+bundle_targets = {}
 for target_name, target_col in targets.items():
     print(f"\n  Training {target_name}...")
     
@@ -110,15 +124,22 @@ for target_name, target_col in targets.items():
     
     print(f"    RMSE: {rmse:.4f}, R²: {r2:.4f}")
     
-    # Save
-    model_file = f'models/{target_name.lower().replace(".", "")}_model.pkl'
-    scaler_file = f'models/{target_name.lower().replace(".", "")}_scaler.pkl'
-    joblib.dump(model, model_file)
-    joblib.dump(scaler, scaler_file)
-    
     results[target_name] = {'rmse': rmse, 'r2': r2}
-
-print(f"\n[3/4] Saving summary...")
+    bundle_targets[target_name] = {
+        'pipeline': Pipeline([('scaler', scaler), ('model', model)]),
+        'features': list(X.columns),
+        'source_columns': list(X.columns),
+        'target_column': target_col,
+        'metrics': {'rmse': float(rmse), 'r2': float(r2), 'train_samples': len(X_train)}
+    }
+
+print(f"\n[3/4] Saving bundle and summary...")
+bundle_file = save_bundle(
+    os.path.join('models', CROSS_BUNDLE),
+    bundle_targets,
+    training_metadata('train_quick.py', source=source, records=len(df), xgboost=xgb.__version__)
+)
+print(f"  OK Saved {len(bundle_targets)} models to {bundle_file}")
 summary = pd.DataFrame(results).T
 summary.to_csv('models/model_performance_summary.csv')
 print(f"  OK Saved to models/model_performance_summary.csv")
@@ -129,7 +150,7 @@ print(summary)
 print("\n" + "="*80)
 print("OK TRAINING COMPLETE!")
 print(f"OK Trained {len(targets)} models")
-print(f"OK Saved {len(targets)*2} files to models/")
+print(f"OK Saved {len(targets)} models to models/{CROSS_BUNDLE}")
 print("="*80)
 print("\nOK Next: Run predictions with:")
 print("  cd backend")